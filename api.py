@@ -0,0 +1,577 @@
+import asyncio
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from dataclasses import fields
+from typing import AsyncIterator, Callable, Dict, List, Literal, Optional, Tuple
+
+import httpx
+from dotenv import load_dotenv
+from fastapi import Depends, FastAPI, Header, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field, constr
+
+from article_fetch import ArticleFetcher
+from cache_backends import backend_from_env
+from context_packer import estimate_tokens
+from core import (
+    SearchOptions,
+    SummaryOptions,
+    build_completion_kwargs,
+    build_search_params,
+    build_summary_prompt,
+    create_async_ai_client,
+    expand_query,
+    expansion_options,
+    missing_client_message,
+    prepare_sources,
+    record_generation_stats,
+    search_branches,
+    summary_cache_key,
+)
+from metrics import get_metrics
+from query_expansion import SubQuery, expansion_key, get_expansion_cache, parse_expansions, render_expansion_prompt
+from resilience import CircuitOpenError, error_status, get_gateway
+from search_cache import SearchCache, make_cache_key
+from search_result import SearchResult, json_default, loads
+from single_flight import AsyncSingleFlight, request_key
+from summary_cache import SummaryCache
+from web_search import SERPAPI_URL, merge_results, parse_serpapi_results
+
+
+class Overloaded(Exception):
+    """Fila de requisições cheia: o cliente deve tentar de novo mais tarde"""
+
+    def __init__(self, retry_after: float):
+        super().__init__("Serviço sobrecarregado; tente novamente em instantes")
+        self.retry_after = retry_after
+
+
+class UpstreamError(Exception):
+    """Falha do provedor de IA depois das novas tentativas do gateway"""
+
+    def __init__(self, error: Exception):
+        super().__init__(str(error))
+        self.status = error_status(error)
+
+
+class InFlightLimiter:
+    """Limite de requisições simultâneas com fila curta; além dela responde 503 (backpressure)"""
+
+    def __init__(self, max_in_flight: int = 32, max_queue: int = 64, queue_timeout: float = 5):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    async def acquire(self):
+        """Ocupar uma vaga, esperando no máximo `queue_timeout` (levanta Overloaded)"""
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            self._reject()
+        self.waiting += 1
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._reject()
+        finally:
+            self.waiting -= 1
+        get_metrics().observe("api_queue_wait", time.perf_counter() - start)
+        self.in_flight += 1
+
+    def release(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    def _reject(self):
+        self.rejected += 1
+        get_metrics().increment("api_rejected")
+        raise Overloaded(retry_after=max(self.queue_timeout, 1))
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+        }
+
+
+# Idioma-país no formato do seletor da interface (ex.: "en-us"); fora dele a API responde 422
+Locale = constr(pattern=r"^[a-z]{2}-[a-z]{2}$")
+
+
+class SearchRequest(BaseModel):
+    """Corpo de /search (mesmos parâmetros de SearchOptions)"""
+    query: str = Field(min_length=1, max_length=500)
+    num_results: int = Field(10, ge=1, le=100)
+    language: str = "pt"
+    country: str = "br"
+    news: bool = False
+    fan_out: bool = False
+    extra_locales: List[Locale] = Field(default_factory=list, max_length=4)
+    rerank: bool = True
+    fetch_articles: bool = False
+    fetch_deadline: float = Field(6, gt=0, le=30)
+    expansion: Literal["off", "local", "llm"] = "off"
+    expansions: int = Field(3, ge=2, le=5)
+    # Provedor de IA (expansão da consulta e resumo)
+    provider: Literal["GroqCloud", "OpenAI"] = "GroqCloud"
+
+    def search_options(self) -> SearchOptions:
+        return SearchOptions(**{f.name: getattr(self, f.name) for f in fields(SearchOptions)})
+
+
+class SummaryRequest(SearchRequest):
+    """Corpo de /summarize e /stream: busca + parâmetros do resumo"""
+    model: str = "openai/gpt-oss-120b"
+    temperature: float = Field(0.2, ge=0, le=2)
+    max_tokens: int = Field(800, ge=1, le=8192)
+    similarity: Optional[float] = Field(None, ge=0, le=1)
+
+    def summary_options(self) -> SummaryOptions:
+        return SummaryOptions(
+            ai_provider=self.provider,
+            model_choice=self.model,
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+        )
+
+
+def api_keys_from_env() -> Dict[str, Optional[str]]:
+    """Chaves das APIs (mesmo .env da interface)"""
+    load_dotenv()
+    return {
+        "serpapi": os.getenv("SERPAPI_KEY"),
+        "GroqCloud": os.getenv("GROQ_API_KEY"),
+        "OpenAI": os.getenv("OPENAI_API_KEY"),
+    }
+
+
+async def run_blocking(fn, *args):
+    """Executar código síncrono (SQLite, numpy) no pool de threads sem bloquear o loop"""
+    return await asyncio.get_running_loop().run_in_executor(None, functools.partial(fn, *args))
+
+
+class SlotStreamingResponse(StreamingResponse):
+    """StreamingResponse que chama `on_close` ao terminar, inclusive em desconexão ou erro"""
+
+    def __init__(self, content, on_close: Callable[[], None], **kwargs):
+        super().__init__(content, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.on_close()
+
+
+def sse_event(event: str, data) -> str:
+    """Formatar um evento Server-Sent Events com payload JSON"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=json_default)}\n\n"
+
+
+class SearchService:
+    """Pipeline assíncrono: SerpAPI por um pool httpx, clientes assíncronos de IA e os caches da interface"""
+
+    def __init__(
+        self,
+        api_keys: Dict[str, Optional[str]],
+        search_cache: SearchCache,
+        summary_cache: SummaryCache,
+        article_fetcher: Optional[ArticleFetcher] = None,
+        timeout: float = 15,
+    ):
+        self.api_keys = api_keys
+        self.search_cache = search_cache
+        self.summary_cache = summary_cache
+        self.article_fetcher = article_fetcher
+        self.timeout = timeout
+        self._http: Optional[httpx.AsyncClient] = None
+        self._clients: Dict[str, object] = {}
+        self._searches = AsyncSingleFlight("serpapi")
+        self._completions = AsyncSingleFlight("completion")
+
+    def http(self) -> httpx.AsyncClient:
+        """Cliente HTTP com pool de conexões keep-alive (criado dentro do loop)"""
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+            )
+        return self._http
+
+    def client(self, ai_provider: str):
+        if ai_provider not in self._clients:
+            self._clients[ai_provider] = create_async_ai_client(ai_provider, self.api_keys.get(ai_provider))
+        return self._clients[ai_provider]
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+        for client in self._clients.values():
+            if client is not None:
+                await client.close()
+
+    async def fetch_serpapi(self, params: Dict) -> List[SearchResult]:
+        """Requisição à SerpAPI; buscas idênticas simultâneas compartilham a mesma requisição"""
+        results, shared = await self._searches.do(make_cache_key(params), lambda: self._request_serpapi(params))
+        return [result.copy() for result in results] if shared else results
+
+    async def _request_serpapi(self, params: Dict) -> List[SearchResult]:
+        query_params = {k: v for k, v in params.items() if v is not None}
+
+        async def request() -> httpx.Response:
+            response = await self.http().get(SERPAPI_URL, params=query_params)
+            response.raise_for_status()
+            return response
+
+        metrics = get_metrics()
+        with metrics.span("serpapi_request", provider="serpapi"):
+            response = await get_gateway().acall("serpapi", request)
+        with metrics.span("json_parse", provider="serpapi"):
+            payload = loads(response.content)
+        with metrics.span("result_extraction", provider="serpapi"):
+            return parse_serpapi_results(payload)
+
+    async def _search_branch(self, params: Dict) -> List[SearchResult]:
+        # SQLite bloqueia: consultar o cache fora do loop
+        cached = await run_blocking(self.search_cache.get, params)
+        if cached is not None:
+            return cached
+        results = await self.fetch_serpapi(params)
+        if results:
+            await run_blocking(self.search_cache.set, params, results)
+        return results
+
+    async def expand(self, query: str, options: SearchOptions, ai_provider: str) -> List[SubQuery]:
+        """Versão assíncrona de `expand_query` (a chamada à IA usa o cliente assíncrono)"""
+        if options.expansion == "llm" and self.client(ai_provider) is not None:
+            cache = get_expansion_cache()
+            key = expansion_key(query, options.language, options.expansions, ai_provider)
+            expansions = cache.get(key)
+            if expansions is None:
+                prompt = render_expansion_prompt(query, options.language, options.expansions)
+                with get_metrics().span("query_expansion"):
+                    try:
+                        text, _ = await self.complete(prompt, expansion_options(ai_provider))
+                        expansions = parse_expansions(text, query, options.expansions)
+                    except Exception:
+                        expansions = []
+                if expansions:
+                    cache.set(key, expansions)
+            if expansions:
+                return expansions
+        # Sem cliente: expansão local (ou nenhuma)
+        return expand_query(query, options)
+
+    async def search(self, query: str, options: SearchOptions, ai_provider: str = "GroqCloud") -> Tuple[List[SearchResult], Dict[str, str]]:
+        """Buscar (ramos e subconsultas concorrentes) e preparar as fontes; retorna resultados e erros por ramo"""
+        params = build_search_params(query, self.api_keys.get("serpapi"), options)
+        expansions = await self.expand(query, options, ai_provider)
+        branches = search_branches(params, options, expansions)
+
+        outcomes = await asyncio.gather(
+            *(asyncio.wait_for(self._search_branch(p), self.timeout + 1) for p in branches.values()),
+            return_exceptions=True
+        )
+        branch_results = []
+        errors = {}
+        for name, outcome in zip(branches, outcomes):
+            if isinstance(outcome, asyncio.TimeoutError):
+                errors[name] = "timeout"
+            elif isinstance(outcome, Exception):
+                errors[name] = f"Erro na requisição: {outcome}"
+            else:
+                branch_results.append(outcome)
+        results = merge_results(branch_results) if len(branch_results) > 1 else (branch_results or [[]])[0]
+
+        if results:
+            # Ranking (numpy) e leitura de artigos são síncronos
+            results = await run_blocking(prepare_sources, query, results, options, self.article_fetcher)
+        return results, errors
+
+    def cached_summary(self, query: str, search_results: List[SearchResult], options: SummaryOptions, similarity: Optional[float]) -> Tuple[Optional[str], Tuple[str, str]]:
+        model_key, fingerprint = summary_cache_key(query, search_results, options)
+        return self.summary_cache.get(query, model_key, fingerprint, similarity), (model_key, fingerprint)
+
+    def _require_client(self, options: SummaryOptions):
+        client = self.client(options.ai_provider)
+        if client is None:
+            raise HTTPException(503, missing_client_message(options.ai_provider))
+        return client
+
+    async def complete(self, prompt: str, options: SummaryOptions) -> Tuple[str, Dict]:
+        """Chat completion sem streaming; pedidos idênticos simultâneos compartilham a chamada"""
+        client = self._require_client(options)
+        kwargs = build_completion_kwargs(prompt, options)
+        try:
+            (text, stats), _ = await self._completions.do(
+                request_key(options.ai_provider, kwargs),
+                lambda: self._complete(client, kwargs, options, prompt)
+            )
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            raise UpstreamError(e) from e
+        return text, stats
+
+    async def _complete(self, client, kwargs: Dict, options: SummaryOptions, prompt: str) -> Tuple[str, Dict]:
+        metrics = get_metrics()
+        labels = {"provider": options.ai_provider, "model": options.model_choice}
+        start = time.perf_counter()
+        with metrics.span("llm_request", **labels):
+            response = await get_gateway().acall(
+                options.ai_provider,
+                lambda: client.chat.completions.create(**kwargs, stream=False),
+                model=options.model_choice,
+                tokens=estimate_tokens(prompt) + options.max_tokens
+            )
+        end = time.perf_counter()
+
+        usage = getattr(response, "usage", None)
+        metrics.record_usage(usage, **labels)
+        stats = {}
+        record_generation_stats(stats, start, end, end, getattr(usage, "completion_tokens", 0) or 0)
+        return response.choices[0].message.content, stats
+
+    async def stream(self, prompt: str, options: SummaryOptions, stats: Dict) -> AsyncIterator[str]:
+        """Chat completion em streaming; o próximo chunk só é lido quando o cliente consome o anterior"""
+        if options.ai_provider == "OpenAI" and options.model_choice.startswith("o1"):
+            text, call_stats = await self.complete(prompt, options)
+            stats.update(call_stats)
+            yield text
+            return
+
+        client = self._require_client(options)
+        kwargs = build_completion_kwargs(prompt, options)
+        if options.ai_provider == "OpenAI":
+            kwargs["stream_options"] = {"include_usage": True}
+
+        metrics = get_metrics()
+        labels = {"provider": options.ai_provider, "model": options.model_choice}
+        start = time.perf_counter()
+        first_token = None
+        chunk_count = 0
+        usage = None
+        stream = await get_gateway().acall(
+            options.ai_provider,
+            lambda: client.chat.completions.create(**kwargs, stream=True),
+            model=options.model_choice,
+            tokens=estimate_tokens(prompt) + options.max_tokens
+        )
+        try:
+            async for chunk in stream:
+                chunk_usage = getattr(chunk, "usage", None) or getattr(getattr(chunk, "x_groq", None), "usage", None)
+                if chunk_usage is not None:
+                    usage = chunk_usage
+                if not chunk.choices:
+                    continue
+                content = chunk.choices[0].delta.content
+                if content:
+                    if first_token is None:
+                        first_token = time.perf_counter()
+                        metrics.observe("llm_ttft", first_token - start, **labels)
+                    chunk_count += 1
+                    yield content
+        finally:
+            # Cliente desconectou: liberar a conexão com o provedor
+            await stream.close()
+
+        end = time.perf_counter()
+        metrics.observe("llm_request", end - start, **labels)
+        metrics.record_usage(usage, **labels)
+        completion_tokens = getattr(usage, "completion_tokens", 0) or chunk_count
+        record_generation_stats(stats, start, first_token or end, end, completion_tokens)
+
+
+def create_app(
+    service: Optional[SearchService] = None,
+    max_in_flight: Optional[int] = None,
+    max_queue: Optional[int] = None,
+    queue_timeout: Optional[float] = None,
+) -> FastAPI:
+    """Aplicação HTTP; sem `service` os caches são abertos a partir das mesmas variáveis da interface"""
+    limiter = InFlightLimiter(
+        max_in_flight=max_in_flight or int(os.getenv("API_MAX_IN_FLIGHT", "32")),
+        max_queue=max_queue if max_queue is not None else int(os.getenv("API_MAX_QUEUE", "64")),
+        queue_timeout=queue_timeout if queue_timeout is not None else float(os.getenv("API_QUEUE_TIMEOUT", "5")),
+    )
+    token = os.getenv("API_TOKEN")
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        owned = service is None
+        # CACHE_URL: cache compartilhado com as réplicas da interface
+        backend = backend_from_env() if owned else None
+        app.state.service = service or SearchService(
+            api_keys_from_env(),
+            SearchCache(backend or os.getenv("SEARCH_CACHE_PATH", ".search_cache.sqlite3")),
+            SummaryCache(
+                ttl=int(os.getenv("SUMMARY_CACHE_TTL", "3600")),
+                max_entries=int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", "512")),
+                backend=backend
+            ),
+            ArticleFetcher(),
+        )
+        yield
+        if owned:
+            await app.state.service.aclose()
+
+    app = FastAPI(title="Motor de Busca Inteligente", lifespan=lifespan)
+    app.state.limiter = limiter
+
+    async def authorize(authorization: Optional[str] = Header(None)):
+        if token and authorization != f"Bearer {token}":
+            raise HTTPException(401, "Token inválido")
+
+    async def with_slot():
+        async with limiter.slot():
+            yield
+
+    def require_serpapi(svc: SearchService):
+        if not svc.api_keys.get("serpapi"):
+            raise HTTPException(503, "SERPAPI_KEY não configurada")
+
+    @app.exception_handler(Overloaded)
+    async def overloaded_handler(request: Request, exc: Overloaded):
+        return JSONResponse({"detail": str(exc)}, status_code=503, headers={"Retry-After": str(int(exc.retry_after))})
+
+    @app.exception_handler(CircuitOpenError)
+    async def circuit_open_handler(request: Request, exc: CircuitOpenError):
+        return JSONResponse({"detail": str(exc)}, status_code=503, headers={"Retry-After": str(int(exc.retry_in) + 1)})
+
+    @app.exception_handler(UpstreamError)
+    async def upstream_error_handler(request: Request, exc: UpstreamError):
+        return JSONResponse({"detail": str(exc), "upstream_status": exc.status}, status_code=502)
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok", "limiter": limiter.stats(), "providers": get_gateway().status()}
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def metrics_endpoint():
+        return PlainTextResponse(get_metrics().export_prometheus(), media_type="text/plain; version=0.0.4")
+
+    @app.post("/search", dependencies=[Depends(authorize), Depends(with_slot)])
+    async def search(body: SearchRequest, request: Request):
+        svc: SearchService = request.app.state.service
+        require_serpapi(svc)
+        results, errors = await svc.search(body.query, body.search_options(), body.provider)
+        return {"query": body.query, "results": [result.to_dict() for result in results], "search_errors": errors}
+
+    @app.post("/summarize", dependencies=[Depends(authorize), Depends(with_slot)])
+    async def summarize(body: SummaryRequest, request: Request):
+        svc: SearchService = request.app.state.service
+        require_serpapi(svc)
+        options = body.summary_options()
+        start = time.perf_counter()
+        results, errors = await svc.search(body.query, body.search_options(), body.provider)
+        timings = {"search": time.perf_counter() - start}
+        record = {
+            "query": body.query,
+            "provider": options.ai_provider,
+            "model": options.model_choice,
+            "results": [result.to_dict() for result in results],
+            "search_errors": errors,
+            "summary": None,
+            "cached_summary": False,
+            "timings": timings,
+        }
+        if not results:
+            return record
+
+        cached, (model_key, fingerprint) = await run_blocking(svc.cached_summary, body.query, results, options, body.similarity)
+        if cached is not None:
+            record.update(summary=cached, cached_summary=True)
+            return record
+
+        prompt = build_summary_prompt(body.query, results, options)
+        record["summary"], stats = await svc.complete(prompt, options)
+        timings.update(stats)
+        await run_blocking(svc.summary_cache.set, body.query, model_key, fingerprint, record["summary"])
+        return record
+
+    @app.post("/stream", dependencies=[Depends(authorize)])
+    async def stream(body: SummaryRequest, request: Request):
+        svc: SearchService = request.app.state.service
+        require_serpapi(svc)
+        # A vaga fica ocupada até o fim do stream, não só até a resposta começar
+        await limiter.acquire()
+        try:
+            options = body.summary_options()
+            results, errors = await svc.search(body.query, body.search_options(), body.provider)
+        except BaseException:
+            limiter.release()
+            raise
+
+        async def events() -> AsyncIterator[str]:
+            yield sse_event("sources", {"results": results, "search_errors": errors})
+            if not results:
+                yield sse_event("done", {"cached_summary": False})
+                return
+            cached, (model_key, fingerprint) = await run_blocking(svc.cached_summary, body.query, results, options, body.similarity)
+            if cached is not None:
+                yield sse_event("chunk", {"text": cached})
+                yield sse_event("done", {"cached_summary": True})
+                return
+
+            stats = {}
+            parts = []
+            try:
+                async for text in svc.stream(build_summary_prompt(body.query, results, options), options, stats):
+                    parts.append(text)
+                    yield sse_event("chunk", {"text": text})
+            except Exception as e:
+                # Os cabeçalhos já foram enviados: o erro vai como evento
+                yield sse_event("error", {"detail": str(e), "upstream_status": error_status(e)})
+                return
+            await run_blocking(svc.summary_cache.set, body.query, model_key, fingerprint, "".join(parts))
+            yield sse_event("done", dict(stats, cached_summary=False))
+
+        # A vaga é devolvida quando a resposta termina, mesmo que o corpo nunca seja lido (cliente saiu antes)
+        return SlotStreamingResponse(
+            events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"}, on_close=limiter.release
+        )
+
+    return app
+
+
+class ApiServerThread(threading.Thread):
+    """Servidor uvicorn em uma thread de fundo; `stop` encerra e espera a porta ser liberada"""
+
+    def __init__(self, server):
+        super().__init__(target=server.run, name="api-server", daemon=True)
+        self.server = server
+
+    def stop(self, timeout: float = 5):
+        self.server.should_exit = True
+        self.join(timeout)
+
+
+def start_api_server(app: FastAPI, port: int, host: str = "0.0.0.0") -> ApiServerThread:
+    """Servir a aplicação em uma thread de fundo (ex.: dentro do processo do Streamlit)"""
+    import uvicorn
+    thread = ApiServerThread(uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning")))
+    thread.start()
+    return thread
+
+
+# `uvicorn api:app` sobe o serviço isolado, compartilhando o cache de buscas em SQLite
+app = create_app()
@@ -1,33 +1,44 @@
 import streamlit as st
-import requests
 import os
 from dotenv import load_dotenv
-from groq import Groq
-import json
 from datetime import datetime
-from typing import List, Dict
+import time
+from typing import List, Dict, Optional
+from cache_backends import CacheBackend, backend_from_env
+from search_cache import SearchCache
+from search_result import ResultSet, SearchResult
+from history_store import HistoryEntry, HistoryStore
+from summary_cache import SummaryCache
+from article_fetch import ArticleFetcher
+from resilience import get_gateway
+from model_router import get_router
+from metrics import get_metrics
+from prefetch import PrefetchWorker, QueryTracker
+from news_watch import NewsWatch, poll_news
+from digest import DigestSection, digest_to_json, digest_to_markdown, iter_digest, parse_topics
+from core import (
+    DEFAULT_MAP_MODELS,
+    SearchOptions,
+    SummaryOptions,
+    clear_caches,
+    create_ai_client,
+    error_message,
+    expand_query,
+    generate_summary_with_ai,
+    map_chunk_count,
+    prepare_sources,
+    search_web,
+    stream_summary_with_ai,
+    summary_cache_key,
+)
 
-# Carregar variáveis do .env
-load_dotenv()
+# O Streamlit reexecuta este arquivo a cada interação: medir o custo de cada rerun
+rerun_start = time.perf_counter()
 
-# Configuração das APIs
-serpapi_key = os.getenv("SERPAPI_KEY")
-groq_api_key = os.getenv("GROQ_API_KEY")
-openai_api_key = os.getenv("OPENAI_API_KEY")
-
-# Inicializar clientes
-if groq_api_key:
-    groq_client = Groq(api_key=groq_api_key)
-else:
-    groq_client = None
-
-if openai_api_key:
-    from openai import OpenAI
-    openai_client = OpenAI(api_key=openai_api_key)
-else:
-    openai_client = None
-
-# Configuração da página
+# Spans por etapa (p50/p95/p99); METRICS_PORT expõe /metrics e METRICS_LOG_PATH grava JSONL
+metrics = get_metrics()
+
+# Configuração da página: antes dos recursos abaixo, cujo spinner (inicialização lenta) já seria um elemento
 st.set_page_config(
     page_title="🔍 Motor de Busca Inteligente",
     page_icon="🧠",
@@ -35,6 +46,124 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+@st.cache_resource
+def load_api_keys() -> Dict[str, Optional[str]]:
+    """Carregar o .env uma única vez por processo"""
+    with metrics.span("resource_init", resource="dotenv"):
+        load_dotenv()
+        return {
+            "serpapi": os.getenv("SERPAPI_KEY"),
+            "GroqCloud": os.getenv("GROQ_API_KEY"),
+            "OpenAI": os.getenv("OPENAI_API_KEY"),
+        }
+
+# Configuração das APIs
+api_keys = load_api_keys()
+serpapi_key = api_keys["serpapi"]
+groq_api_key = api_keys["GroqCloud"]
+openai_api_key = api_keys["OpenAI"]
+
+@st.cache_resource
+def get_ai_client(ai_provider: str, api_key: Optional[str]):
+    """Cliente do provedor (e seu pool de conexões) compartilhado entre sessões e reruns"""
+    with metrics.span("resource_init", resource=ai_provider):
+        return create_ai_client(ai_provider, api_key)
+
+@st.cache_resource
+def get_cache_backend() -> Optional[CacheBackend]:
+    """Backend compartilhado entre processos/réplicas (CACHE_URL); None mantém os caches locais"""
+    with metrics.span("resource_init", resource="cache_backend"):
+        return backend_from_env()
+
+cache_backend = get_cache_backend()
+
+@st.cache_resource
+def get_search_cache() -> SearchCache:
+    """Cache persistente de buscas (economiza cota da SerpAPI)"""
+    with metrics.span("resource_init", resource="search_cache"):
+        return SearchCache(cache_backend or os.getenv("SEARCH_CACHE_PATH", ".search_cache.sqlite3"))
+
+search_cache = get_search_cache()
+
+@st.cache_resource
+def get_summary_cache() -> SummaryCache:
+    """Cache de análises compartilhado entre sessões e reruns"""
+    return SummaryCache(
+        ttl=int(os.getenv("SUMMARY_CACHE_TTL", "3600")),
+        max_entries=int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", "512")),
+        backend=cache_backend
+    )
+
+summary_cache = get_summary_cache()
+
+@st.cache_resource
+def get_article_fetcher() -> ArticleFetcher:
+    """Leitor de artigos (pool de threads e cache por URL) compartilhado"""
+    return ArticleFetcher()
+
+article_fetcher = get_article_fetcher()
+
+@st.cache_resource
+def get_history_store() -> HistoryStore:
+    """Histórico persistente de análises com busca de texto completo"""
+    with metrics.span("resource_init", resource="history_store"):
+        return HistoryStore(
+            os.getenv("HISTORY_PATH", ".search_history.sqlite3"),
+            max_entries=int(os.getenv("HISTORY_MAX_ENTRIES", "5000"))
+        )
+
+history_store = get_history_store()
+# Idade máxima (s) de uma análise idêntica para ser servida direto do histórico
+history_max_age = float(os.getenv("HISTORY_MAX_AGE", "86400"))
+
+@st.cache_resource
+def get_prefetcher() -> Optional[PrefetchWorker]:
+    """Renovação em segundo plano das consultas populares (habilitada com PREFETCH_TOP_N > 0)"""
+    top_n = int(os.getenv("PREFETCH_TOP_N", "0"))
+    if top_n <= 0 or not serpapi_key:
+        return None
+    return PrefetchWorker(
+        QueryTracker(half_life=float(os.getenv("PREFETCH_HALF_LIFE", "3600"))),
+        serpapi_key,
+        api_keys,
+        search_cache,
+        summary_cache,
+        article_fetcher,
+        top_n=top_n,
+        min_hits=int(os.getenv("PREFETCH_MIN_HITS", "2")),
+        interval=float(os.getenv("PREFETCH_INTERVAL", "60")),
+        lead_time=float(os.getenv("PREFETCH_LEAD_TIME", "300")),
+        search_budget_per_hour=float(os.getenv("PREFETCH_SEARCH_BUDGET", "30")),
+        llm_budget_per_hour=float(os.getenv("PREFETCH_LLM_BUDGET", "20")),
+    ).start()
+
+prefetcher = get_prefetcher()
+
+@st.cache_resource
+def get_api_server():
+    """API HTTP no mesmo processo, com os caches da interface (habilitada com API_PORT)"""
+    port = os.getenv("API_PORT")
+    if not port:
+        return None
+    # FastAPI/uvicorn só são carregados quando a API é usada
+    from api import SearchService, create_app, start_api_server
+    service = SearchService(api_keys, search_cache, summary_cache, article_fetcher)
+    return start_api_server(create_app(service), int(port))
+
+api_server = get_api_server()
+
+def clear_all_caches():
+    """Limpar todos os dados em cache (clientes e pools de st.cache_resource continuam)"""
+    st.cache_data.clear()
+    clear_caches(search_cache, summary_cache, article_fetcher.cache)
+
+def expected_seconds(stages: List[str], default: float, **labels) -> float:
+    """Duração típica (p50 observado) de um grupo de etapas, usada para pesar o progresso"""
+    observed = [metrics.quantile(stage, 0.5, **labels) for stage in stages]
+    if all(value is None for value in observed):
+        return default
+    return sum(value or 0 for value in observed)
+
 # CSS customizado para melhorar a aparência
 st.markdown("""
 <style>
@@ -70,6 +199,76 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+def display_digest_section(section: DigestSection):
+    """Seção de um tema do digest (resumo e fontes recolhidas)"""
+    st.markdown(f"### {section.topic}")
+    if section.error:
+        st.warning(f"⚠️ {section.error}")
+        return
+    st.markdown(section.summary)
+    origin = "📚 do cache" if section.cached else f"🧺 lote {section.batch}"
+    with st.expander(f"📚 Fontes ({len(section.results)}) · {origin}"):
+        for n, result in enumerate(section.results, 1):
+            st.markdown(f"- [Fonte {n}] [{escape_link_text(result.title)}]({result.link}) — {result.source} {result.date}")
+
+def render_digest(topics: List[str], search_options: SearchOptions, summary_options: SummaryOptions, run: bool):
+    """Digest de vários temas: cada seção aparece assim que o lote dela termina"""
+    digest = st.session_state.get('digest')
+    if run:
+        placeholders = {topic: st.empty() for topic in topics}
+        progress_bar = st.progress(0)
+        for topic, placeholder in placeholders.items():
+            placeholder.caption(f"⏳ {topic}")
+        stats = {}
+        sections = {}
+        try:
+            for section in iter_digest(
+                topics, serpapi_key, get_ai_client(summary_options.ai_provider, api_keys[summary_options.ai_provider]),
+                search_options, summary_options, search_cache, summary_cache, article_fetcher, stats
+            ):
+                sections[section.topic] = section
+                with placeholders[section.topic].container():
+                    display_digest_section(section)
+                progress_bar.progress(len(sections) / len(topics))
+        except Exception as e:
+            st.error(error_message(e))
+        progress_bar.empty()
+        digest = {
+            "sections": [sections[topic] for topic in topics if topic in sections],
+            "stats": stats,
+            "created_at": time.time(),
+        }
+        st.session_state['digest'] = digest
+    elif digest is not None:
+        for section in digest["sections"]:
+            display_digest_section(section)
+    if digest is None or not digest["sections"]:
+        return
+    
+    stats = digest["stats"]
+    if stats.get("total_time") is not None:
+        st.caption(
+            f"⚡ {stats['topics']} temas em {stats['total_time']:.1f}s · {stats['llm_calls']} chamadas à IA "
+            f"(lotes: {', '.join(map(str, stats['batches'])) or '-'}) · {stats['cached']} do cache"
+        )
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button(
+            "📥 Baixar digest (Markdown)",
+            digest_to_markdown(digest["sections"], digest["created_at"]),
+            file_name="digest.md",
+            mime="text/markdown",
+            use_container_width=True
+        )
+    with col2:
+        st.download_button(
+            "📥 Baixar digest (JSON)",
+            digest_to_json(digest["sections"], digest["created_at"], stats),
+            file_name="digest.json",
+            mime="application/json",
+            use_container_width=True
+        )
+
 # Interface principal
 st.markdown("""
 <div class="main-header">
@@ -87,13 +286,17 @@ with st.sidebar:
     col1, col2 = st.columns(2)
     with col1:
         if st.button("🗑️ Limpar Cache", help="Limpa todos os dados em cache"):
-            st.cache_data.clear()
-            st.cache_resource.clear()
+            clear_all_caches()
             st.success("Cache limpo!")
     
     with col2:
         if st.button("🔄 Resetar App", help="Reseta completamente a aplicação"):
-            st.cache_data.clear()
+            clear_all_caches()
+            # Threads de fundo sobrevivem ao descarte dos recursos: encerrá-las antes que o rerun crie outras
+            if prefetcher is not None:
+                prefetcher.stop()
+            if api_server is not None:
+                api_server.stop()
             st.cache_resource.clear()
             for key in list(st.session_state.keys()):
                 del st.session_state[key]
@@ -117,11 +320,70 @@ with st.sidebar:
     else:
         st.error("❌ OpenAI não configurada")
     
+    # Circuit breaker e cota por minuto de cada provedor
+    api_status = get_gateway().status()
+    quota_lines = []
+    for provider, label in [("serpapi", "SerpAPI"), ("GroqCloud", "GroqCloud"), ("OpenAI", "OpenAI")]:
+        provider_status = api_status.get(provider)
+        if not provider_status:
+            continue
+        if provider_status["state"] == "open":
+            st.warning(f"⛔ {label} instável: chamadas suspensas por {provider_status['retry_in']:.0f}s")
+        elif provider_status["state"] == "half_open":
+            st.info(f"🟡 {label}: testando recuperação")
+        if provider_status["requests_available"] is not None:
+            quota_lines.append(
+                f"{label}: {provider_status['requests_available']:.0f}/{provider_status['requests_per_minute']:.0f} req/min"
+            )
+    if quota_lines:
+        st.caption("⏱️ " + " · ".join(quota_lines))
+    
     # Configurações de busca
     st.subheader("Configurações de Busca")
     num_results = st.slider("Número de resultados", 3, 20, 10)
     language = st.selectbox("Idioma", ["pt", "en", "es"], index=0)
     country = st.selectbox("País", ["br", "us", "es", "global"], index=0)
+    fan_out = st.checkbox(
+        "Busca combinada (web + notícias)",
+        value=False,
+        help="Consulta web e notícias em paralelo e mescla os resultados"
+    )
+    extra_locales = st.multiselect(
+        "Idiomas/países adicionais",
+        ["pt-br", "en-us", "es-es"],
+        disabled=not fan_out,
+        help="Cada local extra é consultado em paralelo (consome cota da SerpAPI)"
+    )
+    expansion_labels = {"Desligada": "off", "Local": "local", "Com IA": "llm"}
+    expansion = expansion_labels[st.selectbox(
+        "Expansão da consulta",
+        list(expansion_labels),
+        index=0,
+        help="Busca também variações da consulta (sinônimos, ano, tradução ou sugestões de um modelo rápido) "
+             "e mescla os resultados; cada subconsulta consome cota da SerpAPI"
+    )]
+    expansions = st.slider("Subconsultas", 2, 5, 3, disabled=expansion == "off")
+    
+    rerank_results = st.checkbox(
+        "Deduplicar e reordenar fontes",
+        value=True,
+        help="Remove links repetidos e notícias replicadas e ordena as fontes por relevância"
+    )
+    fetch_articles = st.checkbox(
+        "Ler artigos completos",
+        value=False,
+        help="Baixa as páginas dos resultados para enriquecer a análise além dos snippets"
+    )
+    fetch_deadline = st.slider(
+        "Prazo para leitura (s)", 2, 15, 6,
+        disabled=not fetch_articles,
+        help="Páginas que não carregarem no prazo usam apenas o snippet"
+    )
+    watch_interval = st.slider(
+        "Acompanhamento: verificar a cada (min)", 1, 60, 5,
+        disabled=st.session_state.get("search_type") != "Acompanhar notícias",
+        help="No modo de acompanhamento, só as notícias novas são enviadas à IA"
+    )
     
     # Configurações do modelo
     st.subheader("Configurações da IA")
@@ -190,6 +452,47 @@ with st.sidebar:
     
     temperature = st.slider("Criatividade (Temperature)", 0.0, 1.0, 0.2)
     max_tokens = st.slider("Tamanho do resumo", 300, 2000, 800)
+    map_reduce = st.checkbox(
+        "Análise em lotes (map-reduce)",
+        value=False,
+        help="Resume lotes de fontes em paralelo com um modelo rápido e combina as notas com o modelo escolhido: cobre mais fontes (e artigos completos) sem estourar a janela"
+    )
+    map_model_choices = {
+        "GroqCloud": ["openai/gpt-oss-20b", "llama3-8b-8192", "gemma2-9b-it"],
+        "OpenAI": ["gpt-4o-mini", "gpt-3.5-turbo"],
+    }[ai_provider]
+    map_model = st.selectbox(
+        "Modelo dos lotes",
+        map_model_choices,
+        index=map_model_choices.index(DEFAULT_MAP_MODELS[ai_provider]),
+        disabled=not map_reduce
+    )
+    chunk_size = st.slider("Fontes por lote", 2, 8, 4, disabled=not map_reduce)
+    auto_fallback = st.checkbox(
+        "Fallback automático de modelos",
+        value=False,
+        help="Se o modelo demorar mais que o normal (p95) ou falhar, dispara um modelo mais rápido e usa a primeira resposta"
+    )
+    semantic_cache = st.checkbox(
+        "Reutilizar análises de buscas semelhantes",
+        value=True,
+        help="Reaproveita resumos de consultas quase idênticas (caixa, acentos, ordem das palavras)"
+    )
+    similarity_threshold = st.slider(
+        "Similaridade mínima", 0.70, 1.0, 0.90, 0.01,
+        disabled=not semantic_cache,
+        help="Limiar de similaridade entre consultas para reaproveitar uma análise"
+    )
+    stream_output = st.checkbox(
+        "Exibir resumo em tempo real (streaming)",
+        value=True,
+        help="Mostra a análise conforme é gerada e mede o tempo até o primeiro token"
+    )
+    reuse_history = st.checkbox(
+        "Reaproveitar análises do histórico",
+        value=True,
+        help="A mesma consulta com as mesmas opções é exibida do histórico local, sem gastar SerpAPI nem IA"
+    )
     
     # Nota especial para modelos especiais
     if ai_provider == "OpenAI" and model_choice.startswith("o1"):
@@ -208,247 +511,179 @@ with st.sidebar:
     else:
         st.info("🧠 OpenAI o1 oferece reasoning avançado para análises profundas!")
 
-def search_web(query: str, num_results: int = 10) -> List[Dict]:
-    """Buscar informações na web usando SerpAPI"""
-    if not serpapi_key:
-        st.error("❌ SERPAPI_KEY não configurada. Adicione no arquivo .env")
-        return []
-    
-    params = {
-        "q": query,
-        "api_key": serpapi_key,
-        "engine": "google",
-        "num": num_results,
-        "hl": language,
-        "gl": country if country != "global" else "us",
-        "safe": "active",
-        "tbm": "nws" if st.session_state.get('search_news', False) else None
-    }
-    
-    try:
-        response = requests.get("https://serpapi.com/search", params=params, timeout=15)
-        response.raise_for_status()
-        results = response.json()
-        
-        # Extrair diferentes tipos de resultados
-        all_results = []
-        
-        # Resultados orgânicos
-        organic_results = results.get("organic_results", [])
-        for item in organic_results:
-            all_results.append({
-                "title": item.get("title", ""),
-                "link": item.get("link", ""),
-                "snippet": item.get("snippet", ""),
-                "source": item.get("displayed_link", ""),
-                "type": "web"
-            })
-        
-        # Resultados de notícias
-        news_results = results.get("news_results", [])
-        for item in news_results:
-            all_results.append({
-                "title": item.get("title", ""),
-                "link": item.get("link", ""),
-                "snippet": item.get("snippet", ""),
-                "source": item.get("source", ""),
-                "type": "news",
-                "date": item.get("date", "")
-            })
-        
-        # Knowledge graph (se disponível)
-        knowledge_graph = results.get("knowledge_graph", {})
-        if knowledge_graph:
-            all_results.insert(0, {
-                "title": knowledge_graph.get("title", ""),
-                "link": knowledge_graph.get("website", ""),
-                "snippet": knowledge_graph.get("description", ""),
-                "source": "Knowledge Graph",
-                "type": "knowledge"
-            })
-        
-        return all_results
-        
-    except requests.RequestException as e:
-        st.error(f"Erro na requisição: {e}")
-        return []
-    except Exception as e:
-        st.error(f"Erro inesperado: {e}")
-        return []
-
-def generate_summary_with_ai(query: str, search_results: List[Dict], ai_provider: str, model_choice: str) -> str:
-    """Gerar resumo usando OpenAI ou GroqCloud"""
-    
-    # Preparar contexto dos resultados
-    context = ""
-    for i, result in enumerate(search_results[:12], 1):  # Limitar a 12 resultados
-        context += f"[FONTE {i}]\n"
-        context += f"Título: {result['title']}\n"
-        context += f"Tipo: {result['type'].upper()}\n"
-        context += f"Fonte: {result['source']}\n"
-        if result.get('date'):
-            context += f"Data: {result['date']}\n"
-        context += f"Conteúdo: {result['snippet']}\n"
-        context += f"Link: {result['link']}\n\n"
-    
-    # Prompt otimizado para análise
-    if model_choice.startswith("o1"):
-        # Prompt especial para modelos o1 (reasoning)
-        prompt = f"""Analise profundamente as informações sobre "{query}" e forneça uma análise estruturada e detalhada.
+# Fontes exibidas por página em cada aba
+sources_page_size = int(os.getenv("SOURCES_PAGE_SIZE", "8"))
 
-FONTES DISPONÍVEIS:
-{context}
+SOURCE_TABS = {
+    "web": ("🌐 Web", "Nenhum resultado web encontrado."),
+    "news": ("📰 Notícias", "Nenhuma notícia encontrada."),
+    "knowledge": ("🧠 Knowledge Graph", "Nenhum Knowledge Graph disponível."),
+}
 
-Como um analista especializado, crie um resumo abrangente que demonstre raciocínio crítico e análise profunda. Use apenas as informações das fontes fornecidas.
+def escape_link_text(text: str) -> str:
+    """Evitar que colchetes do título quebrem o link em markdown"""
+    return text.replace("[", "\\[").replace("]", "\\]")
 
-Estruture sua resposta com:
-- Resumo executivo dos pontos principais
-- Análise detalhada com insights críticos
-- Tendências e padrões identificados
-- Implicações e perspectivas futuras
-- Conclusões fundamentadas
-
-Seja preciso, analítico e use markdown para formatação."""
-    else:
-        # Prompt padrão para outros modelos
-        prompt = f"""Você é um analista especializado em síntese de informações. Analise as fontes sobre "{query}" e crie um resumo completo e estruturado.
-
-FONTES CONSULTADAS:
-{context}
-
-INSTRUÇÕES:
-1. Crie um resumo abrangente e bem fundamentado
-2. Use APENAS informações das fontes fornecidas
-3. Organize o conteúdo de forma lógica e fluida
-4. Destaque tendências e padrões importantes
-5. Mantenha neutralidade e objetividade
-6. Use formatação markdown para clareza
-7. Cite insights de diferentes fontes quando relevante
+@st.cache_data(max_entries=256, show_spinner=False)
+def render_sources_page(fingerprint: str, result_type: str, page: int, _results: List[SearchResult]) -> str:
+    """Markdown de uma página de fontes, em cache por conjunto de resultados (reruns não o remontam)"""
+    start = page * sources_page_size
+    blocks = []
+    for i, result in enumerate(_results[start:start + sources_page_size], start + 1):
+        if result_type == "knowledge":
+            block = f"**🧠 {result.title}**  \n📝 {result.snippet}"
+            if result.link:
+                block += f"  \n[➡️ Mais informações]({result.link})"
+        elif result_type == "news":
+            block = f"**{i}. [{escape_link_text(result.title)}]({result.link})**  \n📰 {result.source}"
+            if result.date:
+                block += f" · 📅 {result.date}"
+            block += f"  \n{result.snippet}"
+        else:
+            block = f"**{i}. [{escape_link_text(result.title)}]({result.link})**  \n🔗 {result.source}  \n{result.snippet}"
+        blocks.append(block)
+    return "\n\n".join(blocks)
 
-ESTRUTURA OBRIGATÓRIA:
-## 🎯 Resumo Executivo
-[Síntese dos pontos principais em 2-3 parágrafos]
+@st.fragment
+def display_sources(search_results: ResultSet):
+    """Exibir fontes de forma organizada (só a aba e a página escolhidas são montadas)"""
+    with metrics.span("sources_render"):
+        st.subheader("📚 Fontes Consultadas")
+        
+        # Abas como seletor: trocar de aba ou de página reexecuta só este fragmento
+        fingerprint = search_results.fingerprint()
+        result_type = st.radio(
+            "Tipo de fonte",
+            list(SOURCE_TABS),
+            format_func=lambda t: f"{SOURCE_TABS[t][0]} ({search_results.count(t)})",
+            horizontal=True,
+            label_visibility="collapsed",
+            key=f"sources_tab_{fingerprint}"
+        )
+        results = search_results.of_type(result_type)
+        if not results:
+            st.info(SOURCE_TABS[result_type][1])
+            return
+        
+        pages = -(-len(results) // sources_page_size)
+        page = 0
+        if pages > 1:
+            page = st.radio(
+                "Página",
+                range(pages),
+                format_func=lambda p: str(p + 1),
+                horizontal=True,
+                key=f"sources_page_{fingerprint}_{result_type}"
+            )
+            first = page * sources_page_size + 1
+            st.caption(f"Mostrando {first}–{min(first + sources_page_size - 1, len(results))} de {len(results)}")
+        st.markdown(render_sources_page(fingerprint, result_type, page, results))
 
-## 📊 Análise Detalhada
-[Desenvolvimento aprofundado dos temas centrais]
+def open_history_entry(entry_id: int, entry_query: str):
+    """Callback: exibir uma análise do histórico com a consulta correspondente no campo de busca"""
+    st.session_state['history_entry_id'] = entry_id
+    st.session_state['query'] = entry_query
+    st.session_state['last_query'] = entry_query
 
-## 🔍 Insights Principais
-• [Ponto relevante 1]
-• [Ponto relevante 2] 
-• [Ponto relevante 3]
-• [Outros insights importantes]
+def search_again():
+    """Callback: refazer a busca atual ignorando o histórico"""
+    st.session_state['history_bypass'] = True
+    st.session_state['last_query'] = None
 
-## 📈 Tendências e Perspectivas
-[Análise de tendências e projeções quando aplicável]
+def display_history_entry(entry: HistoryEntry, lookup_seconds: Optional[float] = None):
+    """Exibir uma análise registrada (sem chamar SerpAPI nem a IA)"""
+    result_set = ResultSet(entry.results)
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("📊 Fontes", len(result_set))
+    with col2:
+        st.metric("🌐 Sites", result_set.count('web'))
+    with col3:
+        st.metric("📰 Notícias", result_set.count('news'))
+    with col4:
+        total_time = entry.timings.get("total_time")
+        st.metric("⚡ Velocidade", f"{total_time:.1f}s" if total_time is not None else "—")
+    
+    st.markdown("---")
+    st.markdown("## 📋 Análise Inteligente")
+    caption = f"📚 Do histórico: {entry.model} em {datetime.fromtimestamp(entry.created_at).strftime('%d/%m/%Y às %H:%M')}"
+    if lookup_seconds is not None:
+        caption += f" · recuperada em {lookup_seconds * 1000:.0f} ms"
+    st.caption(caption)
+    st.markdown(entry.summary)
+    st.button("🔄 Buscar novamente", on_click=search_again, help="Consultar a SerpAPI e a IA de novo")
+    
+    st.markdown("---")
+    display_sources(result_set)
 
-## 💡 Conclusões
-[Síntese final e considerações importantes]
+def render_history_panel():
+    """Busca no histórico; só este painel é reexecutado enquanto se digita"""
+    history_query = st.text_input(
+        "🔎 Buscar no histórico",
+        key="history_search",
+        placeholder="Ex: regulação, bitcoin...",
+        help="Procura nas consultas, análises e fontes já vistas (prefixos e sem acentos)"
+    )
+    matches = history_store.search(history_query) if history_query.strip() else history_store.recent(5)
+    if history_query.strip() and not matches:
+        st.caption("Nada encontrado no histórico.")
+    for match in matches:
+        if st.button(
+            f"{match.query} · {datetime.fromtimestamp(match.created_at).strftime('%d/%m %H:%M')}",
+            key=f"history_{match.id}",
+            help=match.snippet,
+            on_click=open_history_entry,
+            args=(match.id, match.query),
+            use_container_width=True
+        ):
+            # O clique só reexecuta o fragmento: a análise escolhida aparece na área principal
+            st.rerun(scope="app")
 
-Responda APENAS com o resumo estruturado. Seja preciso e informativo."""
-    
-    try:
-        if ai_provider == "OpenAI":
-            if not openai_client:
-                return "❌ OpenAI não configurada. Configure OPENAI_API_KEY no arquivo .env"
-            
-            # Configurações específicas para modelos o1
-            if model_choice.startswith("o1"):
-                response = openai_client.chat.completions.create(
-                    model=model_choice,
-                    messages=[
-                        {"role": "user", "content": prompt}
-                    ],
-                    # Modelos o1 não suportam system message, temperature, etc.
-                )
-            else:
-                response = openai_client.chat.completions.create(
-                    model=model_choice,
-                    messages=[
-                        {
-                            "role": "system", 
-                            "content": "Você é um especialista em análise de informações que cria resumos precisos e bem estruturados baseados em fontes web confiáveis."
-                        },
-                        {
-                            "role": "user", 
-                            "content": prompt
-                        }
-                    ],
-                    max_tokens=max_tokens,
-                    temperature=temperature
+def render_news_watch(watch: NewsWatch, search_options: SearchOptions, summary_options: SummaryOptions, interval_seconds: int):
+    """Feed de acompanhamento: busca novidades quando o intervalo vence e atualiza a análise"""
+    check_now = st.button("🔄 Verificar agora")
+    due = watch.last_poll is None or time.time() - watch.last_poll >= interval_seconds - 1
+    if check_now or due:
+        with st.spinner("📰 Verificando novas notícias..."):
+            try:
+                poll_news(
+                    watch, serpapi_key, get_ai_client(summary_options.ai_provider, api_keys[summary_options.ai_provider]),
+                    search_options, summary_options, article_fetcher
                 )
-            
-            return response.choices[0].message.content
-            
-        else:  # GroqCloud
-            if not groq_client:
-                return "❌ GroqCloud não configurada. Configure GROQ_API_KEY no arquivo .env"
-            
-            response = groq_client.chat.completions.create(
-                model=model_choice,
-                messages=[
-                    {
-                        "role": "system", 
-                        "content": "Você é um especialista em análise de informações que cria resumos precisos e bem estruturados baseados em fontes web confiáveis."
-                    },
-                    {
-                        "role": "user", 
-                        "content": prompt
-                    }
-                ],
-                max_tokens=max_tokens,
-                temperature=temperature,
-                top_p=0.9,
-                stream=False
-            )
-            
-            return response.choices[0].message.content
-        
-    except Exception as e:
-        return f"❌ Erro ao gerar resumo: {str(e)}\n\nVerifique se sua chave de API está correta."
-
-def display_sources(search_results: List[Dict]):
-    """Exibir fontes de forma organizada"""
-    st.subheader("📚 Fontes Consultadas")
-    
-    # Separar por tipo
-    knowledge_results = [r for r in search_results if r.get('type') == 'knowledge']
-    news_results = [r for r in search_results if r.get('type') == 'news']
-    web_results = [r for r in search_results if r.get('type') == 'web']
+            except Exception as e:
+                st.error(error_message(e))
     
-    # Exibir em abas
-    tab1, tab2, tab3 = st.tabs(["🌐 Web", "📰 Notícias", "🧠 Knowledge Graph"])
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("🔁 Verificações", watch.polls)
+    with col2:
+        st.metric("📰 Notícias acompanhadas", len(watch.sources))
+    with col3:
+        st.metric("🆕 Novas", len(watch.last_new))
+    with col4:
+        saved = watch.full_prompt_tokens - watch.prompt_tokens
+        st.metric("📉 Tokens do prompt", watch.prompt_tokens, f"-{saved}" if saved > 0 else None, delta_color="inverse")
+    if watch.last_poll is not None:
+        st.caption(
+            f"🕒 Última verificação: {datetime.fromtimestamp(watch.last_poll).strftime('%H:%M:%S')} · "
+            f"próxima em {interval_seconds // 60} min"
+        )
     
-    with tab1:
-        if web_results:
-            for i, result in enumerate(web_results, 1):
-                with st.expander(f"{i}. {result['title'][:70]}..."):
-                    st.write(f"**🔗 Fonte:** {result['source']}")
-                    st.write(f"**📝 Resumo:** {result['snippet']}")
-                    st.markdown(f"[➡️ Acessar link completo]({result['link']})")
-        else:
-            st.info("Nenhum resultado web encontrado.")
+    st.markdown("---")
+    st.markdown("## 📋 Análise Acompanhada")
+    if watch.summary:
+        st.markdown(watch.summary)
+    else:
+        st.info("Nenhuma notícia encontrada ainda. A busca será repetida automaticamente.")
     
-    with tab2:
-        if news_results:
-            for i, result in enumerate(news_results, 1):
-                with st.expander(f"{i}. {result['title'][:70]}..."):
-                    st.write(f"**📰 Fonte:** {result['source']}")
-                    if result.get('date'):
-                        st.write(f"**📅 Data:** {result['date']}")
-                    st.write(f"**📝 Resumo:** {result['snippet']}")
-                    st.markdown(f"[➡️ Ler notícia completa]({result['link']})")
-        else:
-            st.info("Nenhuma notícia encontrada.")
+    if watch.last_new:
+        st.markdown("### 🆕 Novas desde a última verificação")
+        for result in watch.last_new:
+            st.markdown(f"- [{result.title}]({result.link}) — {result.source} {result.date}")
     
-    with tab3:
-        if knowledge_results:
-            for result in knowledge_results:
-                st.write(f"**🧠 Título:** {result['title']}")
-                st.write(f"**📝 Descrição:** {result['snippet']}")
-                if result['link']:
-                    st.markdown(f"[➡️ Mais informações]({result['link']})")
-        else:
-            st.info("Nenhum Knowledge Graph disponível.")
+    if watch.sources:
+        st.markdown("---")
+        display_sources(ResultSet(watch.sources))
 
 # Interface principal
 col1, col2, col3 = st.columns([3, 1, 1])
@@ -456,13 +691,14 @@ col1, col2, col3 = st.columns([3, 1, 1])
 with col1:
     query = st.text_input(
         "🔍 Digite sua pesquisa:",
+        key="query",
         placeholder="Ex: inteligência artificial 2024, economia brasileira, tecnologia...",
         help="Digite qualquer tema para buscar informações atualizadas e receber análise por IA"
     )
 
 with col2:
-    search_type = st.selectbox("Tipo", ["Geral", "Notícias"], key="search_type")
-    if search_type == "Notícias":
+    search_type = st.selectbox("Tipo", ["Geral", "Notícias", "Acompanhar notícias", "Digest de temas"], key="search_type")
+    if search_type in ("Notícias", "Acompanhar notícias", "Digest de temas"):
         st.session_state['search_news'] = True
     else:
         st.session_state['search_news'] = False
@@ -470,11 +706,105 @@ with col2:
 with col3:
     search_button = st.button("🚀 Buscar", type="primary", use_container_width=True)
 
+# Digest: vários temas numa página, buscas em paralelo e temas pequenos agrupados na mesma chamada à IA
+if search_type == "Digest de temas":
+    digest_text = st.text_area(
+        "📰 Temas do digest (um por linha)",
+        key="digest_topics",
+        height=150,
+        placeholder="inteligência artificial\nbitcoin\neleições 2026",
+        help="As buscas rodam em paralelo e temas pequenos são resumidos juntos numa única chamada à IA"
+    )
+    digest_topics = parse_topics(digest_text)
+    digest_button = st.button(f"📰 Gerar digest ({len(digest_topics)} temas)", type="primary", disabled=not digest_topics)
+    if digest_button and (not serpapi_key or not api_keys[ai_provider]):
+        st.error(f"⚠️ Configure SERPAPI_KEY e a chave do {ai_provider} no arquivo .env")
+    else:
+        digest_search_options = SearchOptions(
+            num_results=num_results,
+            language=language,
+            country=country,
+            news=True,
+            rerank=rerank_results,
+            fetch_articles=fetch_articles,
+            fetch_deadline=fetch_deadline
+        )
+        digest_summary_options = SummaryOptions(
+            ai_provider=ai_provider,
+            model_choice=model_choice,
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+        render_digest(digest_topics, digest_search_options, digest_summary_options, digest_button)
+
+# Modo de acompanhamento: feed contínuo que só resume as notícias novas
+elif query and search_type == "Acompanhar notícias":
+    st.session_state['last_query'] = query
+    if not serpapi_key or not api_keys[ai_provider]:
+        st.error(f"⚠️ Configure SERPAPI_KEY e a chave do {ai_provider} no arquivo .env")
+    else:
+        watch = st.session_state.get('news_watch')
+        if watch is None or watch.query != query:
+            watch = NewsWatch(query)
+            st.session_state['news_watch'] = watch
+        watch_search_options = SearchOptions(
+            num_results=num_results,
+            language=language,
+            country=country,
+            news=True,
+            rerank=rerank_results,
+            fetch_articles=fetch_articles,
+            fetch_deadline=fetch_deadline
+        )
+        watch_summary_options = SummaryOptions(
+            ai_provider=ai_provider,
+            model_choice=model_choice,
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+        # O fragmento se reexecuta sozinho no intervalo, sem rerun da página inteira
+        st.fragment(render_news_watch, run_every=watch_interval * 60)(
+            watch, watch_search_options, watch_summary_options, watch_interval * 60
+        )
+
 # Executar busca
-if query and (search_button or st.session_state.get('last_query') != query):
+elif query and (search_button or st.session_state.get('last_query') != query):
     st.session_state['last_query'] = query
     
-    if not serpapi_key:
+    search_options = SearchOptions(
+        num_results=num_results,
+        language=language,
+        country=country,
+        news=st.session_state.get('search_news', False),
+        fan_out=fan_out,
+        extra_locales=extra_locales,
+        rerank=rerank_results,
+        fetch_articles=fetch_articles,
+        fetch_deadline=fetch_deadline,
+        expansion=expansion,
+        expansions=expansions
+    )
+    summary_options = SummaryOptions(
+        ai_provider=ai_provider,
+        model_choice=model_choice,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        map_reduce=map_reduce,
+        map_model=map_model,
+        chunk_size=chunk_size
+    )
+    
+    # Consulta idêntica recente: servir do histórico local
+    history_entry = None
+    if reuse_history and not st.session_state.pop('history_bypass', False):
+        lookup_start = time.perf_counter()
+        with metrics.span("history_lookup"):
+            history_entry = history_store.find_exact(query, search_options, summary_options, history_max_age)
+    
+    if history_entry is not None:
+        st.session_state['history_entry_id'] = history_entry.id
+        display_history_entry(history_entry, time.perf_counter() - lookup_start)
+    elif not serpapi_key:
         st.error("⚠️ Configure SERPAPI_KEY no arquivo .env")
     elif ai_provider == "OpenAI" and not openai_api_key:
         st.error("⚠️ Configure OPENAI_API_KEY no arquivo .env para usar modelos OpenAI")
@@ -485,72 +815,155 @@ if query and (search_button or st.session_state.get('last_query') != query):
         results_container = st.container()
         
         with results_container:
-            # Mostrar progresso
+            # Mostrar progresso (cada etapa pesa conforme sua duração típica)
             progress_bar = st.progress(0)
             status_text = st.empty()
+            stage_weights = {
+                "search": expected_seconds(["query_expansion", "serpapi_request", "json_parse", "result_extraction"], 2.0),
+                "prepare": expected_seconds(["ranking"] + (["article_fetch"] if fetch_articles else []), fetch_deadline if fetch_articles else 0.1),
+                "summary": expected_seconds(["prompt_build", "llm_request"], 5.0, provider=ai_provider, model=model_choice)
+                + (expected_seconds(["map_phase"], 2.0, provider=ai_provider, model=map_model) if map_reduce else 0),
+            }
+            total_weight = sum(stage_weights.values())
+            
+            def show_progress(done_stages: List[str], partial: float = 0.0, current: str = None):
+                """Atualizar a barra com as etapas concluídas e a fração da etapa atual"""
+                done = sum(stage_weights[stage] for stage in done_stages)
+                if current:
+                    done += stage_weights[current] * min(partial, 1.0)
+                progress_bar.progress(min(int(100 * done / total_weight), 100))
             
-            # Passo 1: Buscar na web
-            status_text.text("🔍 Buscando informações na web...")
-            progress_bar.progress(30)
+            # Passo 1: Buscar na web (com as subconsultas da expansão, se habilitada)
+            ai_client = get_ai_client(ai_provider, api_keys[ai_provider])
+            sub_queries = expand_query(query, search_options, ai_client, ai_provider)
+            if sub_queries:
+                status_text.text(f"🔍 Buscando informações na web ({len(sub_queries) + 1} consultas)...")
+                st.caption("🔀 Subconsultas: " + " · ".join(sub_query.query for sub_query in sub_queries))
+            else:
+                status_text.text("🔍 Buscando informações na web...")
+            
+            if prefetcher is not None:
+                prefetcher.tracker.record(query, search_options, summary_options)
             
-            search_results = search_web(query, num_results)
+            search_results, search_errors = search_web(query, serpapi_key, search_options, search_cache, ai_client, ai_provider, sub_queries)
+            if search_errors and search_results:
+                st.warning(f"⚠️ Algumas buscas falharam: {', '.join(sorted(search_errors))}")
+            elif search_errors:
+                st.error("; ".join(search_errors.values()))
             
             if not search_results:
                 progress_bar.empty()
                 status_text.empty()
                 st.warning("❌ Nenhum resultado encontrado. Tente termos diferentes ou verifique sua conexão.")
             else:
-                # Passo 2: Gerar resumo com IA
+                # Passo 2: Deduplicar/reordenar e (opcional) ler artigos completos
+                show_progress(["search"])
+                if fetch_articles:
+                    status_text.text("📄 Lendo artigos completos...")
+                search_results = prepare_sources(query, search_results, search_options, article_fetcher)
+                
+                # Passo 3: Gerar resumo com IA
                 if ai_provider == "GroqCloud" and "gpt-oss" in model_choice:
                     provider_text = "🚀 Analisando com OpenAI OSS..."
                 elif model_choice.startswith("o1"):
                     provider_text = "🧠 o1 Reasoning..."
                 else:
                     provider_text = f"⚡ Analisando com {ai_provider}..."
+                if map_reduce:
+                    chunk_count_total = map_chunk_count(search_results, summary_options)
+                    provider_text = f"🧩 Resumindo {chunk_count_total} lotes com {map_model} e combinando... " + provider_text
                     
                 status_text.text(provider_text)
-                progress_bar.progress(70)
+                show_progress(["search", "prepare"])
+                
+                # Métricas detalhadas (tempos preenchidos após a geração)
+                col1, col2, col3, col4, col5, col6 = st.columns(6)
+                result_set = ResultSet(search_results)
+                with col1:
+                    st.metric("📊 Fontes", len(result_set))
+                with col2:
+                    st.metric("🌐 Sites", result_set.count('web'))
+                with col3:
+                    st.metric("📰 Notícias", result_set.count('news'))
+                with col4:
+                    speed_metric = st.empty()
+                with col5:
+                    ttft_metric = st.empty()
+                with col6:
+                    tps_metric = st.empty()
+                
+                # Resumo principal
+                st.markdown("---")
+                st.markdown("## 📋 Análise Inteligente")
+                summary_placeholder = st.empty()
+                
+                # Reaproveitar análise em cache (mesma consulta/fontes ou consulta semelhante)
+                summary_model_key, sources_fingerprint = summary_cache_key(query, search_results, summary_options)
+                cached_summary = summary_cache.get(
+                    query, summary_model_key, sources_fingerprint,
+                    similarity_threshold if semantic_cache else None
+                )
                 
                 # Cronometrar a geração
-                start_time = datetime.now()
-                summary = generate_summary_with_ai(query, search_results, ai_provider, model_choice)
-                end_time = datetime.now()
-                generation_time = (end_time - start_time).total_seconds()
+                model_router = get_router() if auto_fallback else None
+                generation_stats = {}
+                start_time = time.perf_counter()
+                if cached_summary is not None:
+                    summary = cached_summary
+                    st.caption("♻️ Análise reaproveitada do cache")
+                elif stream_output:
+                    summary = ""
+                    for chunk_count, chunk in enumerate(stream_summary_with_ai(query, search_results, ai_client, summary_options, generation_stats, model_router), 1):
+                        summary += chunk
+                        summary_placeholder.markdown(summary + "▌")
+                        # Cada chunk traz aproximadamente um token do limite configurado
+                        show_progress(["search", "prepare"], chunk_count / max_tokens, "summary")
+                else:
+                    summary = generate_summary_with_ai(query, search_results, ai_client, summary_options, generation_stats, model_router)
                 
-                # Passo 3: Finalizar
+                if cached_summary is None and "❌" not in summary:
+                    summary_cache.set(query, summary_model_key, sources_fingerprint, summary)
+                generation_time = generation_stats.get("total_time", time.perf_counter() - start_time)
+                if "❌" not in summary:
+                    st.session_state['history_entry_id'] = history_store.record(
+                        query, search_options, summary_options, search_results, summary,
+                        dict(generation_stats, total_time=generation_time)
+                    )
+                
+                # Passo 4: Finalizar
                 status_text.text("✅ Análise concluída!")
-                progress_bar.progress(100)
+                show_progress(["search", "prepare", "summary"])
                 
                 # Limpar indicadores
                 progress_bar.empty()
                 status_text.empty()
                 
-                # Métricas detalhadas
-                col1, col2, col3, col4 = st.columns(4)
-                with col1:
-                    st.metric("📊 Fontes", len(search_results))
-                with col2:
-                    web_count = len([r for r in search_results if r.get('type') == 'web'])
-                    st.metric("🌐 Sites", web_count)
-                with col3:
-                    news_count = len([r for r in search_results if r.get('type') == 'news'])
-                    st.metric("📰 Notícias", news_count)
-                with col4:
-                    st.metric("⚡ Velocidade", f"{generation_time:.1f}s")
+                speed_metric.metric("⚡ Velocidade", f"{generation_time:.1f}s")
+                ttft = generation_stats.get("ttft")
+                ttft_metric.metric("⏱️ 1º Token", f"{ttft:.2f}s" if ttft is not None else "—")
+                tokens_per_second = generation_stats.get("tokens_per_second")
+                tps_metric.metric("🚀 Tokens/s", f"{tokens_per_second:.0f}" if tokens_per_second else "—")
                 
-                # Resumo principal
-                st.markdown("---")
-                st.markdown("## 📋 Análise Inteligente")
+                if generation_stats.get("map_chunks"):
+                    st.caption(
+                        f"🧩 {generation_stats['map_chunks']} lotes resumidos em paralelo com {map_model} "
+                        f"em {generation_stats['map_time']:.1f}s"
+                    )
+                answered_by = generation_stats.get("model")
+                if answered_by and answered_by != model_choice:
+                    st.caption(f"🔀 Resposta gerada por {answered_by} ({model_choice} estava lento ou indisponível)")
+                
+                render_start = time.perf_counter()
                 
                 # Exibir o resumo
                 if "❌" not in summary:
-                    st.markdown(summary)
+                    summary_placeholder.markdown(summary)
                 else:
-                    st.error(summary)
+                    summary_placeholder.error(summary)
                 
                 # Fontes
                 st.markdown("---")
-                display_sources(search_results)
+                display_sources(result_set)
                 
                 # Informações adicionais
                 st.markdown("---")
@@ -568,6 +981,13 @@ if query and (search_button or st.session_state.get('last_query') != query):
                             st.success(f"🚀 OpenAI OSS processou em {generation_time:.1f}s")
                         else:
                             st.success(f"⚡ GroqCloud processou em {generation_time:.1f}s")
+                metrics.observe("render", time.perf_counter() - render_start, provider=ai_provider, model=model_choice)
+
+# Reruns com a mesma consulta (ex.: mudança na sidebar) mantêm a última análise na tela
+elif query and st.session_state.get('history_entry_id'):
+    history_entry = history_store.get(st.session_state['history_entry_id'])
+    if history_entry is not None:
+        display_history_entry(history_entry)
 
 # Footer
 st.markdown("---")
@@ -579,8 +999,63 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
-# Dicas na sidebar
+# Estatísticas do cache e dicas na sidebar
 with st.sidebar:
+    st.markdown("---")
+    st.subheader("🗄️ Cache de Buscas")
+    cache_stats = search_cache.stats()
+    cache_col1, cache_col2 = st.columns(2)
+    with cache_col1:
+        st.metric("✅ Hits", cache_stats["hits"])
+        st.metric("💰 Cota economizada", cache_stats["quota_saved"])
+    with cache_col2:
+        st.metric("❌ Misses", cache_stats["misses"])
+        st.metric("📦 Entradas", cache_stats["entries"])
+    if cache_backend is not None and cache_backend.shared:
+        backend_name = type(cache_backend).__name__.replace("Backend", "")
+        st.caption(f"🔗 Cache compartilhado ({backend_name}): hits e entradas somam todos os processos")
+    
+    summary_stats = summary_cache.stats()
+    st.caption(
+        f"🧠 Análises: {summary_stats['hits']} exatas, {summary_stats['semantic_hits']} semelhantes, "
+        + (f"{summary_stats['shared_hits']} de outros processos, " if cache_backend is not None else "")
+        + f"{summary_stats['misses']} geradas ({summary_stats['entries']} em cache)"
+    )
+    
+    if prefetcher is not None:
+        hot_queries = prefetcher.tracker.top(prefetcher.top_n, prefetcher.min_hits)
+        st.caption(
+            f"🔥 Pré-aquecimento: {prefetcher.stats['searches']} buscas e "
+            f"{prefetcher.stats['summaries']} análises renovadas"
+            + (f" · em alta: {', '.join(item.query for item in hot_queries)}" if hot_queries else "")
+        )
+
+    st.markdown("---")
+    st.subheader(f"🕘 Histórico ({history_store.count()})")
+    st.caption("📁 Consultas e análises ficam gravadas localmente neste servidor até serem apagadas")
+    st.fragment(render_history_panel)()
+    if st.button("🗑️ Limpar histórico"):
+        history_store.clear()
+        st.session_state.pop('history_entry_id', None)
+        st.rerun()
+
+    latency_report = metrics.snapshot()
+    if latency_report:
+        with st.expander("📈 Latência por Etapa"):
+            st.dataframe(
+                [
+                    {"Etapa": name, **{k: f"{v:.3f}s" if isinstance(v, float) else v for k, v in values.items()}}
+                    for name, values in sorted(latency_report.items())
+                ],
+                hide_index=True
+            )
+            st.download_button(
+                "📥 Exportar (Prometheus)",
+                metrics.export_prometheus(),
+                file_name="metrics.txt",
+                mime="text/plain"
+            )
+
     st.markdown("---")
     st.subheader("💡 Dicas de Uso")
     st.markdown("""
@@ -611,3 +1086,5 @@ with st.sidebar:
     
     **Velocidade**: 500+ tokens/s (120B) e 1000+ tokens/s (20B)
     """)
+
+metrics.observe("app_rerun", time.perf_counter() - rerun_start)
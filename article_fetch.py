@@ -0,0 +1,236 @@
+import codecs
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from html.parser import HTMLParser
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+from search_result import SearchResult
+from web_search import get_http_session
+
+# Limites da etapa de leitura de artigos
+MAX_PAGE_BYTES = 2 * 1024 * 1024
+MAX_EXTRACT_CHARS = 4000
+MIN_PARAGRAPH_CHARS = 60
+USER_AGENT = "Mozilla/5.0 (compatible; MotorBuscaInteligente/1.0)"
+
+# Tags cujo conteúdo nunca é texto principal
+_SKIP_TAGS = {"script", "style", "noscript", "nav", "header", "footer", "aside", "form", "svg", "iframe", "button"}
+_BLOCK_TAGS = {"p", "li", "h1", "h2", "h3", "h4", "blockquote", "pre", "td", "div", "section", "article", "main", "br"}
+_META_CHARSET = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?([\w.:-]+)""", re.IGNORECASE)
+
+
+class _MainTextParser(HTMLParser):
+    """Separar o texto em blocos, ignorando navegação, scripts e afins"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocks: List[str] = []
+        self.article_blocks: List[str] = []
+        self._current: List[str] = []
+        self._skip_depth = 0
+        self._article_depth = 0
+
+    def _flush(self):
+        text = re.sub(r"\s+", " ", "".join(self._current)).strip()
+        self._current = []
+        if text:
+            self.blocks.append(text)
+            if self._article_depth:
+                self.article_blocks.append(text)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in ("article", "main"):
+            self._flush()
+            self._article_depth += 1
+        elif tag in _BLOCK_TAGS:
+            self._flush()
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP_TAGS:
+            self._skip_depth = max(self._skip_depth - 1, 0)
+        elif tag in ("article", "main"):
+            self._flush()
+            self._article_depth = max(self._article_depth - 1, 0)
+        elif tag in _BLOCK_TAGS:
+            self._flush()
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self._current.append(data)
+
+
+def extract_main_text(html: str, max_chars: int = MAX_EXTRACT_CHARS) -> str:
+    """Extrair o texto principal de uma página HTML (sem menus, rodapés etc.)"""
+    parser = _MainTextParser()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception:
+        return ""
+    parser._flush()
+
+    # Preferir o conteúdo de <article>/<main>; senão, blocos com texto corrido
+    blocks = parser.article_blocks or parser.blocks
+    paragraphs = [b for b in blocks if len(b) >= MIN_PARAGRAPH_CHARS]
+    return "\n".join(paragraphs)[:max_chars]
+
+
+def page_encoding(content_type: str, header_encoding: Optional[str], body: bytes) -> str:
+    """Charset da página: o do Content-Type; sem ele, <meta charset>, UTF-8 válido ou Windows-1252
+
+    Sem charset no cabeçalho o requests assume ISO-8859-1 para text/html, o que estraga acentos
+    de páginas em UTF-8 (a maioria dos sites de notícias).
+    """
+    if header_encoding and "charset" in content_type.lower():
+        return header_encoding
+    match = _META_CHARSET.search(body[:4096])
+    if match:
+        try:
+            return codecs.lookup(match.group(1).decode("ascii")).name
+        except LookupError:
+            pass
+    try:
+        # Incremental: a página pode ter sido cortada no meio de um caractere (MAX_PAGE_BYTES)
+        codecs.getincrementaldecoder("utf-8")().decode(body, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    # Não é UTF-8: sites em português sem charset declarado são Latin-1/Windows-1252 (a detecção
+    # estatística confunde com ISO-8859-10 e troca "ç" por "į")
+    return "windows-1252"
+
+
+class HostRateLimiter:
+    """Intervalo mínimo entre requisições ao mesmo host"""
+
+    def __init__(self, min_interval: float = 0.5):
+        self.min_interval = min_interval
+        self._next_allowed: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, host: str, deadline: Optional[float] = None) -> Optional[float]:
+        """Reservar o próximo horário livre para o host; retorna quanto esperar (None, sem reservar, se passar de `deadline`)"""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_allowed.get(host, 0.0))
+            if deadline is not None and slot >= deadline:
+                return None
+            self._next_allowed[host] = slot + self.min_interval
+            return slot - now
+
+
+class ArticleCache:
+    """Cache LRU de textos extraídos por URL, com validadores HTTP (ETag/Last-Modified)"""
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, url: str) -> Optional[Dict]:
+        """Entrada em cache (texto e validadores) ou None"""
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None:
+                self._entries.move_to_end(url)
+            return entry
+
+    def set(self, url: str, text: str, etag: Optional[str], last_modified: Optional[str]):
+        """Armazenar o texto extraído com os validadores da resposta"""
+        with self._lock:
+            self._entries[url] = {"text": text, "etag": etag, "last_modified": last_modified}
+            self._entries.move_to_end(url)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Remover todos os textos em cache"""
+        with self._lock:
+            self._entries.clear()
+
+
+class ArticleFetcher:
+    """Baixar e extrair artigos em paralelo com prazo global e limite por host"""
+
+    def __init__(
+        self,
+        max_workers: int = 6,
+        per_host_interval: float = 0.5,
+        request_timeout: float = 5,
+        cache: Optional[ArticleCache] = None,
+    ):
+        self.request_timeout = request_timeout
+        self.cache = cache if cache is not None else ArticleCache()
+        self.rate_limiter = HostRateLimiter(per_host_interval)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="article")
+
+    def fetch_text(self, url: str, deadline: float) -> Optional[str]:
+        """Baixar uma página (revalidando o cache) e devolver o texto principal"""
+        host = urlparse(url).netloc.lower()
+        # Prazo conferido antes da reserva: URL que não vai rodar não ocupa a vez do host
+        delay = self.rate_limiter.reserve(host, deadline)
+        if delay is None:
+            return None
+        if delay > 0:
+            time.sleep(delay)
+
+        cached = self.cache.get(url)
+        headers = {"User-Agent": USER_AGENT, "Accept": "text/html,application/xhtml+xml"}
+        if cached:
+            if cached["etag"]:
+                headers["If-None-Match"] = cached["etag"]
+            if cached["last_modified"]:
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        timeout = max(min(self.request_timeout, deadline - time.monotonic()), 0.1)
+        with get_http_session().get(url, headers=headers, timeout=timeout, stream=True) as response:
+            if response.status_code == 304 and cached:
+                return cached["text"]
+            response.raise_for_status()
+            if "html" not in response.headers.get("Content-Type", "text/html"):
+                return None
+
+            body = bytearray()
+            for chunk in response.iter_content(64 * 1024):
+                body.extend(chunk)
+                if len(body) >= MAX_PAGE_BYTES or time.monotonic() >= deadline:
+                    break
+            html = body.decode(page_encoding(response.headers.get("Content-Type", ""), response.encoding, bytes(body)), errors="replace")
+
+        text = extract_main_text(html)
+        self.cache.set(url, text, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        return text
+
+    def enrich(self, search_results: List[SearchResult], deadline_seconds: float = 6, limit: int = 12) -> List[SearchResult]:
+        """Adicionar 'content' aos resultados; o que não terminar no prazo fica só com o snippet"""
+        deadline = time.monotonic() + deadline_seconds
+        enriched = list(search_results)
+
+        def fetch(url: str) -> Optional[str]:
+            try:
+                return self.fetch_text(url, deadline)
+            except Exception:
+                return None
+
+        futures = {
+            i: self._executor.submit(fetch, result.link)
+            for i, result in enumerate(enriched[:limit])
+            if result.link.startswith(("http://", "https://"))
+        }
+        wait(futures.values(), timeout=max(deadline - time.monotonic(), 0))
+
+        for i, future in futures.items():
+            if not future.done():
+                future.cancel()
+                continue
+            text = future.result()
+            # Só substituir o snippet quando o extrato for realmente mais rico
+            if text and len(text) > len(enriched[i].snippet):
+                enriched[i] = enriched[i].copy(content=text)
+        return enriched
@@ -0,0 +1,101 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from bench.redis_stub import RedisStub
+from bench.stub_server import load_fixture
+
+
+def query_stream(requests: int, distinct: int, skew: float, seed: int) -> List[str]:
+    """Consultas com popularidade de Zipf (poucas muito repetidas, cauda longa)"""
+    rng = random.Random(seed)
+    weights = [1 / (rank ** skew) for rank in range(1, distinct + 1)]
+    return [f"consulta {index}" for index in rng.choices(range(distinct), weights=weights, k=requests)]
+
+
+def run_replica(url: str, queries: List[str]) -> Dict:
+    """Uma réplica (processo próprio): busca no cache e grava o que faltou, como o app faria"""
+    from cache_backends import create_backend
+    from search_cache import SearchCache
+    from web_search import parse_serpapi_results
+
+    results = parse_serpapi_results(load_fixture("serpapi_search.json"))
+    cache = SearchCache(create_backend(url))
+    hits = 0
+    start = time.perf_counter()
+    for query in queries:
+        params = {"q": query, "engine": "google", "hl": "pt", "gl": "br", "num": 10}
+        if cache.get(params) is not None:
+            hits += 1
+        else:
+            cache.set(params, results)
+    return {"hits": hits, "requests": len(queries), "seconds": time.perf_counter() - start}
+
+
+def run_backend(url: str, replicas: int, stream: List[str]) -> Dict:
+    """Distribuir o tráfego entre as réplicas (round-robin, como um balanceador) e somar os acertos"""
+    shards = [stream[i::replicas] for i in range(replicas)]
+    with multiprocessing.get_context("spawn").Pool(replicas) as pool:
+        outcomes = pool.starmap(run_replica, [(url, shard) for shard in shards])
+    hits = sum(outcome["hits"] for outcome in outcomes)
+    requests = sum(outcome["requests"] for outcome in outcomes)
+    seconds = sum(outcome["seconds"] for outcome in outcomes)
+    return {
+        "hit_rate": hits / requests if requests else 0.0,
+        "searches": requests - hits,
+        "us_per_op": seconds / requests * 1e6 if requests else 0.0,
+    }
+
+
+def run(replicas: int, requests: int, distinct: int, skew: float, seed: int) -> Dict:
+    """Comparar caches por processo com os backends compartilhados na mesma carga"""
+    stream = query_stream(requests, distinct, skew, seed)
+    report = {"replicas": replicas, "requests": requests, "distinct": distinct, "backends": {}}
+    with RedisStub() as redis, tempfile.TemporaryDirectory() as tmp:
+        backends = {
+            "memória (por réplica)": "memory://",
+            "sqlite (compartilhado)": os.path.join(tmp, "cache.sqlite3"),
+            "redis (compartilhado)": redis.url,
+        }
+        for name, url in backends.items():
+            report["backends"][name] = run_backend(url, replicas, stream)
+    return report
+
+
+def print_report(report: Dict):
+    print(f"{report['replicas']} réplicas, {report['requests']} buscas, {report['distinct']} consultas distintas")
+    print(f"{'backend':<24} {'acertos':>8} {'SerpAPI':>8} {'µs/op':>8}")
+    for name, row in report["backends"].items():
+        print(f"{name:<24} {row['hit_rate']:>8.0%} {row['searches']:>8} {row['us_per_op']:>8.0f}")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Argumentos da linha de comando"""
+    parser = argparse.ArgumentParser(description="Taxa de acerto do cache por réplica x compartilhado")
+    parser.add_argument("--replicas", type=int, default=4, help="Processos simulando réplicas atrás do balanceador")
+    parser.add_argument("--requests", type=int, default=2000, help="Buscas no total")
+    parser.add_argument("--distinct", type=int, default=500, help="Consultas distintas")
+    parser.add_argument("--skew", type=float, default=1.0, help="Expoente de Zipf da popularidade")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("-o", "--output", help="Gravar o relatório em JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    report = run(args.replicas, args.requests, args.distinct, args.skew, args.seed)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from bench.stub_server import load_fixture
+from search_result import ResultSet, orjson
+from web_search import parse_serpapi_results
+
+
+def parse_as_dicts(results: Dict) -> List[Dict]:
+    """Extração anterior (um dict por resultado), mantida aqui como referência"""
+    all_results = []
+    for item in results.get("organic_results", []):
+        all_results.append({
+            "title": item.get("title", ""),
+            "link": item.get("link", ""),
+            "snippet": item.get("snippet", ""),
+            "source": item.get("displayed_link", ""),
+            "type": "web"
+        })
+    for item in results.get("news_results", []):
+        all_results.append({
+            "title": item.get("title", ""),
+            "link": item.get("link", ""),
+            "snippet": item.get("snippet", ""),
+            "source": item.get("source", ""),
+            "type": "news",
+            "date": item.get("date", "")
+        })
+    knowledge_graph = results.get("knowledge_graph", {})
+    if knowledge_graph:
+        all_results.insert(0, {
+            "title": knowledge_graph.get("title", ""),
+            "link": knowledge_graph.get("website", ""),
+            "snippet": knowledge_graph.get("description", ""),
+            "source": "Knowledge Graph",
+            "type": "knowledge"
+        })
+    return all_results
+
+
+def group_dicts(results: List[Dict]) -> tuple:
+    """Agrupamento anterior: uma passada por tipo (fontes) e mais duas (métricas)"""
+    knowledge = [r for r in results if r.get("type") == "knowledge"]
+    news = [r for r in results if r.get("type") == "news"]
+    web = [r for r in results if r.get("type") == "web"]
+    web_count = len([r for r in results if r.get("type") == "web"])
+    news_count = len([r for r in results if r.get("type") == "news"])
+    return knowledge, news, web, web_count, news_count
+
+
+def group_result_set(results) -> tuple:
+    result_set = ResultSet(results)
+    return (result_set.of_type("knowledge"), result_set.of_type("news"), result_set.of_type("web"),
+            result_set.count("web"), result_set.count("news"))
+
+
+def time_per_call(fn: Callable, iterations: int) -> float:
+    """Microssegundos por chamada (melhor de 3 rodadas)"""
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        best = min(best, time.perf_counter() - start)
+    return best / iterations * 1e6
+
+
+def retained_bytes(build: Callable[[], object]) -> int:
+    """Memória retida pelo que `build` devolve"""
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return after - before
+
+
+def run(sets: int, iterations: int) -> Dict:
+    """Medir decodificação, extração, agrupamento e memória de `sets` conjuntos em cache"""
+    raw = json.dumps(load_fixture("serpapi_search.json"), ensure_ascii=False).encode("utf-8")
+    payload = json.loads(raw)
+    dict_results = parse_as_dicts(payload)
+    slotted_results = parse_serpapi_results(payload)
+
+    report = {
+        "payload_bytes": len(raw),
+        "results_per_set": len(slotted_results),
+        "cpu_us": {
+            "decode_json": time_per_call(lambda: json.loads(raw), iterations),
+            "decode_orjson": time_per_call(lambda: orjson.loads(raw), iterations) if orjson is not None else None,
+            "extract_dicts": time_per_call(lambda: parse_as_dicts(payload), iterations),
+            "extract_slotted": time_per_call(lambda: parse_serpapi_results(payload), iterations),
+            "group_dicts": time_per_call(lambda: group_dicts(dict_results), iterations),
+            "group_result_set": time_per_call(lambda: group_result_set(slotted_results), iterations),
+        },
+        # Strings compartilhadas do mesmo payload: mede só o custo dos contêineres por resultado
+        "memory_bytes": {
+            "dicts": retained_bytes(lambda: [parse_as_dicts(payload) for _ in range(sets)]),
+            "slotted": retained_bytes(lambda: [parse_serpapi_results(payload) for _ in range(sets)]),
+        },
+        "sets": sets,
+    }
+    return report
+
+
+def print_report(report: Dict):
+    """Tabela comparando a representação anterior (dicts) com a atual"""
+    cpu = report["cpu_us"]
+    fmt = lambda value: f"{value:9.2f}" if value is not None else "        —"
+    print(f"Payload: {report['payload_bytes']} bytes, {report['results_per_set']} resultados por busca")
+    print(f"{'etapa':<12} {'anterior (µs)':>14} {'atual (µs)':>11}")
+    print(f"{'decodificar':<12} {fmt(cpu['decode_json']):>14} {fmt(cpu['decode_orjson']):>11}")
+    print(f"{'extrair':<12} {fmt(cpu['extract_dicts']):>14} {fmt(cpu['extract_slotted']):>11}")
+    print(f"{'agrupar':<12} {fmt(cpu['group_dicts']):>14} {fmt(cpu['group_result_set']):>11}")
+    memory = report["memory_bytes"]
+    sets = report["sets"]
+    print(f"Memória para {sets} buscas em cache: {memory['dicts'] / 1024:.0f} KiB → {memory['slotted'] / 1024:.0f} KiB "
+          f"({memory['slotted'] / memory['dicts'] - 1:+.0%})")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Argumentos da linha de comando"""
+    parser = argparse.ArgumentParser(description="Comparar dicts e SearchResult (CPU e memória)")
+    parser.add_argument("--sets", type=int, default=2000, help="Buscas mantidas em memória na medição de memória")
+    parser.add_argument("--iterations", type=int, default=5000, help="Repetições por medição de CPU")
+    parser.add_argument("-o", "--output", help="Gravar o relatório em JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    report = run(args.sets, args.iterations)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+import fnmatch
+import socketserver
+import threading
+import time
+from typing import Dict, List, Optional, Tuple, Union
+
+from cache_backends import read_reply
+
+
+def encode_reply(value) -> bytes:
+    """Resposta no protocolo RESP"""
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, bool):
+        return b"+OK\r\n" if value else b"$-1\r\n"
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, Exception):
+        return f"-ERR {value}\r\n".encode("utf-8")
+    if isinstance(value, str):
+        return f"+{value}\r\n".encode("utf-8")
+    if isinstance(value, list):
+        return b"*%d\r\n" % len(value) + b"".join(encode_reply(item) for item in value)
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+class RedisStub:
+    """Servidor local que fala o protocolo do Redis (só os comandos usados por RedisBackend)
+
+    Substitui um Redis real em testes e benchmarks: várias réplicas/processos podem apontar
+    CACHE_URL para ele e compartilhar o cache.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        # Strings são bytes; hashes e sorted sets são dicts (campo → valor/score)
+        self._data: Dict[bytes, Tuple[Union[bytes, Dict], Optional[float]]] = {}
+        self._lock = threading.Lock()
+        self.commands = 0
+        self._server = socketserver.ThreadingTCPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"redis://{host}:{port}/0"
+
+    def start(self) -> "RedisStub":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="redis-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "RedisStub":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _live(self, key: bytes) -> Optional[Tuple[bytes, Optional[float]]]:
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.time():
+            del self._data[key]
+            return None
+        return entry
+
+    def execute(self, args: List[bytes]):
+        """Executar um comando já decodificado"""
+        name = args[0].decode("utf-8").upper()
+        with self._lock:
+            self.commands += 1
+            if name in ("PING", "AUTH", "SELECT", "FLUSHDB"):
+                if name == "FLUSHDB":
+                    self._data.clear()
+                return "PONG" if name == "PING" else True
+            if name == "GET":
+                entry = self._live(args[1])
+                return entry[0] if entry is not None else None
+            if name == "MGET":
+                return [entry[0] if entry is not None else None for entry in map(self._live, args[1:])]
+            if name == "SET":
+                expires_at = None
+                options = [arg.decode("utf-8").upper() for arg in args[3::2]]
+                for option, amount in zip(options, args[4::2]):
+                    if option == "EX":
+                        expires_at = time.time() + int(amount)
+                    elif option == "PX":
+                        expires_at = time.time() + int(amount) / 1000
+                self._data[args[1]] = (args[2], expires_at)
+                return True
+            if name == "DEL":
+                return sum(1 for key in args[1:] if self._data.pop(key, None) is not None)
+            if name == "PTTL":
+                entry = self._live(args[1])
+                if entry is None:
+                    return -2
+                return -1 if entry[1] is None else int((entry[1] - time.time()) * 1000)
+            if name == "INCR":
+                entry = self._live(args[1])
+                value = int(entry[0]) + 1 if entry is not None else 1
+                self._data[args[1]] = (str(value).encode("utf-8"), entry[1] if entry is not None else None)
+                return value
+            if name == "HINCRBY":
+                entry = self._live(args[1])
+                fields = entry[0] if entry is not None else {}
+                fields[args[2]] = fields.get(args[2], 0) + int(args[3])
+                self._data[args[1]] = (fields, None)
+                return fields[args[2]]
+            if name == "HGETALL":
+                entry = self._live(args[1])
+                fields = entry[0] if entry is not None else {}
+                return [item for field, value in fields.items() for item in (field, str(value).encode("utf-8"))]
+            if name in ("HDEL", "ZREM"):
+                entry = self._live(args[1])
+                members = entry[0] if entry is not None else {}
+                return sum(1 for member in args[2:] if members.pop(member, None) is not None)
+            if name == "ZADD":
+                entry = self._live(args[1])
+                members = entry[0] if entry is not None else {}
+                added = 0
+                for score, member in zip(args[2::2], args[3::2]):
+                    added += member not in members
+                    members[member] = float(score)
+                self._data[args[1]] = (members, None)
+                return added
+            if name == "ZREMRANGEBYSCORE":
+                entry = self._live(args[1])
+                members = entry[0] if entry is not None else {}
+                low, high = float(args[2]), float(args[3])
+                removed = [member for member, score in members.items() if low <= score <= high]
+                for member in removed:
+                    del members[member]
+                return len(removed)
+            if name == "ZCARD":
+                entry = self._live(args[1])
+                return len(entry[0]) if entry is not None else 0
+            if name == "DBSIZE":
+                return sum(1 for key in list(self._data) if self._live(key) is not None)
+            if name == "SCAN":
+                # Cursor = posição na lista ordenada de chaves
+                cursor = int(args[1])
+                options = {args[i].decode("utf-8").upper(): args[i + 1] for i in range(2, len(args) - 1, 2)}
+                pattern = options.get("MATCH", b"*").decode("utf-8")
+                count = int(options.get("COUNT", b"10"))
+                keys = sorted(key for key in list(self._data) if self._live(key) is not None)
+                page = keys[cursor:cursor + count]
+                next_cursor = cursor + count if cursor + count < len(keys) else 0
+                matched = [key for key in page if fnmatch.fnmatchcase(key.decode("utf-8"), pattern)]
+                return [str(next_cursor).encode("utf-8"), matched]
+        return Exception(f"unknown command '{name}'")
+
+    def _handler(self):
+        stub = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                while True:
+                    try:
+                        args = read_reply(self.rfile)
+                    except (ConnectionError, OSError):
+                        return
+                    self.wfile.write(encode_reply(stub.execute(args)))
+                    self.wfile.flush()
+
+        return Handler
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Servidor local compatível com o protocolo do Redis")
+    parser.add_argument("--port", type=int, default=6380)
+    args = parser.parse_args()
+
+    server = RedisStub(port=args.port).start()
+    print(f"Redis local em {server.url}")
+    print(f"  CACHE_URL={server.url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
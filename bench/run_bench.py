@@ -0,0 +1,210 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from bench.stub_server import StubConfig, StubServer
+
+# Métricas comparadas com o baseline: (nome, maior é melhor)
+COMPARED_METRICS = [("p50", False), ("p95", False), ("throughput", True)]
+
+QUERIES = [
+    "inteligência artificial 2025",
+    "mercado de trabalho e IA",
+    "regulação da IA no Brasil",
+    "IA na saúde diagnóstico",
+    "startups de IA investimento",
+    "modelos open source de IA",
+    "energia data centers IA",
+    "plano nacional de inteligência artificial",
+]
+
+
+def percentile(samples: List[float], q: float) -> Optional[float]:
+    """Percentil q (0-1) de uma lista de amostras"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def run_request(query: str, api_key: str, client, search_options, summary_options, search_cache, summary_cache, stream: bool) -> Tuple[float, bool]:
+    """Uma consulta de ponta a ponta (busca, preparo e resumo); retorna (segundos, sucesso)"""
+    from core import generate_summary_with_ai, prepare_sources, search_web, stream_summary_with_ai, summary_cache_key
+
+    start = time.perf_counter()
+    results, _ = search_web(query, api_key, search_options, search_cache)
+    if not results:
+        return time.perf_counter() - start, False
+    results = prepare_sources(query, results, search_options)
+
+    model_key, fingerprint = summary_cache_key(query, results, summary_options)
+    summary = summary_cache.get(query, model_key, fingerprint) if summary_cache is not None else None
+    if summary is None:
+        if stream:
+            summary = "".join(stream_summary_with_ai(query, results, client, summary_options))
+        else:
+            summary = generate_summary_with_ai(query, results, client, summary_options)
+        if summary_cache is not None and "❌" not in summary:
+            summary_cache.set(query, model_key, fingerprint, summary)
+    return time.perf_counter() - start, "❌" not in summary
+
+
+def run_level(concurrency: int, total_requests: int, queries: List[str], **request_kwargs) -> Dict:
+    """Executar `total_requests` consultas com `concurrency` threads e resumir latências"""
+    from metrics import get_metrics
+
+    metrics = get_metrics()
+    metrics.reset()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [
+            executor.submit(run_request, queries[i % len(queries)], **request_kwargs)
+            for i in range(total_requests)
+        ]
+        outcomes = [future.result() for future in futures]
+    wall = time.perf_counter() - start
+
+    latencies = [seconds for seconds, ok in outcomes if ok]
+    return {
+        "concurrency": concurrency,
+        "requests": total_requests,
+        "errors": sum(1 for _, ok in outcomes if not ok),
+        "wall_time": wall,
+        "throughput": len(latencies) / wall if wall > 0 else 0.0,
+        "p50": percentile(latencies, 0.5),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+        "stages": metrics.snapshot(),
+    }
+
+
+def compare_with_baseline(report: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Listar regressões além da tolerância relativa em relação ao baseline"""
+    regressions = []
+    for level, current in report["levels"].items():
+        previous = baseline.get("levels", {}).get(level)
+        if not previous:
+            continue
+        for name, higher_is_better in COMPARED_METRICS:
+            old, new = previous.get(name), current.get(name)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (change < -tolerance) if higher_is_better else (change > tolerance):
+                regressions.append(f"concorrência {level}: {name} {old:.3f} → {new:.3f} ({change:+.0%})")
+    return regressions
+
+
+def print_report(report: Dict, baseline: Optional[Dict] = None):
+    """Tabela resumida por nível de concorrência"""
+    print(f"{'conc':>5} {'req':>5} {'erros':>6} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'Δp50':>7}")
+    for level, row in report["levels"].items():
+        previous = (baseline or {}).get("levels", {}).get(level, {})
+        delta = f"{(row['p50'] - previous['p50']) / previous['p50']:+.0%}" if previous.get("p50") and row["p50"] else ""
+        fmt = lambda value: f"{value:.3f}" if value is not None else "—"
+        print(f"{level:>5} {row['requests']:>5} {row['errors']:>6} {row['throughput']:>8.2f} "
+              f"{fmt(row['p50']):>8} {fmt(row['p95']):>8} {fmt(row['p99']):>8} {delta:>7}")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Argumentos da linha de comando"""
+    parser = argparse.ArgumentParser(description="Benchmark offline do pipeline com respostas gravadas")
+    parser.add_argument("--levels", default="1,4,16", help="Níveis de concorrência separados por vírgula")
+    parser.add_argument("--requests", type=int, default=32, help="Consultas por nível")
+    parser.add_argument("--distinct", type=int, default=len(QUERIES), help="Consultas distintas (repetições exercitam os caches)")
+    parser.add_argument("--provider", choices=["GroqCloud", "OpenAI"], default="GroqCloud")
+    parser.add_argument("--model", default="openai/gpt-oss-120b")
+    parser.add_argument("--stream", action="store_true", help="Gerar resumos em streaming")
+    parser.add_argument("--fan-out", action="store_true", help="Buscar web + notícias em paralelo")
+    parser.add_argument("--cache", action="store_true", help="Usar cache de buscas (SQLite temporário) e de análises")
+    parser.add_argument("--search-latency", type=float, default=0.3)
+    parser.add_argument("--llm-latency", type=float, default=0.4)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--tokens-per-second", type=float, default=800)
+    parser.add_argument("--baseline", help="Comparar com um relatório salvo anteriormente")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Regressão relativa tolerada (0.2 = 20%%)")
+    parser.add_argument("--save-baseline", help="Gravar este relatório como novo baseline")
+    parser.add_argument("-o", "--output", help="Gravar o relatório completo em JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    """Subir o servidor local, medir cada nível de concorrência e comparar com o baseline"""
+    args = parse_args(argv)
+    config = StubConfig(
+        search_latency=args.search_latency,
+        llm_latency=args.llm_latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        tokens_per_second=args.tokens_per_second,
+    )
+
+    with StubServer(config) as stub:
+        # Apontar SerpAPI e SDKs para o servidor local antes de importar o pipeline
+        os.environ["SERPAPI_URL"] = f"{stub.url}/search"
+        os.environ["GROQ_BASE_URL"] = stub.url
+        os.environ["OPENAI_BASE_URL"] = f"{stub.url}/v1"
+        # Sem limites de taxa (nem os do plano gratuito por modelo): medir o pipeline, não a cota
+        os.environ["MODEL_LIMITS"] = json.dumps({args.model: [0, 0]})
+
+        from core import SearchOptions, SummaryOptions, create_ai_client
+        from resilience import get_gateway
+        from search_cache import SearchCache
+        from summary_cache import SummaryCache
+
+        gateway = get_gateway()
+        gateway.set_limits("serpapi", 0)
+        gateway.set_limits(args.provider, 0)
+
+        client = create_ai_client(args.provider, "bench")
+        search_options = SearchOptions(fan_out=args.fan_out)
+        summary_options = SummaryOptions(ai_provider=args.provider, model_choice=args.model)
+        queries = QUERIES[:max(1, min(args.distinct, len(QUERIES)))]
+
+        report = {"config": {k: v for k, v in vars(args).items() if k not in ("baseline", "save_baseline", "output")}, "levels": {}}
+        with tempfile.TemporaryDirectory() as tmp:
+            for level in [int(value) for value in args.levels.split(",")]:
+                # Caches novos a cada nível para que os níveis sejam comparáveis
+                search_cache = SearchCache(os.path.join(tmp, f"cache-{level}.sqlite3")) if args.cache else None
+                summary_cache = SummaryCache() if args.cache else None
+                report["levels"][str(level)] = run_level(
+                    level, args.requests, queries,
+                    api_key="bench", client=client, search_options=search_options, summary_options=summary_options,
+                    search_cache=search_cache, summary_cache=summary_cache, stream=args.stream,
+                )
+        report["stub_requests"] = dict(stub.requests)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if baseline is not None:
+        differing = sorted(k for k, v in report["config"].items() if k not in ("levels", "requests") and baseline.get("config", {}).get(k) != v)
+        if differing:
+            print(f"⚠️ Configuração diferente do baseline: {', '.join(differing)}", file=sys.stderr)
+        regressions = compare_with_baseline(report, baseline, args.tolerance)
+        for line in regressions:
+            print(f"❌ Regressão: {line}", file=sys.stderr)
+        if regressions:
+            return 1
+        print("✅ Sem regressões em relação ao baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
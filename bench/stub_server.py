@@ -0,0 +1,185 @@
+import json
+import os
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def load_fixture(name: str) -> Dict:
+    """Ler uma resposta gravada de bench/fixtures"""
+    with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+        return json.load(f)
+
+
+@dataclass
+class StubConfig:
+    """Latência e falhas injetadas pelo servidor local"""
+    search_latency: float = 0.3
+    llm_latency: float = 0.4
+    jitter: float = 0.1
+    error_rate: float = 0.0
+    error_status: int = 500
+    tokens_per_second: float = 800
+    seed: int = 42
+
+
+class StubServer:
+    """Servidor HTTP local que imita a SerpAPI e a API de chat (Groq/OpenAI) com respostas gravadas"""
+
+    def __init__(self, config: Optional[StubConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or StubConfig()
+        self.search_payload = json.dumps(load_fixture("serpapi_search.json"), ensure_ascii=False).encode("utf-8")
+        self.completion = load_fixture("chat_completion.json")
+        self.requests = {"search": 0, "chat": 0, "errors": 0}
+        self._random = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="bench-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "StubServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _delay(self, base: float) -> float:
+        with self._lock:
+            return max(base + self._random.uniform(-self.config.jitter, self.config.jitter), 0)
+
+    def _should_fail(self, kind: str) -> bool:
+        with self._lock:
+            self.requests[kind] += 1
+            failed = self._random.random() < self.config.error_rate
+            if failed:
+                self.requests["errors"] += 1
+            return failed
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def send_json(self, status: int, body: bytes, headers: Optional[Dict[str, str]] = None):
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def send_error_response(self):
+                status = stub.config.error_status
+                body = json.dumps({"error": {"message": f"erro injetado ({status})", "type": "stub_error"}}).encode()
+                # 429 com Retry-After curto para exercitar o backoff sem travar o benchmark
+                self.send_json(status, body, {"retry-after": "0.1"} if status == 429 else None)
+
+            def do_GET(self):
+                if not self.path.startswith("/search"):
+                    self.send_json(404, b'{"error": "not found"}')
+                    return
+                time.sleep(stub._delay(stub.config.search_latency))
+                if stub._should_fail("search"):
+                    self.send_error_response()
+                    return
+                self.send_json(200, stub.search_payload)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if not self.path.endswith("/chat/completions"):
+                    self.send_json(404, b'{"error": "not found"}')
+                    return
+                time.sleep(stub._delay(stub.config.llm_latency))
+                if stub._should_fail("chat"):
+                    self.send_error_response()
+                    return
+
+                completion = dict(stub.completion, model=request.get("model", stub.completion["model"]))
+                if not request.get("stream"):
+                    self.send_json(200, json.dumps(completion, ensure_ascii=False).encode("utf-8"))
+                    return
+                include_usage = (request.get("stream_options") or {}).get("include_usage", False)
+                self.stream(completion, include_usage)
+
+            def stream(self, completion: Dict, include_usage: bool):
+                """Enviar a resposta gravada em chunks SSE no ritmo de tokens_per_second"""
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+
+                def emit(payload: Dict):
+                    self.wfile.write(b"data: " + json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n\n")
+                    self.wfile.flush()
+
+                base = {"id": completion["id"], "object": "chat.completion.chunk", "created": completion["created"], "model": completion["model"]}
+                pieces = re.findall(r"\S+\s*|\s+", completion["choices"][0]["message"]["content"])
+                interval = 1 / stub.config.tokens_per_second if stub.config.tokens_per_second > 0 else 0
+                try:
+                    for piece in pieces:
+                        emit(dict(base, choices=[{"index": 0, "delta": {"content": piece}, "finish_reason": None}]))
+                        if interval:
+                            time.sleep(interval)
+                    final = dict(base, choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}])
+                    if include_usage:
+                        emit(final)
+                        emit(dict(base, choices=[], usage=completion["usage"]))
+                    else:
+                        # Groq envia o uso de tokens em x_groq no último chunk
+                        emit(dict(final, x_groq={"id": completion["id"], "usage": completion["usage"]}))
+                    self.wfile.write(b"data: [DONE]\n\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    # Cliente fechou o stream (ex.: perdedor de um hedge)
+                    pass
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Servidor local com respostas gravadas da SerpAPI e da API de chat")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--search-latency", type=float, default=0.3)
+    parser.add_argument("--llm-latency", type=float, default=0.4)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--tokens-per-second", type=float, default=800)
+    args = parser.parse_args()
+
+    config = StubConfig(args.search_latency, args.llm_latency, args.jitter, args.error_rate, args.error_status, args.tokens_per_second)
+    server = StubServer(config, port=args.port).start()
+    print(f"Stub em {server.url}")
+    print(f"  SERPAPI_URL={server.url}/search GROQ_BASE_URL={server.url} OPENAI_BASE_URL={server.url}/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,489 @@
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+from metrics import get_metrics
+
+# Valores acima deste tamanho são comprimidos (zlib); o primeiro byte indica o formato
+COMPRESS_MIN_BYTES = 512
+# Segundos entre atualizações de last_access de uma entrada SQLite (evita uma escrita por leitura)
+LRU_RESOLUTION = 60
+_RAW = b"\x00"
+_ZLIB = b"\x01"
+
+
+def compress(data: bytes) -> bytes:
+    """Serializar para o backend, comprimindo valores grandes"""
+    if len(data) >= COMPRESS_MIN_BYTES:
+        return _ZLIB + zlib.compress(data, 6)
+    return _RAW + data
+
+
+def decompress(payload: bytes) -> bytes:
+    """Inverso de `compress`"""
+    if payload[:1] == _ZLIB:
+        return zlib.decompress(payload[1:])
+    return payload[1:]
+
+
+def cache_key(namespace: str, *parts) -> str:
+    """Chave estável entre processos e réplicas: namespace + sha256 das partes em JSON canônico"""
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return f"{namespace}:{hashlib.sha256(raw.encode('utf-8')).hexdigest()}"
+
+
+class CacheBackend:
+    """Armazenamento chave → bytes com TTL, compartilhado pelos caches de busca e de análises"""
+
+    # Visível para outros processos/réplicas (o cache em memória não é)
+    shared = False
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes, ttl: float):
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def time_to_live(self, key: str) -> Optional[float]:
+        """Segundos até a entrada expirar (None se ausente), sem contar como acesso"""
+        raise NotImplementedError
+
+    def incr(self, name: str, amount: int = 1):
+        """Incrementar um contador (acertos/falhas somados entre todos os processos)"""
+        raise NotImplementedError
+
+    def counters(self, prefix: str) -> Dict[str, int]:
+        """Contadores cujo nome começa com `prefix` (sem o prefixo)"""
+        raise NotImplementedError
+
+    def count(self, prefix: str) -> int:
+        """Entradas válidas com o prefixo"""
+        raise NotImplementedError
+
+    def clear(self, prefix: str):
+        """Remover entradas e contadores com o prefixo"""
+        raise NotImplementedError
+
+
+class MemoryBackend(CacheBackend):
+    """Em memória, por processo, com TTL e despejo LRU"""
+
+    def __init__(self, max_entries: int = 2000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: bytes, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def time_to_live(self, key: str) -> Optional[float]:
+        with self._lock:
+            entry = self._entries.get(key)
+        remaining = entry[0] - time.time() if entry is not None else None
+        return remaining if remaining is not None and remaining > 0 else None
+
+    def incr(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def counters(self, prefix: str) -> Dict[str, int]:
+        with self._lock:
+            return {name[len(prefix):]: value for name, value in self._counters.items() if name.startswith(prefix)}
+
+    def count(self, prefix: str) -> int:
+        now = time.time()
+        with self._lock:
+            return sum(1 for key, (expires_at, _) in self._entries.items() if key.startswith(prefix) and expires_at > now)
+
+    def clear(self, prefix: str):
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                del self._entries[key]
+            for name in [n for n in self._counters if n.startswith(prefix)]:
+                del self._counters[name]
+
+
+class SQLiteBackend(CacheBackend):
+    """Arquivo SQLite (WAL) que vários processos da mesma máquina compartilham com segurança"""
+
+    shared = True
+
+    def __init__(self, path: str, max_entries: int = 2000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # Uma conexão por thread (e por processo: conexões não sobrevivem a um fork)
+        self._local = threading.local()
+        with self._connect() as conn:
+            # WAL fica gravado no arquivo: basta ativar uma vez, na criação do esquema
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Tabelas do cache de buscas antigo (antes dos backends), substituídas por cache_entries
+            conn.execute("DROP TABLE IF EXISTS search_cache")
+            conn.execute("DROP TABLE IF EXISTS search_cache_stats")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS cache_entries (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )"""
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_cache_entries_access ON cache_entries (last_access)"
+            )
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS cache_counters (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                )"""
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            # timeout: espera o lock de escrita de outro processo em vez de falhar
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            # Cache: perder as últimas escritas numa queda de energia é aceitável, um fsync por escrita não
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        try:
+            yield conn
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+    def get(self, key: str) -> Optional[bytes]:
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT value, expires_at, last_access FROM cache_entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                conn.execute("DELETE FROM cache_entries WHERE key = ? AND expires_at <= ?", (key, now))
+                return None
+            # Leitura sem escrita na maioria dos acertos: a ordem do LRU tolera essa resolução
+            if now - row[2] >= LRU_RESOLUTION:
+                conn.execute("UPDATE cache_entries SET last_access = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def set(self, key: str, value: bytes, ttl: float):
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            # Escrita e despejo na mesma transação: outro processo nunca vê o meio do caminho
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                """INSERT OR REPLACE INTO cache_entries (key, value, expires_at, last_access)
+                   VALUES (?, ?, ?, ?)""",
+                (key, value, now + ttl, now),
+            )
+            conn.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (now,))
+            conn.execute(
+                """DELETE FROM cache_entries WHERE key IN (
+                       SELECT key FROM cache_entries ORDER BY last_access DESC
+                       LIMIT -1 OFFSET ?
+                   )""",
+                (self.max_entries,),
+            )
+            conn.execute("COMMIT")
+
+    def delete(self, key: str):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+
+    def time_to_live(self, key: str) -> Optional[float]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT expires_at FROM cache_entries WHERE key = ?", (key,)).fetchone()
+        if row is None or row[0] <= time.time():
+            return None
+        return row[0] - time.time()
+
+    def incr(self, name: str, amount: int = 1):
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                """INSERT INTO cache_counters (name, value) VALUES (?, ?)
+                   ON CONFLICT(name) DO UPDATE SET value = value + excluded.value""",
+                (name, amount),
+            )
+
+    def counters(self, prefix: str) -> Dict[str, int]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT name, value FROM cache_counters WHERE substr(name, 1, ?) = ?", (len(prefix), prefix)
+            ).fetchall()
+        return {name[len(prefix):]: value for name, value in rows}
+
+    def count(self, prefix: str) -> int:
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM cache_entries WHERE substr(key, 1, ?) = ? AND expires_at > ?",
+                (len(prefix), prefix, time.time()),
+            ).fetchone()[0]
+
+    def clear(self, prefix: str):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM cache_entries WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+            conn.execute("DELETE FROM cache_counters WHERE substr(name, 1, ?) = ?", (len(prefix), prefix))
+
+
+class RedisError(Exception):
+    """Resposta de erro do servidor Redis"""
+
+
+def encode_command(args: Tuple) -> bytes:
+    """Comando no protocolo RESP (array de bulk strings)"""
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if not isinstance(arg, bytes):
+            arg = str(arg).encode("utf-8")
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(parts)
+
+
+def read_reply(stream):
+    """Ler uma resposta RESP (string simples, erro, inteiro, bulk ou array)"""
+    line = stream.readline()
+    if not line:
+        raise ConnectionError("Conexão com o Redis encerrada")
+    kind, body = line[:1], line[1:-2]
+    if kind == b"+":
+        return body.decode("utf-8")
+    if kind == b"-":
+        raise RedisError(body.decode("utf-8"))
+    if kind == b":":
+        return int(body)
+    if kind == b"$":
+        length = int(body)
+        if length < 0:
+            return None
+        data = stream.read(length + 2)
+        return data[:-2]
+    if kind == b"*":
+        length = int(body)
+        if length < 0:
+            return None
+        return [read_reply(stream) for _ in range(length)]
+    raise RedisError(f"Resposta inválida: {line!r}")
+
+
+class RedisBackend(CacheBackend):
+    """Servidor Redis (ou compatível) compartilhado por todas as réplicas; cliente RESP mínimo sem dependências
+
+    O limite de tamanho fica a cargo do servidor (maxmemory + allkeys-lru). Falhas de conexão
+    viram falta no cache: a busca segue sem cache em vez de quebrar. Contadores ficam num hash e
+    cada namespace tem um índice (sorted set chave → expiração), para que `counters` e `count`,
+    chamados a cada rerun da interface, não precisem percorrer o keyspace com SCAN.
+    """
+
+    COUNTERS_KEY = "counters"
+
+    shared = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 6379, db: int = 0, password: Optional[str] = None, timeout: float = 2):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        # Uma conexão por thread (o protocolo é sequencial)
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conn = (sock, sock.makefile("rb"))
+            self._local.conn = conn
+            if self.password:
+                self._send(conn, ("AUTH", self.password))
+            if self.db:
+                self._send(conn, ("SELECT", self.db))
+        return conn
+
+    @staticmethod
+    def _send(conn, args: Tuple):
+        sock, stream = conn
+        sock.sendall(encode_command(args))
+        return read_reply(stream)
+
+    def _close(self):
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is not None:
+            conn[1].close()
+            conn[0].close()
+
+    def command(self, *args):
+        """Executar um comando (reconecta uma vez se a conexão caiu)"""
+        for attempt in range(2):
+            try:
+                return self._send(self._connection(), args)
+            except (OSError, ConnectionError):
+                self._close()
+                if attempt:
+                    raise
+
+    def pipeline(self, *commands: Tuple) -> List:
+        """Enviar vários comandos numa só ida e volta; respostas de erro voltam como RedisError na lista"""
+        for attempt in range(2):
+            try:
+                sock, stream = self._connection()
+                sock.sendall(b"".join(encode_command(args) for args in commands))
+                return [self._read(stream) for _ in commands]
+            except (OSError, ConnectionError):
+                self._close()
+                if attempt:
+                    raise
+
+    @staticmethod
+    def _read(stream):
+        # Um erro no meio do pipeline não pode deixar as respostas seguintes na conexão
+        try:
+            return read_reply(stream)
+        except RedisError as e:
+            return e
+
+    def _safe(self, default, *args):
+        try:
+            return self.command(*args)
+        except (OSError, ConnectionError, RedisError):
+            get_metrics().increment("cache_errors", backend="redis")
+            return default
+
+    def _safe_pipeline(self, *commands: Tuple) -> List:
+        try:
+            replies = self.pipeline(*commands)
+        except (OSError, ConnectionError):
+            replies = [RedisError("sem conexão")] * len(commands)
+        if any(isinstance(reply, RedisError) for reply in replies):
+            get_metrics().increment("cache_errors", backend="redis")
+        return [None if isinstance(reply, RedisError) else reply for reply in replies]
+
+    @staticmethod
+    def _index(key: str) -> str:
+        """Índice de entradas do namespace da chave (ex.: "search:..." → "index:search")"""
+        return f"index:{key.split(':', 1)[0]}"
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._safe(None, "GET", key)
+
+    def set(self, key: str, value: bytes, ttl: float):
+        self._safe_pipeline(
+            ("SET", key, value, "PX", max(int(ttl * 1000), 1)),
+            ("ZADD", self._index(key), time.time() + ttl, key),
+        )
+
+    def delete(self, key: str):
+        self._safe_pipeline(("DEL", key), ("ZREM", self._index(key), key))
+
+    def time_to_live(self, key: str) -> Optional[float]:
+        remaining = self._safe(-2, "PTTL", key)
+        # -2: ausente; -1: sem expiração
+        if remaining == -2:
+            return None
+        return float("inf") if remaining == -1 else remaining / 1000
+
+    def incr(self, name: str, amount: int = 1):
+        self._safe(None, "HINCRBY", self.COUNTERS_KEY, name, amount)
+
+    def _scan(self, pattern: str) -> Iterator[List[bytes]]:
+        cursor = b"0"
+        while True:
+            reply = self._safe(None, "SCAN", cursor, "MATCH", pattern, "COUNT", 1000)
+            if reply is None:
+                return
+            cursor, keys = reply
+            if keys:
+                yield keys
+            if cursor == b"0":
+                return
+
+    def _counter_names(self, prefix: str) -> Dict[str, int]:
+        reply = self._safe([], "HGETALL", self.COUNTERS_KEY) or []
+        values = {name.decode("utf-8"): int(value) for name, value in zip(reply[::2], reply[1::2])}
+        return {name: value for name, value in values.items() if name.startswith(prefix)}
+
+    def counters(self, prefix: str) -> Dict[str, int]:
+        return {name[len(prefix):]: value for name, value in self._counter_names(prefix).items()}
+
+    def count(self, prefix: str) -> int:
+        """Entradas do namespace de `prefix` pelo índice (expiradas saem do índice antes de contar)"""
+        index = self._index(prefix)
+        _, total = self._safe_pipeline(("ZREMRANGEBYSCORE", index, "-inf", time.time()), ("ZCARD", index))
+        return total or 0
+
+    def clear(self, prefix: str):
+        for keys in list(self._scan(f"{prefix}*")):
+            self._safe(0, "DEL", *keys)
+        # Só apaga o índice quando o prefixo é o namespace inteiro
+        if prefix.rstrip(":") == self._index(prefix)[len("index:"):]:
+            self._safe(0, "DEL", self._index(prefix))
+        names = list(self._counter_names(prefix))
+        if names:
+            self._safe(0, "HDEL", self.COUNTERS_KEY, *names)
+
+
+def backend_from_env() -> Optional[CacheBackend]:
+    """Backend compartilhado configurado em CACHE_URL (None: cada cache usa o próprio padrão)"""
+    url = os.getenv("CACHE_URL")
+    if not url:
+        return None
+    return create_backend(url, int(os.getenv("CACHE_MAX_ENTRIES", "20000")))
+
+
+def create_backend(url: str, max_entries: int = 2000) -> CacheBackend:
+    """Backend a partir de uma URL: memory://, sqlite:///caminho, redis://[:senha@]host:porta/db ou um caminho de arquivo"""
+    parsed = urlparse(url)
+    if parsed.scheme == "memory":
+        return MemoryBackend(max_entries)
+    if parsed.scheme in ("redis", "tcp"):
+        db = parsed.path.lstrip("/")
+        return RedisBackend(
+            parsed.hostname or "127.0.0.1",
+            parsed.port or 6379,
+            int(db) if db else 0,
+            unquote(parsed.password) if parsed.password else None,
+        )
+    if parsed.scheme == "sqlite":
+        return SQLiteBackend(parsed.netloc + parsed.path, max_entries)
+    if parsed.scheme and len(parsed.scheme) > 1:
+        raise ValueError(f"Backend de cache desconhecido: {url}")
+    # Caminho simples (inclusive C:\... no Windows): SQLite
+    return SQLiteBackend(url, max_entries)
@@ -0,0 +1,187 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterator, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from article_fetch import ArticleFetcher
+from cache_backends import backend_from_env
+from core import SearchOptions, SummaryOptions, create_ai_client, run_pipeline
+from resilience import get_gateway
+from search_cache import SearchCache
+from search_result import json_default
+from summary_cache import SummaryCache
+
+
+def read_queries(path: str) -> Iterator[Tuple[Dict, Optional[str]]]:
+    """Ler consultas de um arquivo JSONL ({"query": ...} ou string por linha); retorna (item, erro)
+
+    Linhas inválidas viram um erro próprio em vez de interromper o lote inteiro.
+    """
+    with (sys.stdin if path == "-" else open(path, encoding="utf-8")) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError as e:
+                yield {}, f"JSON inválido: {e}"
+                continue
+            if isinstance(item, str):
+                item = {"query": item}
+            if not isinstance(item, dict):
+                yield {}, "Cada linha deve ser uma string ou um objeto com \"query\""
+            elif not isinstance(item.get("query"), str) or not item["query"].strip():
+                yield item, "Campo \"query\" ausente ou vazio"
+            else:
+                yield item, None
+
+
+def run_with_retries(item: Dict, retries: int, backoff: float, **pipeline_kwargs) -> Dict:
+    """Executar o pipeline com novas tentativas e backoff exponencial"""
+    attempt = 0
+    while True:
+        try:
+            record = run_pipeline(item["query"], **pipeline_kwargs)
+            if record["results"] or not record["search_errors"]:
+                return record
+            error = "; ".join(record["search_errors"].values())
+        except Exception as e:
+            error = str(e)
+            record = {"query": item.get("query"), "summary": None}
+
+        if attempt >= retries:
+            record["error"] = error
+            return record
+        attempt += 1
+        time.sleep(backoff * (2 ** (attempt - 1)) * (1 + random.random()))
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Argumentos da linha de comando"""
+    parser = argparse.ArgumentParser(description="Executar busca + resumo em lote (sem interface)")
+    parser.add_argument("input", help="Arquivo JSONL com as consultas ('-' para stdin)")
+    parser.add_argument("-o", "--output", default="-", help="Arquivo JSONL de saída ('-' para stdout)")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="Consultas processadas em paralelo")
+    parser.add_argument("--provider", choices=["GroqCloud", "OpenAI"], default="GroqCloud")
+    parser.add_argument("--model", default="openai/gpt-oss-120b")
+    parser.add_argument("--temperature", type=float, default=0.2)
+    parser.add_argument("--max-tokens", type=int, default=800)
+    parser.add_argument("--map-reduce", action="store_true", help="Resumir lotes de fontes em paralelo e combinar as notas")
+    parser.add_argument("--map-model", default=None, help="Modelo rápido dos lotes (padrão conforme o provedor)")
+    parser.add_argument("--chunk-size", type=int, default=4, help="Fontes por lote no map-reduce")
+    parser.add_argument("--num-results", type=int, default=10)
+    parser.add_argument("--language", default="pt")
+    parser.add_argument("--country", default="br")
+    parser.add_argument("--news", action="store_true", help="Buscar apenas notícias")
+    parser.add_argument("--fan-out", action="store_true", help="Buscar web + notícias em paralelo")
+    parser.add_argument("--expand", choices=["off", "local", "llm"], default="off",
+                        help="Expandir a consulta em subconsultas (local ou com uma chamada rápida à IA)")
+    parser.add_argument("--expansions", type=int, default=3, help="Número de subconsultas da expansão")
+    parser.add_argument("--no-rerank", action="store_true", help="Não deduplicar/reordenar fontes")
+    parser.add_argument("--fetch-articles", action="store_true", help="Ler artigos completos")
+    parser.add_argument("--search-rpm", type=float, default=60, help="Limite de requisições/min à SerpAPI")
+    parser.add_argument("--llm-rpm", type=float, default=30, help="Limite de requisições/min ao provedor de IA")
+    parser.add_argument("--llm-tpm", type=float, default=0, help="Limite de tokens/min ao provedor de IA (0 = sem limite)")
+    parser.add_argument("--retries", type=int, default=2, help="Novas tentativas por consulta")
+    parser.add_argument("--backoff", type=float, default=2.0, help="Espera inicial entre tentativas (s)")
+    parser.add_argument("--similarity", type=float, default=None, help="Reutilizar análises de consultas semelhantes")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    """Processar o arquivo de consultas e gravar os resultados em JSONL"""
+    args = parse_args(argv)
+    load_dotenv()
+
+    serpapi_key = os.getenv("SERPAPI_KEY")
+    if not serpapi_key:
+        print("❌ SERPAPI_KEY não configurada. Adicione no arquivo .env", file=sys.stderr)
+        return 1
+    client = create_ai_client(args.provider, os.getenv("OPENAI_API_KEY" if args.provider == "OpenAI" else "GROQ_API_KEY"))
+    if not client:
+        print(f"❌ Chave do provedor {args.provider} não configurada", file=sys.stderr)
+        return 1
+
+    # Limites por provedor aplicados pela camada compartilhada entre as threads
+    gateway = get_gateway()
+    gateway.set_limits("serpapi", args.search_rpm)
+    gateway.set_limits(args.provider, args.llm_rpm, args.llm_tpm)
+
+    def summary_options_for(item: Dict) -> SummaryOptions:
+        return SummaryOptions(
+            ai_provider=args.provider,
+            model_choice=item.get("model", args.model),
+            temperature=args.temperature,
+            max_tokens=args.max_tokens,
+            map_reduce=args.map_reduce,
+            map_model=args.map_model,
+            chunk_size=args.chunk_size,
+        )
+
+    # CACHE_URL: mesmo cache das réplicas da interface e da API
+    cache_backend = backend_from_env()
+    pipeline_kwargs = {
+        "api_key": serpapi_key,
+        "client": client,
+        "search_cache": SearchCache(cache_backend or os.getenv("SEARCH_CACHE_PATH", ".search_cache.sqlite3")),
+        "summary_cache": SummaryCache(backend=cache_backend),
+        "article_fetcher": ArticleFetcher() if args.fetch_articles else None,
+        "similarity_threshold": args.similarity,
+    }
+
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    failures = 0
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            futures = {}
+
+            def write(record: Dict, index: int, item: Dict):
+                nonlocal failures
+                record["index"] = index
+                if "id" in item:
+                    record["id"] = item["id"]
+                if record.get("error"):
+                    failures += 1
+                out.write(json.dumps(record, ensure_ascii=False, default=json_default) + "\n")
+                out.flush()
+
+            for index, (item, error) in enumerate(read_queries(args.input)):
+                if error:
+                    write({"query": item.get("query"), "summary": None, "error": error}, index, item)
+                    continue
+                search_options = SearchOptions(
+                    num_results=args.num_results,
+                    language=item.get("language", args.language),
+                    country=item.get("country", args.country),
+                    news=item.get("news", args.news),
+                    fan_out=args.fan_out,
+                    expansion=args.expand,
+                    expansions=args.expansions,
+                    rerank=not args.no_rerank,
+                    fetch_articles=args.fetch_articles,
+                )
+                future = executor.submit(
+                    run_with_retries, item, args.retries, args.backoff,
+                    search_options=search_options, summary_options=summary_options_for(item), **pipeline_kwargs
+                )
+                futures[future] = (index, item)
+
+            for future in as_completed(futures):
+                index, item = futures[future]
+                write(future.result(), index, item)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
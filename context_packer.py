@@ -0,0 +1,119 @@
+import math
+from typing import List, Optional, Tuple
+
+from search_result import SearchResult
+
+# Janela de contexto (tokens) dos modelos disponíveis na sidebar
+MODEL_CONTEXT_WINDOWS = {
+    "openai/gpt-oss-120b": 131072,
+    "openai/gpt-oss-20b": 131072,
+    "llama-3.3-70b-versatile": 131072,
+    "llama3-70b-8192": 8192,
+    "llama3-8b-8192": 8192,
+    "mixtral-8x7b-32768": 32768,
+    "gemma2-9b-it": 8192,
+    "o1": 200000,
+    "o1-preview": 128000,
+    "o1-mini": 128000,
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+    "gpt-3.5-turbo": 16385,
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# Estimativa conservadora para português (menos caracteres por token que inglês)
+CHARS_PER_TOKEN = 3.5
+# Folga para diferenças entre a estimativa e o tokenizador real
+SAFETY_MARGIN = 0.9
+# Conteúdo mínimo que vale a pena enviar por fonte
+MIN_BODY_TOKENS = 40
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimar o número de tokens de um texto"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def context_window(model: str) -> int:
+    """Janela de contexto do modelo (padrão conservador se desconhecido)"""
+    return MODEL_CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW)
+
+
+def truncate_to_tokens(text: str, tokens: int) -> str:
+    """Cortar o texto no limite de tokens, sem quebrar palavras"""
+    max_chars = int(tokens * CHARS_PER_TOKEN)
+    if len(text) <= max_chars:
+        return text
+    cut = text.rfind(" ", 0, max_chars)
+    return text[:cut if cut > 0 else max_chars].rstrip() + "…"
+
+
+def dedupe_sources(search_results: List[SearchResult]) -> List[SearchResult]:
+    """Remover fontes repetidas (mesmo link ou mesmo título), mantendo a ordem"""
+    seen = set()
+    unique = []
+    for result in search_results:
+        keys = {("link", result.link), ("title", result.title.strip().lower())}
+        keys.discard(("link", ""))
+        keys.discard(("title", ""))
+        if keys & seen:
+            continue
+        seen |= keys
+        unique.append(result)
+    return unique
+
+
+def _source_header(index: int, result: SearchResult) -> str:
+    header = [
+        f"[FONTE {index}]\n",
+        f"Título: {result.title}\n",
+        f"Tipo: {result.type.upper()}\n",
+        f"Fonte: {result.source}\n",
+    ]
+    if result.date:
+        header.append(f"Data: {result.date}\n")
+    return "".join(header)
+
+
+def pack_context(
+    search_results: List[SearchResult],
+    model: str,
+    max_output_tokens: int,
+    prompt_tokens: int = 0,
+    max_sources: Optional[int] = None,
+    token_budget: Optional[int] = None,
+) -> Tuple[str, int]:
+    """Montar o bloco de fontes que cabe na janela do modelo (ou em `token_budget`); retorna (contexto, fontes usadas)"""
+    budget = int((context_window(model) - max_output_tokens - prompt_tokens) * SAFETY_MARGIN)
+    if token_budget is not None:
+        budget = min(budget, token_budget)
+    sources = dedupe_sources(search_results)
+    if max_sources is not None:
+        sources = sources[:max_sources]
+
+    # Fontes em ordem de relevância enquanto houver espaço para cabeçalho + conteúdo mínimo
+    selected = []
+    reserved_tokens = 0
+    for result in sources:
+        header = _source_header(len(selected) + 1, result)
+        footer = f"Link: {result.link}\n\n"
+        body = result.content or result.snippet
+        body_tokens = estimate_tokens(body)
+        floor_tokens = min(body_tokens, MIN_BODY_TOKENS)
+        cost = estimate_tokens(header + "Conteúdo: …\n" + footer) + floor_tokens
+        if reserved_tokens + cost > budget:
+            break
+        selected.append((header, body, body_tokens, floor_tokens, footer))
+        reserved_tokens += cost
+
+    # Distribuir o orçamento restante proporcionalmente ao excedente de cada conteúdo
+    excess_tokens = sum(body_tokens - floor_tokens for _, _, body_tokens, floor_tokens, _ in selected)
+    scale = min(1.0, (budget - reserved_tokens) / excess_tokens) if excess_tokens else 1.0
+
+    parts = []
+    for header, body, body_tokens, floor_tokens, footer in selected:
+        allowed = floor_tokens + int((body_tokens - floor_tokens) * scale)
+        parts.append(header)
+        parts.append(f"Conteúdo: {truncate_to_tokens(body, allowed)}\n")
+        parts.append(footer)
+    return "".join(parts), len(selected)
@@ -0,0 +1,687 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import requests
+
+from article_fetch import ArticleFetcher
+from cache_backends import backend_from_env
+from context_packer import dedupe_sources, estimate_tokens, pack_context
+from metrics import get_metrics
+from model_router import ModelRouter
+from query_expansion import (
+    SubQuery,
+    expansion_key,
+    get_expansion_cache,
+    local_expansions,
+    parse_expansions,
+    render_expansion_prompt,
+)
+from ranking import rank_results
+from resilience import CircuitOpenError, get_gateway
+from search_cache import SearchCache
+from search_result import SearchResult
+from single_flight import get_completion_flight, get_stream_flight, request_key
+from summary_cache import SummaryCache, context_fingerprint
+from web_search import build_branches, fan_out_search, fetch_serpapi
+
+SYSTEM_PROMPT = "Você é um especialista em análise de informações que cria resumos precisos e bem estruturados baseados em fontes web confiáveis."
+
+# Modo map-reduce: modelo rápido padrão para os lotes e tamanho das notas de cada lote
+DEFAULT_MAP_MODELS = {
+    "GroqCloud": "openai/gpt-oss-20b",
+    "OpenAI": "gpt-4o-mini",
+}
+MAP_MAX_TOKENS = 400
+MAP_CONCURRENCY = int(os.getenv("MAP_CONCURRENCY", "4"))
+EXPANSION_MAX_TOKENS = 150
+
+_map_executor: Optional[ThreadPoolExecutor] = None
+_map_cache: Optional[SummaryCache] = None
+_map_lock = threading.Lock()
+
+
+@dataclass
+class SearchOptions:
+    """Parâmetros da etapa de busca (equivalentes aos controles da sidebar)"""
+    num_results: int = 10
+    language: str = "pt"
+    country: str = "br"
+    news: bool = False
+    fan_out: bool = False
+    extra_locales: List[str] = field(default_factory=list)
+    rerank: bool = True
+    fetch_articles: bool = False
+    fetch_deadline: float = 6
+    # Expansão da consulta: "off", "local" (sinônimos, ano, tradução) ou "llm" (uma chamada barata à IA)
+    expansion: str = "off"
+    expansions: int = 3
+
+
+@dataclass
+class SummaryOptions:
+    """Parâmetros da etapa de resumo com IA"""
+    ai_provider: str = "GroqCloud"
+    model_choice: str = "openai/gpt-oss-120b"
+    temperature: float = 0.2
+    max_tokens: int = 800
+    # Map-reduce: lotes de fontes resumidos em paralelo por um modelo rápido e depois combinados
+    map_reduce: bool = False
+    map_model: Optional[str] = None
+    chunk_size: int = 4
+
+
+def create_ai_client(ai_provider: str, api_key: Optional[str]):
+    """Inicializar o cliente de um provedor (o SDK só é importado quando o provedor é usado)"""
+    if not api_key:
+        return None
+    if ai_provider == "OpenAI":
+        from openai import OpenAI
+        return OpenAI(api_key=api_key)
+    from groq import Groq
+    return Groq(api_key=api_key)
+
+
+def create_async_ai_client(ai_provider: str, api_key: Optional[str]):
+    """Versão assíncrona de `create_ai_client` (usada pelo serviço HTTP)"""
+    if not api_key:
+        return None
+    if ai_provider == "OpenAI":
+        from openai import AsyncOpenAI
+        return AsyncOpenAI(api_key=api_key)
+    from groq import AsyncGroq
+    return AsyncGroq(api_key=api_key)
+
+
+def build_search_params(query: str, api_key: str, options: SearchOptions) -> Dict:
+    """Parâmetros da requisição à SerpAPI"""
+    return {
+        "q": query,
+        "api_key": api_key,
+        "engine": "google",
+        "num": options.num_results,
+        "hl": options.language,
+        "gl": options.country if options.country != "global" else "us",
+        "safe": "active",
+        "tbm": "nws" if options.news else None
+    }
+
+
+def expansion_options(ai_provider: str) -> SummaryOptions:
+    """Chamada da expansão por IA: modelo rápido dos lotes e resposta curta"""
+    return SummaryOptions(
+        ai_provider=ai_provider,
+        model_choice=DEFAULT_MAP_MODELS[ai_provider],
+        temperature=0.3,
+        max_tokens=EXPANSION_MAX_TOKENS,
+    )
+
+
+def expand_query(query: str, options: SearchOptions, client=None, ai_provider: str = "GroqCloud") -> List[SubQuery]:
+    """Subconsultas derivadas da consulta; sem cliente (ou se a IA falhar) usa a expansão local"""
+    if options.expansion == "off":
+        return []
+    with get_metrics().span("query_expansion"):
+        if options.expansion == "llm" and client is not None:
+            # Uma chamada por consulta: o resultado fica em cache
+            cache = get_expansion_cache()
+            key = expansion_key(query, options.language, options.expansions, ai_provider)
+            expansions = cache.get(key)
+            if expansions is None:
+                try:
+                    prompt = render_expansion_prompt(query, options.language, options.expansions)
+                    text = complete_prompt(prompt, client, expansion_options(ai_provider))
+                    expansions = parse_expansions(text, query, options.expansions)
+                except Exception:
+                    expansions = []
+                if expansions:
+                    cache.set(key, expansions)
+            if expansions:
+                return expansions
+        return local_expansions(query, options.language, options.expansions)
+
+
+def search_branches(params: Dict, options: SearchOptions, expansions: List[SubQuery]) -> Dict[str, Dict]:
+    """Ramos da busca: um por subconsulta e, com fan-out, verticais × locais de cada uma"""
+    # Locais fora do formato "idioma-país" são ignorados em vez de quebrar a busca
+    locales = [tuple(parts) for parts in (locale.split("-") for locale in options.extra_locales) if len(parts) == 2 and all(parts)]
+    branches = {}
+    for sub_query in [SubQuery(params["q"])] + list(expansions):
+        sub_params = dict(params, q=sub_query.query)
+        if sub_query.language:
+            sub_params.update(hl=sub_query.language, gl=sub_query.country)
+        # Ramos da consulta original mantêm os nomes de antes
+        prefix = f"{sub_query.query} · " if sub_query.query != params["q"] else ""
+        if options.fan_out:
+            for name, branch in build_branches(sub_params, ["web", "news"], locales).items():
+                branches[prefix + name] = branch
+        else:
+            branches[prefix + "search"] = sub_params
+    return branches
+
+
+def search_web(
+    query: str,
+    api_key: str,
+    options: SearchOptions,
+    cache: Optional[SearchCache] = None,
+    client=None,
+    ai_provider: str = "GroqCloud",
+    sub_queries: Optional[List[SubQuery]] = None,
+) -> Tuple[List[SearchResult], Dict[str, str]]:
+    """Buscar informações na web usando SerpAPI; retorna resultados e erros por ramo
+
+    `sub_queries` já calculadas (ex.: exibidas na interface) evitam expandir a consulta de novo.
+    """
+    params = build_search_params(query, api_key, options)
+
+    expansions = sub_queries if sub_queries is not None else expand_query(query, options, client, ai_provider)
+    if options.fan_out or expansions:
+        # Ramos em paralelo; resultados repetidos entre subconsultas são mesclados por link
+        return fan_out_search(search_branches(params, options, expansions), cache=cache, timeout=15)
+
+    # Consultar o cache antes de gastar cota da SerpAPI
+    if cache is not None:
+        cached_results = cache.get(params)
+        if cached_results is not None:
+            return cached_results, {}
+
+    try:
+        all_results = fetch_serpapi(params, timeout=15)
+    except (requests.RequestException, CircuitOpenError) as e:
+        return [], {"search": f"Erro na requisição: {e}"}
+    except Exception as e:
+        return [], {"search": f"Erro inesperado: {e}"}
+
+    if cache is not None and all_results:
+        cache.set(params, all_results)
+    return all_results, {}
+
+
+def prepare_sources(query: str, search_results: List[SearchResult], options: SearchOptions, article_fetcher: Optional[ArticleFetcher] = None) -> List[SearchResult]:
+    """Deduplicar/reordenar e, se habilitado, enriquecer com artigos completos"""
+    metrics = get_metrics()
+    if options.rerank:
+        with metrics.span("ranking"):
+            search_results = rank_results(query, search_results)
+    if options.fetch_articles and article_fetcher is not None:
+        with metrics.span("article_fetch"):
+            search_results = article_fetcher.enrich(search_results, deadline_seconds=options.fetch_deadline)
+    return search_results
+
+
+def render_summary_prompt(query: str, context: str, model_choice: str) -> str:
+    """Preencher o modelo de prompt com a consulta e o bloco de fontes"""
+    # Prompt otimizado para análise
+    if model_choice.startswith("o1"):
+        # Prompt especial para modelos o1 (reasoning)
+        prompt = f"""Analise profundamente as informações sobre "{query}" e forneça uma análise estruturada e detalhada.
+
+FONTES DISPONÍVEIS:
+{context}
+
+Como um analista especializado, crie um resumo abrangente que demonstre raciocínio crítico e análise profunda. Use apenas as informações das fontes fornecidas.
+
+Estruture sua resposta com:
+- Resumo executivo dos pontos principais
+- Análise detalhada com insights críticos
+- Tendências e padrões identificados
+- Implicações e perspectivas futuras
+- Conclusões fundamentadas
+
+Seja preciso, analítico e use markdown para formatação."""
+    else:
+        # Prompt padrão para outros modelos
+        prompt = f"""Você é um analista especializado em síntese de informações. Analise as fontes sobre "{query}" e crie um resumo completo e estruturado.
+
+FONTES CONSULTADAS:
+{context}
+
+INSTRUÇÕES:
+1. Crie um resumo abrangente e bem fundamentado
+2. Use APENAS informações das fontes fornecidas
+3. Organize o conteúdo de forma lógica e fluida
+4. Destaque tendências e padrões importantes
+5. Mantenha neutralidade e objetividade
+6. Use formatação markdown para clareza
+7. Cite insights de diferentes fontes quando relevante
+
+ESTRUTURA OBRIGATÓRIA:
+## 🎯 Resumo Executivo
+[Síntese dos pontos principais em 2-3 parágrafos]
+
+## 📊 Análise Detalhada
+[Desenvolvimento aprofundado dos temas centrais]
+
+## 🔍 Insights Principais
+• [Ponto relevante 1]
+• [Ponto relevante 2] 
+• [Ponto relevante 3]
+• [Outros insights importantes]
+
+## 📈 Tendências e Perspectivas
+[Análise de tendências e projeções quando aplicável]
+
+## 💡 Conclusões
+[Síntese final e considerações importantes]
+
+Responda APENAS com o resumo estruturado. Seja preciso e informativo."""
+
+    return prompt
+
+
+def build_summary_context(query: str, search_results: List[SearchResult], options: SummaryOptions) -> str:
+    """Montar o bloco de fontes dentro do orçamento de tokens do modelo"""
+    prompt_tokens = estimate_tokens(SYSTEM_PROMPT) + estimate_tokens(render_summary_prompt(query, "", options.model_choice))
+    context, _ = pack_context(search_results, options.model_choice, options.max_tokens, prompt_tokens)
+    return context
+
+
+def build_summary_prompt(query: str, search_results: List[SearchResult], options: SummaryOptions) -> str:
+    """Montar o prompt de análise a partir dos resultados da busca"""
+    with get_metrics().span("prompt_build", provider=options.ai_provider, model=options.model_choice):
+        context = build_summary_context(query, search_results, options)
+        return render_summary_prompt(query, context, options.model_choice)
+
+
+def summary_cache_key(query: str, search_results: List[SearchResult], options: SummaryOptions) -> Tuple[str, str]:
+    """Chave do cache de análises: provedor/modelo e impressão digital das fontes"""
+    # Parâmetros que mudam a resposta entram na chave (réplicas com padrões diferentes não se confundem)
+    model_key = f"{options.ai_provider}:{options.model_choice}:t={options.temperature:g}:max={options.max_tokens}"
+    if options.map_reduce:
+        # No map-reduce todas as fontes entram, não só as que cabem em uma janela
+        model_key += f":map-reduce:{map_options(options).model_choice}"
+        return model_key, context_fingerprint("\n".join(build_map_contexts(query, search_results, options)))
+    return model_key, context_fingerprint(build_summary_context(query, search_results, options))
+
+
+def map_options(options: SummaryOptions) -> SummaryOptions:
+    """Opções das chamadas de cada lote: modelo rápido e notas curtas"""
+    map_model = options.map_model or DEFAULT_MAP_MODELS.get(options.ai_provider, options.model_choice)
+    return replace(options, model_choice=map_model, max_tokens=MAP_MAX_TOKENS, map_reduce=False)
+
+
+def render_map_prompt(query: str, context: str) -> str:
+    """Prompt de um lote: extrair notas factuais das fontes do lote"""
+    return f"""Extraia das fontes abaixo as informações relevantes sobre "{query}".
+
+FONTES:
+{context}
+
+INSTRUÇÕES:
+1. Liste de 3 a 8 tópicos curtos com fatos, números, datas e posições
+2. Use APENAS informações das fontes e indique o veículo/site de cada fato
+3. Registre divergências entre fontes quando houver
+4. Não escreva introdução nem conclusão
+
+Responda APENAS com os tópicos em markdown."""
+
+
+def build_map_contexts(query: str, search_results: List[SearchResult], options: SummaryOptions) -> List[str]:
+    """Dividir as fontes em lotes de `chunk_size`, cada um dentro da janela do modelo rápido"""
+    lot_options = map_options(options)
+    prompt_tokens = estimate_tokens(SYSTEM_PROMPT) + estimate_tokens(render_map_prompt(query, ""))
+    sources = dedupe_sources(search_results)
+    contexts = []
+    for start in range(0, len(sources), max(options.chunk_size, 1)):
+        context, _ = pack_context(sources[start:start + options.chunk_size], lot_options.model_choice, lot_options.max_tokens, prompt_tokens)
+        contexts.append(context)
+    return contexts
+
+
+def map_chunk_count(search_results: List[SearchResult], options: SummaryOptions) -> int:
+    """Número de lotes que `build_map_contexts` vai gerar (fontes contadas após a deduplicação)"""
+    return -(-len(dedupe_sources(search_results)) // max(options.chunk_size, 1))
+
+
+def _get_map_executor() -> ThreadPoolExecutor:
+    global _map_executor
+    with _map_lock:
+        if _map_executor is None:
+            _map_executor = ThreadPoolExecutor(max_workers=MAP_CONCURRENCY, thread_name_prefix="map-summary")
+        return _map_executor
+
+
+def get_map_cache() -> SummaryCache:
+    """Notas por lote (e no backend de CACHE_URL, se houver): lotes repetidos entre consultas não são resumidos de novo"""
+    global _map_cache
+    with _map_lock:
+        if _map_cache is None:
+            _map_cache = SummaryCache(
+                ttl=int(os.getenv("SUMMARY_CACHE_TTL", "3600")),
+                max_entries=2048,
+                backend=backend_from_env(),
+                namespace="map",
+            )
+        return _map_cache
+
+
+def clear_caches(*caches):
+    """Descartar os dados dos caches recebidos e dos caches do processo (notas dos lotes e expansões)"""
+    for cache in (*caches, get_map_cache(), get_expansion_cache()):
+        if cache is not None:
+            cache.clear()
+
+
+def map_summaries(query: str, contexts: List[str], client, options: SummaryOptions, stats: Optional[Dict] = None) -> List[str]:
+    """Resumir os lotes em paralelo com o modelo rápido (levanta exceção se algum lote falhar)"""
+    lot_options = map_options(options)
+    model_key = f"{lot_options.ai_provider}:{lot_options.model_choice}:map"
+    cache = get_map_cache()
+
+    def run(context: str) -> str:
+        fingerprint = context_fingerprint(context)
+        notes = cache.get(query, model_key, fingerprint)
+        if notes is None:
+            notes = complete_prompt(render_map_prompt(query, context), client, lot_options)
+            cache.set(query, model_key, fingerprint, notes)
+        return notes
+
+    start = time.perf_counter()
+    with get_metrics().span("map_phase", provider=lot_options.ai_provider, model=lot_options.model_choice):
+        futures = [_get_map_executor().submit(run, context) for context in contexts]
+        notes = [future.result() for future in futures]
+    if stats is not None:
+        stats["map_time"] = time.perf_counter() - start
+        stats["map_chunks"] = len(contexts)
+    return notes
+
+
+def build_reduce_prompt(query: str, notes: List[str], options: SummaryOptions) -> str:
+    """Prompt final do map-reduce: as notas dos lotes no lugar das fontes, mesma estrutura de análise"""
+    context = "\n\n".join(f"[LOTE {index}]\n{note}" for index, note in enumerate(notes, 1))
+    return render_summary_prompt(query, context, options.model_choice)
+
+
+def build_final_prompt(query: str, search_results: List[SearchResult], client, options: SummaryOptions, stats: Optional[Dict] = None) -> str:
+    """Prompt enviado ao modelo escolhido: direto das fontes ou, no map-reduce, das notas dos lotes"""
+    if not options.map_reduce:
+        return build_summary_prompt(query, search_results, options)
+    contexts = build_map_contexts(query, search_results, options)
+    notes = map_summaries(query, contexts, client, options, stats)
+    with get_metrics().span("prompt_build", provider=options.ai_provider, model=options.model_choice):
+        return build_reduce_prompt(query, notes, options)
+
+
+def build_completion_kwargs(prompt: str, options: SummaryOptions) -> Dict:
+    """Parâmetros da chamada de chat completion conforme provedor e modelo"""
+    if options.ai_provider == "OpenAI" and options.model_choice.startswith("o1"):
+        # Modelos o1 não suportam system message, temperature, etc.
+        return {
+            "model": options.model_choice,
+            "messages": [{"role": "user", "content": prompt}],
+        }
+
+    kwargs = {
+        "model": options.model_choice,
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        "max_tokens": options.max_tokens,
+        "temperature": options.temperature
+    }
+    if options.ai_provider == "GroqCloud":
+        kwargs["top_p"] = 0.9
+    return kwargs
+
+
+def missing_client_message(ai_provider: str) -> str:
+    """Mensagem de erro para provedor sem chave configurada"""
+    if ai_provider == "OpenAI":
+        return "❌ OpenAI não configurada. Configure OPENAI_API_KEY no arquivo .env"
+    return "❌ GroqCloud não configurada. Configure GROQ_API_KEY no arquivo .env"
+
+
+def error_message(error: Exception) -> str:
+    """Mensagem de erro exibida no lugar do resumo"""
+    return f"❌ Erro ao gerar resumo: {str(error)}\n\nVerifique se sua chave de API está correta."
+
+
+def record_generation_stats(stats: Dict, start: float, first_token: float, end: float, completion_tokens: int):
+    """Registrar tempo total, tempo até o primeiro token e tokens/s"""
+    stats["total_time"] = end - start
+    stats["ttft"] = first_token - start
+    stats["completion_tokens"] = completion_tokens
+    generation_window = end - first_token
+    stats["tokens_per_second"] = completion_tokens / generation_window if generation_window > 0 and completion_tokens else None
+
+
+def include_map_time(stats: Dict):
+    """No map-reduce, tempo total e até o primeiro token contam também a fase dos lotes"""
+    map_time = stats.get("map_time")
+    if map_time:
+        stats["total_time"] += map_time
+        stats["ttft"] += map_time
+
+
+def complete_prompt(prompt: str, client, options: SummaryOptions, stats: Optional[Dict] = None) -> str:
+    """Enviar um prompt pronto ao modelo sem streaming (levanta exceção em caso de falha)
+
+    Pedidos idênticos simultâneos (de qualquer sessão) compartilham a mesma chamada ao provedor.
+    """
+    kwargs = build_completion_kwargs(prompt, options)
+    key = request_key(options.ai_provider, kwargs)
+    (text, call_stats), _ = get_completion_flight().do(key, lambda: _complete(client, kwargs, options, prompt))
+    if stats is not None:
+        stats.update(call_stats)
+    return text
+
+
+def _complete(client, kwargs: Dict, options: SummaryOptions, prompt: str) -> Tuple[str, Dict]:
+    metrics = get_metrics()
+    labels = {"provider": options.ai_provider, "model": options.model_choice}
+    start = time.perf_counter()
+    with metrics.span("llm_request", **labels):
+        response = get_gateway().call(
+            options.ai_provider,
+            lambda: client.chat.completions.create(**kwargs, stream=False),
+            model=options.model_choice,
+            tokens=estimate_tokens(prompt) + options.max_tokens
+        )
+    end = time.perf_counter()
+
+    usage = getattr(response, "usage", None)
+    metrics.record_usage(usage, **labels)
+    stats = {}
+    # Sem streaming o primeiro token chega junto com a resposta completa
+    record_generation_stats(stats, start, end, end, getattr(usage, "completion_tokens", 0) or 0)
+    return response.choices[0].message.content, stats
+
+
+def summarize(query: str, search_results: List[SearchResult], client, options: SummaryOptions, stats: Optional[Dict] = None) -> str:
+    """Gerar resumo sem streaming (levanta exceção em caso de falha)"""
+    text = complete_prompt(build_final_prompt(query, search_results, client, options, stats), client, options, stats)
+    if stats is not None:
+        include_map_time(stats)
+    return text
+
+
+def summarize_routed(query: str, search_results: List[SearchResult], client, options: SummaryOptions, router: ModelRouter, stats: Optional[Dict] = None) -> str:
+    """Gerar resumo com fallback/hedge entre modelos; o modelo vencedor vai em stats["model"]"""
+    def attempt(model: str) -> Tuple[str, Dict]:
+        attempt_stats = {}
+        text = summarize(query, search_results, client, replace(options, model_choice=model), attempt_stats)
+        return text, attempt_stats
+
+    (text, attempt_stats), model = router.run(options.model_choice, attempt)
+    if stats is not None:
+        stats.update(attempt_stats, model=model)
+    return text
+
+
+def generate_summary_with_ai(query: str, search_results: List[SearchResult], client, options: SummaryOptions, stats: Optional[Dict] = None, router: Optional[ModelRouter] = None) -> str:
+    """Gerar resumo usando OpenAI ou GroqCloud"""
+    if not client:
+        return missing_client_message(options.ai_provider)
+
+    try:
+        if router is not None:
+            return summarize_routed(query, search_results, client, options, router, stats)
+        return summarize(query, search_results, client, options, stats)
+    except Exception as e:
+        return error_message(e)
+
+
+def iter_summary_chunks(query: str, search_results: List[SearchResult], client, options: SummaryOptions, stats: Optional[Dict] = None) -> Iterator[str]:
+    """Gerar resumo em streaming (levanta exceção em caso de falha)"""
+    # Modelos o1 não suportam streaming: entregar a resposta inteira de uma vez
+    if options.ai_provider == "OpenAI" and options.model_choice.startswith("o1"):
+        yield summarize(query, search_results, client, options, stats)
+        return
+
+    prompt = build_final_prompt(query, search_results, client, options, stats)
+    kwargs = build_completion_kwargs(prompt, options)
+    if options.ai_provider == "OpenAI":
+        # Pedir o uso de tokens no último chunk do stream
+        kwargs["stream_options"] = {"include_usage": True}
+
+    # Streams idênticos simultâneos: um único pedido ao provedor, os demais assinam o mesmo stream
+    subscription = get_stream_flight().subscribe(
+        request_key(options.ai_provider, kwargs, "stream"),
+        lambda meta: _stream_completion(client, kwargs, options, prompt, meta)
+    )
+    start = time.perf_counter()
+    first_token = None
+    chunk_count = 0
+    try:
+        for content in subscription:
+            if first_token is None:
+                first_token = time.perf_counter()
+            chunk_count += 1
+            yield content
+    finally:
+        subscription.close()
+
+    end = time.perf_counter()
+    if stats is not None:
+        # Cada chunk traz aproximadamente um token quando o provedor não informa o uso
+        completion_tokens = subscription.meta.get("completion_tokens") or chunk_count
+        record_generation_stats(stats, start, first_token or end, end, completion_tokens)
+        include_map_time(stats)
+
+
+def _stream_completion(client, kwargs: Dict, options: SummaryOptions, prompt: str, meta: Dict) -> Iterator[str]:
+    metrics = get_metrics()
+    labels = {"provider": options.ai_provider, "model": options.model_choice}
+    start = time.perf_counter()
+    first_token = None
+    usage = None
+
+    # Novas tentativas só valem até o stream começar
+    stream = get_gateway().call(
+        options.ai_provider,
+        lambda: client.chat.completions.create(**kwargs, stream=True),
+        model=options.model_choice,
+        tokens=estimate_tokens(prompt) + options.max_tokens
+    )
+    try:
+        for chunk in stream:
+            # Uso de tokens: OpenAI envia em chunk.usage, Groq em chunk.x_groq.usage
+            chunk_usage = getattr(chunk, "usage", None) or getattr(getattr(chunk, "x_groq", None), "usage", None)
+            if chunk_usage is not None:
+                usage = chunk_usage
+                meta["completion_tokens"] = getattr(usage, "completion_tokens", 0) or meta.get("completion_tokens", 0)
+
+            if not chunk.choices:
+                continue
+            content = chunk.choices[0].delta.content
+            if content:
+                if first_token is None:
+                    first_token = time.perf_counter()
+                    metrics.observe("llm_ttft", first_token - start, **labels)
+                yield content
+    finally:
+        # Liberar a conexão se o consumidor abandonar o stream
+        close = getattr(stream, "close", None)
+        if close is not None:
+            close()
+
+    end = time.perf_counter()
+    # Streams abandonados (ex.: perdedores do hedge) não chegam aqui e não entram no histograma
+    metrics.observe("llm_request", end - start, **labels)
+    metrics.record_usage(usage, **labels)
+
+
+def iter_summary_chunks_routed(query: str, search_results: List[SearchResult], client, options: SummaryOptions, router: ModelRouter, stats: Optional[Dict] = None) -> Iterator[str]:
+    """Streaming com hedge pelo tempo até o primeiro token; o modelo vencedor vai em stats["model"]"""
+    def attempt(model: str) -> Tuple[str, Iterator[str], Dict]:
+        attempt_stats = {}
+        chunks = iter_summary_chunks(query, search_results, client, replace(options, model_choice=model), attempt_stats)
+        return next(chunks, ""), chunks, attempt_stats
+
+    # Streams perdedores são fechados, liberando a conexão com o provedor
+    (first, chunks, attempt_stats), model = router.run(
+        options.model_choice, attempt, discard=lambda result: result[1].close(), metric="ttft"
+    )
+    yield first
+    yield from chunks
+    if stats is not None:
+        stats.update(attempt_stats, model=model)
+
+
+def stream_summary_with_ai(query: str, search_results: List[SearchResult], client, options: SummaryOptions, stats: Optional[Dict] = None, router: Optional[ModelRouter] = None) -> Iterator[str]:
+    """Gerar resumo em streaming, entregando o texto conforme chega"""
+    if not client:
+        yield missing_client_message(options.ai_provider)
+        return
+
+    try:
+        if router is not None:
+            yield from iter_summary_chunks_routed(query, search_results, client, options, router, stats)
+        else:
+            yield from iter_summary_chunks(query, search_results, client, options, stats)
+    except Exception as e:
+        yield error_message(e)
+
+
+def run_pipeline(
+    query: str,
+    api_key: str,
+    client,
+    search_options: SearchOptions,
+    summary_options: SummaryOptions,
+    search_cache: Optional[SearchCache] = None,
+    summary_cache: Optional[SummaryCache] = None,
+    article_fetcher: Optional[ArticleFetcher] = None,
+    similarity_threshold: Optional[float] = None,
+) -> Dict:
+    """Executar busca + resumo sem interface (levanta exceção se o resumo falhar)"""
+    timings = {}
+    start = time.perf_counter()
+    search_results, errors = search_web(query, api_key, search_options, search_cache, client, summary_options.ai_provider)
+    search_results = prepare_sources(query, search_results, search_options, article_fetcher)
+    timings["search"] = time.perf_counter() - start
+
+    record = {
+        "query": query,
+        "provider": summary_options.ai_provider,
+        "model": summary_options.model_choice,
+        "results": search_results,
+        "search_errors": errors,
+        "summary": None,
+        "cached_summary": False,
+        "timings": timings,
+    }
+    if not search_results:
+        return record
+
+    model_key, fingerprint = summary_cache_key(query, search_results, summary_options)
+    cached = summary_cache.get(query, model_key, fingerprint, similarity_threshold) if summary_cache else None
+    if cached is not None:
+        record["summary"] = cached
+        record["cached_summary"] = True
+        return record
+
+    if not client:
+        raise RuntimeError(missing_client_message(summary_options.ai_provider))
+
+    stats = {}
+    record["summary"] = summarize(query, search_results, client, summary_options, stats)
+    timings.update(stats)
+    if summary_cache is not None:
+        summary_cache.set(query, model_key, fingerprint, record["summary"])
+    return record
@@ -0,0 +1,300 @@
+import json
+import os
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from article_fetch import ArticleFetcher
+from context_packer import SAFETY_MARGIN, context_window, dedupe_sources, estimate_tokens, pack_context
+from core import (
+    SYSTEM_PROMPT,
+    SearchOptions,
+    SummaryOptions,
+    complete_prompt,
+    error_message,
+    prepare_sources,
+    search_web,
+)
+from metrics import get_metrics
+from search_cache import SearchCache
+from search_result import SearchResult, json_default
+from summary_cache import SummaryCache, canonical_query, context_fingerprint
+
+MAX_TOPICS = 30
+# Saída por tema e teto de saída de uma chamada (limita quantos temas vão juntos)
+SECTION_TOKENS = 350
+BATCH_OUTPUT_TOKENS = 2800
+# Fontes e tokens de contexto por tema: digest é resumo curto, não análise completa
+TOPIC_SOURCES = 5
+TOPIC_CONTEXT_TOKENS = 1200
+DIGEST_CONCURRENCY = int(os.getenv("DIGEST_CONCURRENCY", "8"))
+MAX_BATCH_TOPICS = max(1, BATCH_OUTPUT_TOKENS // SECTION_TOKENS)
+
+_SECTION_PATTERN = re.compile(r"^#{2,4}\s*TEMA\s+(\d+)\b.*$", re.MULTILINE | re.IGNORECASE)
+
+
+@dataclass
+class DigestSection:
+    """Seção de um tema: fontes, resumo e de onde ele veio"""
+    topic: str
+    results: List[SearchResult] = field(default_factory=list)
+    summary: str = ""
+    error: Optional[str] = None
+    # Lote da chamada à IA que gerou a seção (None quando veio do cache)
+    batch: Optional[int] = None
+    cached: bool = False
+
+
+@dataclass
+class DigestTopic:
+    """Tema pronto para o lote: contexto empacotado e chave no cache de análises"""
+    index: int
+    section: DigestSection
+    context: str
+    tokens: int
+    model_key: str
+    fingerprint: str
+
+
+def parse_topics(text: str, limit: int = MAX_TOPICS) -> List[str]:
+    """Um tema por linha (marcadores e numeração ignorados), sem repetições"""
+    topics = []
+    seen = set()
+    for line in text.splitlines():
+        topic = re.sub(r"^\s*(?:[-*•]|\d+[.)])\s*", "", line).strip()
+        key = canonical_query(topic)
+        if topic and key not in seen:
+            seen.add(key)
+            topics.append(topic)
+    return topics[:limit]
+
+
+def digest_model_key(options: SummaryOptions) -> str:
+    """Chave do modelo para seções de digest (formato diferente da análise completa)"""
+    return f"{options.ai_provider}:{options.model_choice}:t={options.temperature:g}:digest:{SECTION_TOKENS}"
+
+
+def render_digest_prompt(topics: List[Tuple[str, str]]) -> str:
+    """Prompt de um lote: vários temas, cada um com as próprias fontes"""
+    blocks = "\n".join(f"=== TEMA {i}: {topic} ===\n{context}" for i, (topic, context) in enumerate(topics, 1))
+    words = int(SECTION_TOKENS * 0.6)
+    return f"""Você prepara um digest diário de notícias. Para CADA tema abaixo, escreva uma seção curta baseada APENAS nas fontes do próprio tema.
+
+{blocks}
+INSTRUÇÕES:
+1. Comece cada seção exatamente com a linha "### TEMA n: <tema>" e siga a ordem dos temas
+2. Em cada seção: 2-4 tópicos com os fatos mais relevantes e uma linha final "**Por que importa:** ..."
+3. Cite as fontes como [Fonte n], com a numeração do próprio tema
+4. No máximo ~{words} palavras por tema; não misture informações entre temas
+
+Responda APENAS com as seções."""
+
+
+def split_sections(text: str, count: int) -> Dict[int, str]:
+    """Separar a resposta do lote por tema (índices de 1 a `count`)"""
+    matches = list(_SECTION_PATTERN.finditer(text))
+    sections = {}
+    for position, match in enumerate(matches):
+        index = int(match.group(1))
+        end = matches[position + 1].start() if position + 1 < len(matches) else len(text)
+        body = text[match.end():end].strip()
+        if 1 <= index <= count and body and index not in sections:
+            sections[index] = body
+    return sections
+
+
+def batch_has_room(batch: List[DigestTopic], topic: DigestTopic, options: SummaryOptions) -> bool:
+    """Se `topic` ainda cabe no lote: janela do modelo e teto de saída (um lote vazio sempre aceita)"""
+    if not batch:
+        return True
+    if len(batch) >= MAX_BATCH_TOPICS:
+        return False
+    base_tokens = estimate_tokens(SYSTEM_PROMPT) + estimate_tokens(render_digest_prompt([]))
+    budget = (context_window(options.model_choice) - (len(batch) + 1) * SECTION_TOKENS) * SAFETY_MARGIN
+    return base_tokens + sum(item.tokens for item in batch) + topic.tokens <= budget
+
+
+def plan_batches(topics: List[DigestTopic], options: SummaryOptions) -> List[List[DigestTopic]]:
+    """Agrupar temas em chamadas enquanto couberem na janela do modelo e no teto de saída"""
+    batches: List[List[DigestTopic]] = []
+    for topic in topics:
+        if not batches or not batch_has_room(batches[-1], topic, options):
+            batches.append([])
+        batches[-1].append(topic)
+    return batches
+
+
+def _search_topic(topic: str, api_key: str, options: SearchOptions, cache: Optional[SearchCache], client, ai_provider: str, article_fetcher: Optional[ArticleFetcher]) -> DigestSection:
+    results, errors = search_web(topic, api_key, options, cache, client, ai_provider)
+    if not results:
+        return DigestSection(topic, error="; ".join(errors.values()) or "Nenhum resultado encontrado")
+    return DigestSection(topic, prepare_sources(topic, results, options, article_fetcher))
+
+
+def _prepare_topic(index: int, section: DigestSection, model_key: str, options: SummaryOptions) -> DigestTopic:
+    # Fontes deduplicadas antes de numerar: [Fonte n] do resumo é a n-ésima fonte exportada
+    results = dedupe_sources(section.results)[:TOPIC_SOURCES]
+    context, used = pack_context(results, options.model_choice, SECTION_TOKENS, token_budget=TOPIC_CONTEXT_TOKENS)
+    section.results = results[:used]
+    return DigestTopic(index, section, context, estimate_tokens(context), model_key, context_fingerprint(context))
+
+
+def _summarize_batch(batch: List[DigestTopic], client, options: SummaryOptions) -> Dict[int, str]:
+    prompt = render_digest_prompt([(topic.section.topic, topic.context) for topic in batch])
+    text = complete_prompt(prompt, client, replace(options, max_tokens=SECTION_TOKENS * len(batch)))
+    sections = split_sections(text, len(batch))
+    # Tema sozinho: a resposta inteira é a seção, mesmo sem o cabeçalho pedido
+    if len(batch) == 1 and not sections and text.strip():
+        sections[1] = text.strip()
+    return sections
+
+
+def iter_digest(
+    topics: List[str],
+    api_key: str,
+    client,
+    search_options: SearchOptions,
+    summary_options: SummaryOptions,
+    search_cache: Optional[SearchCache] = None,
+    summary_cache: Optional[SummaryCache] = None,
+    article_fetcher: Optional[ArticleFetcher] = None,
+    stats: Optional[Dict] = None,
+) -> Iterator[DigestSection]:
+    """Gerar o digest: buscas concorrentes, temas agrupados em chamadas à IA; cada seção sai assim que fica pronta
+
+    Um lote vai para a IA assim que enche, sem esperar as buscas dos demais temas.
+    """
+    stats = stats if stats is not None else {}
+    stats.update(topics=len(topics), llm_calls=0, batches=[], cached=0, search_time=0.0)
+    metrics = get_metrics()
+    model_key = digest_model_key(summary_options)
+    start = time.perf_counter()
+    summary_start: Optional[float] = None
+
+    with ThreadPoolExecutor(max_workers=DIGEST_CONCURRENCY, thread_name_prefix="digest") as executor:
+        # Buscas de todos os temas em paralelo (cada uma ainda pode ter ramos próprios)
+        searches = {
+            executor.submit(_search_topic, topic, api_key, search_options, search_cache, client, summary_options.ai_provider, article_fetcher): (index, topic)
+            for index, topic in enumerate(topics)
+        }
+        running = {}
+        current: List[DigestTopic] = []
+        retried = set()
+
+        def submit(batch: List[DigestTopic], number: Optional[int] = None):
+            nonlocal summary_start
+            if number is None:
+                stats["batches"].append(len(batch))
+                number = len(stats["batches"])
+            if summary_start is None:
+                summary_start = time.perf_counter()
+            running[executor.submit(_summarize_batch, batch, client, summary_options)] = (number, batch)
+
+        while searches or running:
+            done, _ = wait(set(searches) | set(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in searches:
+                    index, topic = searches.pop(future)
+                    try:
+                        section = future.result()
+                    except Exception as e:
+                        section = DigestSection(topic, error=error_message(e))
+                    if not searches:
+                        stats["search_time"] = time.perf_counter() - start
+                        metrics.observe("digest_search", stats["search_time"])
+                    if section.error:
+                        yield section
+                        continue
+                    # Contexto compacto por tema; seções já geradas saem direto do cache
+                    digest_topic = _prepare_topic(index, section, model_key, summary_options)
+                    cached = summary_cache.get(section.topic, model_key, digest_topic.fingerprint) if summary_cache is not None else None
+                    if cached is not None:
+                        section.summary = cached
+                        section.cached = True
+                        stats["cached"] += 1
+                        yield section
+                        continue
+                    if not batch_has_room(current, digest_topic, summary_options):
+                        submit(current)
+                        current = []
+                    current.append(digest_topic)
+                    if len(current) >= MAX_BATCH_TOPICS:
+                        submit(current)
+                        current = []
+                    continue
+
+                # Lote concluído; temas que faltarem na resposta são refeitos sozinhos
+                number, batch = running.pop(future)
+                stats["llm_calls"] += 1
+                try:
+                    bodies = future.result()
+                    failure = None
+                except Exception as e:
+                    bodies, failure = {}, error_message(e)
+                for position, topic in enumerate(batch, 1):
+                    section = topic.section
+                    if position in bodies:
+                        section.summary = bodies[position]
+                        section.batch = number
+                        if summary_cache is not None:
+                            summary_cache.set(section.topic, topic.model_key, topic.fingerprint, section.summary)
+                        yield section
+                    elif failure is None and len(batch) > 1 and topic.index not in retried:
+                        retried.add(topic.index)
+                        submit([topic], number)
+                    else:
+                        section.error = failure or "O modelo não gerou a seção deste tema"
+                        yield section
+            # Buscas encerradas: o último lote vai mesmo incompleto
+            if not searches and current:
+                submit(current)
+                current = []
+
+    stats["total_time"] = time.perf_counter() - start
+    if summary_start is not None:
+        metrics.observe("digest_summary", time.perf_counter() - summary_start)
+    metrics.observe("digest", stats["total_time"])
+
+
+def digest_to_markdown(sections: List[DigestSection], created_at: float) -> str:
+    """Relatório único em markdown (na ordem dos temas)"""
+    lines = [f"# 📰 Digest — {datetime.fromtimestamp(created_at).strftime('%d/%m/%Y %H:%M')}", ""]
+    lines += [f"{i}. {section.topic}" for i, section in enumerate(sections, 1)]
+    for section in sections:
+        lines += ["", f"## {section.topic}", ""]
+        if section.error:
+            lines.append(f"> ⚠️ {section.error}")
+            continue
+        lines.append(section.summary)
+        lines += ["", "**Fontes:**"]
+        lines += [
+            f"- [Fonte {n}] [{result.title}]({result.link}) — {result.source}" if result.link else f"- [Fonte {n}] {result.title} — {result.source}"
+            for n, result in enumerate(section.results, 1)
+        ]
+    return "\n".join(lines) + "\n"
+
+
+def digest_to_json(sections: List[DigestSection], created_at: float, stats: Optional[Dict] = None) -> str:
+    """Relatório em JSON com fontes, resumos e estatísticas da execução"""
+    return json.dumps(
+        {
+            "created_at": datetime.fromtimestamp(created_at).isoformat(timespec="seconds"),
+            "stats": stats or {},
+            "sections": [
+                {
+                    "topic": section.topic,
+                    "summary": section.summary,
+                    "error": section.error,
+                    "cached": section.cached,
+                    "results": section.results,
+                }
+                for section in sections
+            ],
+        },
+        ensure_ascii=False,
+        indent=2,
+        default=json_default,
+    )
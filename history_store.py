@@ -0,0 +1,211 @@
+import json
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterator, List, Optional
+
+from core import SearchOptions, SummaryOptions
+from search_cache import normalize_query
+from search_result import SearchResult, dumps_results, loads_results
+from single_flight import request_key
+
+DEFAULT_MAX_ENTRIES = 5000
+# Validade (s) do total de entradas em memória: a interface o mostra a cada rerun; gravações
+# deste processo atualizam na hora, as de outros processos aparecem depois desse intervalo
+COUNT_TTL = 30
+
+
+@dataclass
+class HistoryEntry:
+    """Análise registrada: consulta, fontes, resumo, modelo e tempos"""
+    id: int
+    query: str
+    provider: str
+    model: str
+    results: List[SearchResult]
+    summary: str
+    timings: Dict
+    created_at: float
+
+
+@dataclass
+class HistoryMatch:
+    """Resultado da busca no histórico, com o trecho que casou destacado"""
+    id: int
+    query: str
+    model: str
+    created_at: float
+    snippet: str
+
+
+def options_key(search_options: SearchOptions, summary_options: SummaryOptions) -> str:
+    """Chave das opções que mudam o resultado: uma consulta só é idêntica com as mesmas opções"""
+    return request_key(asdict(search_options), asdict(summary_options))
+
+
+def fts_query(text: str) -> Optional[str]:
+    """Converter o texto digitado em consulta FTS5 por prefixo (todas as palavras)"""
+    terms = re.findall(r"\w+", text, flags=re.UNICODE)
+    if not terms:
+        return None
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+class HistoryStore:
+    """Histórico persistente (SQLite) de buscas e análises com índice de texto completo (FTS5)"""
+
+    def __init__(self, path: str, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._count: Optional[int] = None
+        self._count_expires = 0.0
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    query TEXT NOT NULL,
+                    query_key TEXT NOT NULL,
+                    options_key TEXT NOT NULL,
+                    provider TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    results TEXT NOT NULL,
+                    summary TEXT NOT NULL,
+                    timings TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )"""
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_history_lookup ON history (query_key, options_key, created_at)"
+            )
+            # Acentos ignorados: "regulacao" encontra "regulação"
+            conn.execute(
+                """CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+                    query, summary, sources, tokenize = 'unicode61 remove_diacritics 2'
+                )"""
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+        finally:
+            conn.close()
+
+    def record(
+        self,
+        query: str,
+        search_options: SearchOptions,
+        summary_options: SummaryOptions,
+        results: List[SearchResult],
+        summary: str,
+        timings: Optional[Dict] = None,
+    ) -> int:
+        """Registrar uma análise concluída; retorna o id da entrada"""
+        now = time.time()
+        sources = "\n".join(f"{result.title} {result.snippet}" for result in results)
+        with self._lock, self._connect() as conn:
+            conn.execute("BEGIN")
+            cursor = conn.execute(
+                """INSERT INTO history (query, query_key, options_key, provider, model, results, summary, timings, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (
+                    query, normalize_query(query), options_key(search_options, summary_options),
+                    summary_options.ai_provider, summary_options.model_choice,
+                    dumps_results(results), summary, json.dumps(timings or {}), now,
+                ),
+            )
+            entry_id = cursor.lastrowid
+            conn.execute(
+                "INSERT INTO history_fts (rowid, query, summary, sources) VALUES (?, ?, ?, ?)",
+                (entry_id, query, summary, sources),
+            )
+            # Manter só as entradas mais recentes
+            stale = [row[0] for row in conn.execute(
+                "SELECT id FROM history ORDER BY id DESC LIMIT -1 OFFSET ?", (self.max_entries,)
+            )]
+            if stale:
+                marks = ",".join("?" * len(stale))
+                conn.execute(f"DELETE FROM history WHERE id IN ({marks})", stale)
+                conn.execute(f"DELETE FROM history_fts WHERE rowid IN ({marks})", stale)
+            conn.execute("COMMIT")
+            self._count = None
+        return entry_id
+
+    @staticmethod
+    def _entry(row) -> HistoryEntry:
+        entry_id, query, provider, model, results, summary, timings, created_at = row
+        return HistoryEntry(entry_id, query, provider, model, loads_results(results), summary, json.loads(timings), created_at)
+
+    def get(self, entry_id: int) -> Optional[HistoryEntry]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, query, provider, model, results, summary, timings, created_at FROM history WHERE id = ?",
+                (entry_id,),
+            ).fetchone()
+        return self._entry(row) if row is not None else None
+
+    def find_exact(
+        self,
+        query: str,
+        search_options: SearchOptions,
+        summary_options: SummaryOptions,
+        max_age: Optional[float] = None,
+    ) -> Optional[HistoryEntry]:
+        """Análise mais recente da mesma consulta com as mesmas opções (dentro de `max_age` segundos)"""
+        min_created = time.time() - max_age if max_age is not None else 0
+        with self._connect() as conn:
+            row = conn.execute(
+                """SELECT id, query, provider, model, results, summary, timings, created_at FROM history
+                   WHERE query_key = ? AND options_key = ? AND created_at >= ?
+                   ORDER BY created_at DESC LIMIT 1""",
+                (normalize_query(query), options_key(search_options, summary_options), min_created),
+            ).fetchone()
+        return self._entry(row) if row is not None else None
+
+    def search(self, text: str, limit: int = 10) -> List[HistoryMatch]:
+        """Buscar por prefixo na consulta, no resumo e nas fontes (consulta pesa mais)"""
+        match = fts_query(text)
+        if match is None:
+            return []
+        with self._connect() as conn:
+            rows = conn.execute(
+                """SELECT h.id, h.query, h.model, h.created_at,
+                          snippet(history_fts, 1, '**', '**', '…', 12)
+                   FROM history_fts JOIN history h ON h.id = history_fts.rowid
+                   WHERE history_fts MATCH ?
+                   ORDER BY bm25(history_fts, 10.0, 1.0, 0.5)
+                   LIMIT ?""",
+                (match, limit),
+            ).fetchall()
+        return [HistoryMatch(*row) for row in rows]
+
+    def recent(self, limit: int = 10) -> List[HistoryMatch]:
+        """Últimas análises registradas"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, query, model, created_at, substr(summary, 1, 120) FROM history ORDER BY id DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [HistoryMatch(*row) for row in rows]
+
+    def clear(self):
+        """Apagar todo o histórico"""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM history")
+            conn.execute("DELETE FROM history_fts")
+            self._count = None
+
+    def count(self) -> int:
+        """Total de análises no histórico (em cache por COUNT_TTL segundos)"""
+        if self._count is not None and time.monotonic() < self._count_expires:
+            return self._count
+        with self._connect() as conn:
+            total = conn.execute("SELECT COUNT(*) FROM history").fetchone()[0]
+        self._count, self._count_expires = total, time.monotonic() + COUNT_TTL
+        return total
@@ -0,0 +1,200 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Deque, Dict, Iterator, Optional, Tuple
+
+METRIC_PREFIX = "motor_busca"
+QUANTILES = (0.5, 0.95, 0.99)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: LabelKey, **extra: str) -> str:
+    pairs = list(key) + sorted(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in pairs) + "}"
+
+
+class RollingHistogram:
+    """Janela deslizante de durações com percentis, soma e contagem totais"""
+
+    def __init__(self, window: int = 1000):
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float):
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Percentil q (0-1) das amostras da janela"""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+class MetricsRegistry:
+    """Spans por etapa do pipeline e contadores de tokens, exportáveis em texto Prometheus"""
+
+    def __init__(self, window: int = 1000, log_path: Optional[str] = None):
+        self.window = window
+        self.log_path = log_path
+        self._histograms: Dict[Tuple[str, LabelKey], RollingHistogram] = {}
+        self._counters: Dict[Tuple[str, LabelKey], float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float, **labels: str):
+        """Registrar a duração de uma etapa"""
+        key = (stage, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = RollingHistogram(self.window)
+            histogram.observe(seconds)
+        if self.log_path:
+            self._log({"ts": time.time(), "stage": stage, "seconds": seconds, **labels})
+
+    def increment(self, name: str, value: float = 1, **labels: str):
+        """Somar a um contador (ex.: tokens de prompt/completion)"""
+        if not value:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+        if self.log_path:
+            self._log({"ts": time.time(), "counter": name, "value": value, **labels})
+
+    def record_usage(self, usage, provider: str, model: str):
+        """Contabilizar prompt_tokens/completion_tokens do campo `usage` do provedor"""
+        if usage is None:
+            return
+        for kind in ("prompt_tokens", "completion_tokens"):
+            self.increment("tokens", getattr(usage, kind, 0) or 0, provider=provider, model=model, kind=kind.split("_")[0])
+
+    @contextmanager
+    def span(self, stage: str, **labels: str) -> Iterator[Dict[str, str]]:
+        """Medir uma etapa com relógio monotônico; labels podem ser ajustados dentro do bloco"""
+        start = time.perf_counter()
+        try:
+            yield labels
+        finally:
+            self.observe(stage, time.perf_counter() - start, **labels)
+
+    def quantile(self, stage: str, q: float, **labels: str) -> Optional[float]:
+        """Percentil de uma etapa (todas as combinações de labels se nenhum for informado)"""
+        with self._lock:
+            if labels:
+                histogram = self._histograms.get((stage, _label_key(labels)))
+                samples = list(histogram.samples) if histogram else []
+            else:
+                samples = [s for (name, _), h in self._histograms.items() if name == stage for s in h.samples]
+        if not samples:
+            return None
+        samples.sort()
+        return samples[min(int(q * len(samples)), len(samples) - 1)]
+
+    def reset(self):
+        """Descartar todas as medições e contadores"""
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """p50/p95/p99 e contagem por etapa e labels"""
+        with self._lock:
+            items = list(self._histograms.items())
+        report = {}
+        for (stage, key), histogram in items:
+            name = stage + _format_labels(key)
+            report[name] = {f"p{int(q * 100)}": histogram.quantile(q) for q in QUANTILES}
+            report[name]["count"] = histogram.count
+        return report
+
+    def export_prometheus(self) -> str:
+        """Exportar no formato de texto do Prometheus"""
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+
+        name = f"{METRIC_PREFIX}_stage_duration_seconds"
+        lines = [
+            f"# HELP {name} Duração das etapas do pipeline (janela deslizante)",
+            f"# TYPE {name} summary",
+        ]
+        for (stage, key), histogram in histograms:
+            labels = key + (("stage", stage),)
+            for q in QUANTILES:
+                value = histogram.quantile(q)
+                if value is not None:
+                    lines.append(f"{name}{_format_labels(labels, quantile=str(q))} {value:.6f}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {histogram.total:.6f}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+
+        for counter in sorted({name for (name, _), _ in counters}):
+            metric = f"{METRIC_PREFIX}_{counter}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for (counter_name, key), value in counters:
+                if counter_name == counter:
+                    lines.append(f"{metric}{_format_labels(key)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def _log(self, record: Dict):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+
+def start_metrics_server(registry: MetricsRegistry, port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Servir GET /metrics em uma thread de fundo"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.export_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
+
+
+_registry: Optional[MetricsRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_metrics() -> MetricsRegistry:
+    """Registro único por processo; METRICS_LOG_PATH grava cada span em JSONL e
+    METRICS_PORT expõe /metrics"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = MetricsRegistry(log_path=os.getenv("METRICS_LOG_PATH"))
+            port = os.getenv("METRICS_PORT")
+            if port:
+                start_metrics_server(_registry, int(port))
+        return _registry
@@ -0,0 +1,188 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Deque, Dict, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# Modelos de reserva, do mais parecido ao mais rápido
+FALLBACK_CHAINS = {
+    "openai/gpt-oss-120b": ["openai/gpt-oss-20b", "llama-3.3-70b-versatile"],
+    "openai/gpt-oss-20b": ["llama-3.3-70b-versatile", "llama3-8b-8192"],
+    "llama-3.3-70b-versatile": ["openai/gpt-oss-20b", "llama3-8b-8192"],
+    "llama3-70b-8192": ["llama3-8b-8192", "openai/gpt-oss-20b"],
+    "llama3-8b-8192": ["gemma2-9b-it", "openai/gpt-oss-20b"],
+    "mixtral-8x7b-32768": ["llama-3.3-70b-versatile", "openai/gpt-oss-20b"],
+    "gemma2-9b-it": ["llama3-8b-8192", "openai/gpt-oss-20b"],
+    "o1": ["gpt-4o", "gpt-4o-mini"],
+    "o1-preview": ["gpt-4o", "gpt-4o-mini"],
+    "o1-mini": ["gpt-4o-mini", "gpt-3.5-turbo"],
+    "gpt-4o": ["gpt-4o-mini", "gpt-3.5-turbo"],
+    "gpt-4o-mini": ["gpt-3.5-turbo"],
+    "gpt-3.5-turbo": ["gpt-4o-mini"],
+}
+
+# Amostras mínimas antes de confiar nos percentis/taxa de erro de um modelo
+MIN_SAMPLES = 5
+UNHEALTHY_ERROR_RATE = 0.5
+
+
+class LatencyTracker:
+    """Latências e erros recentes por modelo (janela deslizante, em memória)"""
+
+    def __init__(self, window: int = 100):
+        self.window = window
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._outcomes: Dict[str, Deque[bool]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, model: str, latency: Optional[float], ok: bool):
+        """Registrar uma chamada (latência só é contada quando bem-sucedida)"""
+        with self._lock:
+            outcomes = self._outcomes.setdefault(model, deque(maxlen=self.window))
+            outcomes.append(ok)
+            if ok and latency is not None:
+                self._latencies.setdefault(model, deque(maxlen=self.window)).append(latency)
+
+    def percentile(self, model: str, q: float) -> Optional[float]:
+        """Percentil q (0-1) da latência; None com poucas amostras"""
+        with self._lock:
+            samples = sorted(self._latencies.get(model, ()))
+        if len(samples) < MIN_SAMPLES:
+            return None
+        return samples[min(int(q * len(samples)), len(samples) - 1)]
+
+    def error_rate(self, model: str) -> Optional[float]:
+        """Fração de falhas recentes; None com poucas amostras"""
+        with self._lock:
+            outcomes = list(self._outcomes.get(model, ()))
+        if len(outcomes) < MIN_SAMPLES:
+            return None
+        return 1 - sum(outcomes) / len(outcomes)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """p50/p95 e taxa de erro de cada modelo observado"""
+        with self._lock:
+            models = list(self._outcomes)
+        return {
+            model: {
+                "p50": self.percentile(model, 0.5),
+                "p95": self.percentile(model, 0.95),
+                "error_rate": self.error_rate(model),
+                "calls": len(self._outcomes.get(model, ())),
+            }
+            for model in models
+        }
+
+
+class ModelRouter:
+    """Fallback automático e requisições hedged entre modelos do mesmo provedor"""
+
+    def __init__(
+        self,
+        tracker: Optional[LatencyTracker] = None,
+        hedge_percentile: float = 0.95,
+        default_hedge_delay: float = 8.0,
+        min_hedge_delay: float = 1.0,
+        max_workers: int = 8,
+    ):
+        self.tracker = tracker if tracker is not None else LatencyTracker()
+        self.hedge_percentile = hedge_percentile
+        self.default_hedge_delay = default_hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge")
+
+    def candidates(self, model: str, metric: str = "total") -> List[str]:
+        """Modelo escolhido seguido das reservas, deixando por último os que estão falhando"""
+        chain = [model] + FALLBACK_CHAINS.get(model, [])
+
+        def unhealthy(name: str) -> bool:
+            rate = self.tracker.error_rate(f"{metric}:{name}")
+            return rate is not None and rate >= UNHEALTHY_ERROR_RATE
+
+        return [m for m in chain if not unhealthy(m)] + [m for m in chain if unhealthy(m)]
+
+    def hedge_delay(self, model: str, metric: str = "total") -> float:
+        """Tempo de espera antes de disparar a reserva (percentil de latência do modelo)"""
+        observed = self.tracker.percentile(f"{metric}:{model}", self.hedge_percentile)
+        if observed is None:
+            return self.default_hedge_delay
+        return max(observed, self.min_hedge_delay)
+
+    def run(
+        self,
+        model: str,
+        attempt: Callable[[str], T],
+        discard: Optional[Callable[[T], None]] = None,
+        metric: str = "total",
+    ) -> Tuple[T, str]:
+        """Executar `attempt(modelo)` com hedge/fallback; retorna (resultado, modelo vencedor)
+
+        `discard` recebe os resultados que chegarem depois do vencedor (ex.: fechar streams).
+        """
+        models = self.candidates(model, metric)
+        pending: Dict[Future, Tuple[str, float]] = {}
+        next_index = 0
+        last_error: Optional[Exception] = None
+
+        def launch():
+            nonlocal next_index
+            name = models[next_index]
+            next_index += 1
+            pending[self._executor.submit(attempt, name)] = (name, time.perf_counter())
+
+        launch()
+        while pending:
+            # Hedge: se o mais recente passar do percentil de latência, dispara o próximo modelo
+            timeout = None
+            if next_index < len(models):
+                newest_model, newest_start = max(pending.values(), key=lambda item: item[1])
+                timeout = max(self.hedge_delay(newest_model, metric) - (time.perf_counter() - newest_start), 0)
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                launch()
+                continue
+
+            for future in done:
+                name, started = pending.pop(future)
+                error = future.exception()
+                if error is None:
+                    self.tracker.record(f"{metric}:{name}", time.perf_counter() - started, True)
+                    self._abandon(pending, discard, metric)
+                    return future.result(), name
+                self.tracker.record(f"{metric}:{name}", None, False)
+                last_error = error
+
+            # Falhou e não há outra chamada em andamento: fallback imediato
+            if not pending and next_index < len(models):
+                launch()
+
+        raise last_error
+
+    def _abandon(self, pending: Dict[Future, Tuple[str, float]], discard: Optional[Callable], metric: str):
+        """Cancelar as chamadas perdedoras (ou descartar o resultado quando chegarem)"""
+        for future, (name, started) in pending.items():
+            if future.cancel():
+                continue
+
+            def on_done(f: Future, name=name, started=started):
+                ok = f.exception() is None
+                self.tracker.record(f"{metric}:{name}", time.perf_counter() - started if ok else None, ok)
+                if ok and discard is not None:
+                    discard(f.result())
+
+            future.add_done_callback(on_done)
+
+
+_router: Optional[ModelRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> ModelRouter:
+    """Instância única por processo (as estatísticas valem para todas as sessões)"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ModelRouter()
+        return _router
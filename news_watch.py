@@ -0,0 +1,117 @@
+import time
+from dataclasses import dataclass, field, replace
+from typing import List, Optional, Set
+
+from article_fetch import ArticleFetcher
+from context_packer import estimate_tokens, pack_context
+from core import (
+    SYSTEM_PROMPT,
+    SearchOptions,
+    SummaryOptions,
+    build_summary_context,
+    build_summary_prompt,
+    complete_prompt,
+    prepare_sources,
+    render_summary_prompt,
+    search_web,
+)
+from ranking import canonicalize_url
+from search_result import SearchResult
+
+# Notícias mantidas no feed (mais recentes primeiro): um acompanhamento de um dia inteiro não cresce sem limite
+MAX_WATCH_SOURCES = 50
+
+
+@dataclass
+class NewsWatch:
+    """Estado de acompanhamento de uma consulta: notícias já vistas e análise acumulada"""
+    query: str
+    seen: Set[str] = field(default_factory=set)
+    sources: List[SearchResult] = field(default_factory=list)
+    summary: str = ""
+    polls: int = 0
+    last_poll: Optional[float] = None
+    last_new: List[SearchResult] = field(default_factory=list)
+    # Tokens do último prompt enviado e de uma reconstrução completa equivalente
+    prompt_tokens: int = 0
+    full_prompt_tokens: int = 0
+
+
+def news_item_key(result: SearchResult) -> str:
+    """Identidade de uma notícia: link canônico (ou título + fonte quando não há link)
+
+    A data da SerpAPI é relativa ("2 horas atrás") e muda a cada consulta, então não entra na chave.
+    """
+    if result.link:
+        return canonicalize_url(result.link)
+    return f"{result.title.strip().lower()}|{result.source}"
+
+
+def render_delta_prompt(query: str, previous_summary: str, context: str) -> str:
+    """Prompt de atualização: análise anterior + apenas as fontes novas"""
+    return f"""Você acompanha o tema "{query}" e já produziu a análise abaixo. Chegaram novas notícias.
+
+ANÁLISE ANTERIOR:
+{previous_summary}
+
+NOVAS FONTES:
+{context}
+
+INSTRUÇÕES:
+1. Atualize a análise incorporando APENAS o que as novas fontes acrescentam
+2. Mantenha a mesma estrutura em markdown e preserve o que continua válido
+3. Corrija pontos que as novas fontes contradigam
+4. Marque com 🆕 os trechos que vieram das novas fontes
+5. Comece com uma seção "## 🆕 O que há de novo" com 2-4 tópicos
+
+Responda APENAS com a análise atualizada."""
+
+
+def build_delta_prompt(query: str, previous_summary: str, new_results: List[SearchResult], options: SummaryOptions) -> str:
+    """Montar o prompt de atualização dentro do orçamento de tokens do modelo"""
+    prompt_tokens = estimate_tokens(SYSTEM_PROMPT) + estimate_tokens(render_delta_prompt(query, previous_summary, ""))
+    context, _ = pack_context(new_results, options.model_choice, options.max_tokens, prompt_tokens)
+    return render_delta_prompt(query, previous_summary, context)
+
+
+def poll_news(
+    watch: NewsWatch,
+    api_key: str,
+    client,
+    search_options: SearchOptions,
+    summary_options: SummaryOptions,
+    article_fetcher: Optional[ArticleFetcher] = None,
+) -> List[SearchResult]:
+    """Buscar notícias, filtrar as inéditas e atualizar a análise só com elas; retorna as novas"""
+    # Sem cache: o objetivo é justamente enxergar o que mudou desde a última consulta
+    options = replace(search_options, news=True, fan_out=False)
+    results, errors = search_web(watch.query, api_key, options)
+    if errors and not results:
+        raise RuntimeError("; ".join(errors.values()))
+
+    new_results = []
+    new_keys = set()
+    for result in results:
+        key = news_item_key(result)
+        if result.type == "news" and key not in watch.seen and key not in new_keys:
+            new_keys.add(key)
+            new_results.append(result)
+
+    if new_results:
+        new_results = prepare_sources(watch.query, new_results, options, article_fetcher)
+        if watch.summary:
+            prompt = build_delta_prompt(watch.query, watch.summary, new_results, summary_options)
+        else:
+            prompt = build_summary_prompt(watch.query, new_results, summary_options)
+        watch.summary = complete_prompt(prompt, client, summary_options)
+        # Só marcar como vistas depois que a análise foi atualizada com sucesso
+        watch.seen.update(new_keys)
+        watch.sources = (new_results + watch.sources)[:MAX_WATCH_SOURCES]
+        watch.prompt_tokens = estimate_tokens(prompt)
+        full_context = build_summary_context(watch.query, watch.sources, summary_options)
+        watch.full_prompt_tokens = estimate_tokens(render_summary_prompt(watch.query, full_context, summary_options.model_choice))
+
+    watch.polls += 1
+    watch.last_poll = time.time()
+    watch.last_new = new_results
+    return new_results
@@ -0,0 +1,191 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from article_fetch import ArticleFetcher
+from core import (
+    SearchOptions,
+    SummaryOptions,
+    build_search_params,
+    create_ai_client,
+    expand_query,
+    prepare_sources,
+    search_branches,
+    summarize,
+    summary_cache_key,
+)
+from metrics import get_metrics
+from resilience import TokenBucket
+from search_cache import SearchCache
+from summary_cache import SummaryCache, canonical_query
+from web_search import fetch_serpapi, merge_results
+
+
+@dataclass
+class TrackedQuery:
+    """Consulta recente com as opções usadas e sua pontuação de popularidade"""
+    query: str
+    search_options: SearchOptions
+    summary_options: SummaryOptions
+    score: float
+    last_seen: float
+    hits: int = 1
+
+
+class QueryTracker:
+    """Frequência de consultas recentes com decaimento exponencial (meia-vida em segundos)"""
+
+    def __init__(self, half_life: float = 3600, max_queries: int = 500):
+        self.half_life = half_life
+        self.max_queries = max_queries
+        self._queries: Dict[Tuple, TrackedQuery] = {}
+        self._lock = threading.Lock()
+
+    def _decayed(self, item: TrackedQuery, now: float) -> float:
+        return item.score * 0.5 ** ((now - item.last_seen) / self.half_life)
+
+    def record(self, query: str, search_options: SearchOptions, summary_options: SummaryOptions):
+        """Contabilizar uma busca feita por um usuário"""
+        key = (canonical_query(query), repr(search_options), summary_options.ai_provider, summary_options.model_choice)
+        now = time.time()
+        with self._lock:
+            item = self._queries.get(key)
+            if item is None:
+                self._queries[key] = TrackedQuery(query, search_options, summary_options, 1.0, now)
+            else:
+                item.score = self._decayed(item, now) + 1
+                item.last_seen = now
+                item.hits += 1
+                item.summary_options = summary_options
+            if len(self._queries) > self.max_queries:
+                # Descartar as menos populares
+                ranked = sorted(self._queries, key=lambda k: self._decayed(self._queries[k], now))
+                for stale in ranked[:len(self._queries) - self.max_queries]:
+                    del self._queries[stale]
+
+    def top(self, n: int, min_hits: int = 1) -> List[TrackedQuery]:
+        """As `n` consultas mais populares no momento (buscadas ao menos `min_hits` vezes)"""
+        now = time.time()
+        with self._lock:
+            items = [item for item in self._queries.values() if item.hits >= min_hits]
+        return sorted(items, key=lambda item: self._decayed(item, now), reverse=True)[:n]
+
+
+class PrefetchWorker:
+    """Thread de fundo que renova buscas e análises das consultas populares antes de expirarem"""
+
+    def __init__(
+        self,
+        tracker: QueryTracker,
+        serpapi_key: str,
+        api_keys: Dict[str, Optional[str]],
+        search_cache: SearchCache,
+        summary_cache: SummaryCache,
+        article_fetcher: Optional[ArticleFetcher] = None,
+        top_n: int = 5,
+        min_hits: int = 2,
+        interval: float = 60,
+        lead_time: float = 300,
+        search_budget_per_hour: float = 30,
+        llm_budget_per_hour: float = 20,
+    ):
+        self.tracker = tracker
+        self.serpapi_key = serpapi_key
+        self.api_keys = api_keys
+        self.search_cache = search_cache
+        self.summary_cache = summary_cache
+        self.article_fetcher = article_fetcher
+        self.top_n = top_n
+        # Consultas feitas uma única vez não justificam gastar cota
+        self.min_hits = min_hits
+        self.interval = interval
+        self.lead_time = lead_time
+        # Orçamento próprio por hora (rajada de até uma rodada), além dos limites do gateway
+        self._search_budget = TokenBucket(search_budget_per_hour / 60, capacity=min(search_budget_per_hour, top_n))
+        self._llm_budget = TokenBucket(llm_budget_per_hour / 60, capacity=min(llm_budget_per_hour, top_n))
+        self._clients: Dict[str, object] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"runs": 0, "searches": 0, "summaries": 0, "over_budget": 0, "errors": 0, "last_run": None}
+
+    def start(self) -> "PrefetchWorker":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="prefetch", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+    def _client(self, ai_provider: str):
+        if ai_provider not in self._clients:
+            self._clients[ai_provider] = create_ai_client(ai_provider, self.api_keys.get(ai_provider))
+        return self._clients[ai_provider]
+
+    def _expiring(self, ttl: Optional[float]) -> bool:
+        return ttl is None or ttl < self.lead_time
+
+    def _spend(self, bucket: TokenBucket, amount: float = 1) -> bool:
+        if bucket.available() < amount:
+            self.stats["over_budget"] += 1
+            return False
+        bucket.reserve(amount)
+        return True
+
+    def run_once(self):
+        """Renovar as consultas populares cujas entradas expiram em menos de `lead_time`"""
+        with get_metrics().span("prefetch_run"):
+            for item in self.tracker.top(self.top_n, self.min_hits):
+                try:
+                    if not self.refresh(item):
+                        break
+                except Exception:
+                    self.stats["errors"] += 1
+        self.stats["runs"] += 1
+        self.stats["last_run"] = time.time()
+
+    def refresh(self, item: TrackedQuery) -> bool:
+        """Renovar uma consulta; retorna False quando o orçamento acabou"""
+        params = build_search_params(item.query, self.serpapi_key, item.search_options)
+        # Mesmas subconsultas da busca original (a expansão por IA vem do cache)
+        provider = item.summary_options.ai_provider
+        expansions = expand_query(item.query, item.search_options, self._client(provider), provider)
+        branches = list(search_branches(params, item.search_options, expansions).values())
+
+        branch_results = []
+        for branch in branches:
+            results = None
+            if not self._expiring(self.search_cache.time_to_live(branch)):
+                results = self.search_cache.get(branch, count=False)
+            if results is None:
+                if not self._spend(self._search_budget):
+                    return False
+                results = fetch_serpapi(branch)
+                self.stats["searches"] += 1
+                if results:
+                    self.search_cache.set(branch, results)
+            branch_results.append(results)
+
+        search_results = merge_results(branch_results) if len(branches) > 1 else branch_results[0]
+        if not search_results:
+            return True
+        search_results = prepare_sources(item.query, search_results, item.search_options, self.article_fetcher)
+
+        options = item.summary_options
+        model_key, fingerprint = summary_cache_key(item.query, search_results, options)
+        if not self._expiring(self.summary_cache.time_to_live(item.query, model_key, fingerprint)):
+            return True
+        client = self._client(options.ai_provider)
+        if client is None:
+            return True
+        if not self._spend(self._llm_budget):
+            return False
+        summary = summarize(item.query, search_results, client, options)
+        self.stats["summaries"] += 1
+        self.summary_cache.set(item.query, model_key, fingerprint, summary)
+        return True
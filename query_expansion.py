@@ -0,0 +1,240 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from summary_cache import canonical_query
+
+# Termos equivalentes usados na expansão local (chaves em minúsculas). Em português o
+# sinônimo tem o mesmo gênero e número do termo, para não quebrar a concordância com o
+# resto da consulta (ex.: "economia brasileira" → "atividade econômica brasileira")
+SYNONYMS = {
+    "pt": {
+        "ia": "inteligência artificial",
+        "inteligência artificial": "IA",
+        "criptomoedas": "moedas digitais",
+        "bitcoin": "BTC",
+        "economia": "atividade econômica",
+        "inflação": "alta dos preços",
+        "desemprego": "mercado de trabalho",
+        "mercado de trabalho": "emprego",
+        "aquecimento global": "aquecimento do planeta",
+        "mudanças climáticas": "alterações climáticas",
+        "carros elétricos": "veículos elétricos",
+        "startups": "empresas de tecnologia",
+    },
+    "en": {
+        "ai": "artificial intelligence",
+        "artificial intelligence": "AI",
+        "crypto": "cryptocurrency",
+        "bitcoin": "cryptocurrency",
+        "global warming": "climate change",
+        "climate change": "global warming",
+        "ev": "electric vehicles",
+        "jobs": "labor market",
+    },
+}
+
+# Glossário pt → en para a versão traduzida da consulta (expressões antes das palavras)
+GLOSSARY_PT_EN = {
+    "inteligência artificial": "artificial intelligence",
+    "economia brasileira": "Brazilian economy",
+    "mercado brasileiro": "Brazilian market",
+    "mercado de trabalho": "job market",
+    "mudanças climáticas": "climate change",
+    "aquecimento global": "global warming",
+    "carros elétricos": "electric cars",
+    "energia solar": "solar energy",
+    "ia": "AI",
+    "economia": "economy",
+    "mercado": "market",
+    "tecnologia": "technology",
+    "saúde": "health",
+    "energia": "energy",
+    "eleições": "elections",
+    "eleição": "election",
+    "regulação": "regulation",
+    "governo": "government",
+    "trabalho": "work",
+    "emprego": "jobs",
+    "educação": "education",
+    "segurança": "security",
+    "investimento": "investment",
+    "investimentos": "investments",
+    "empresas": "companies",
+    "clima": "climate",
+    "política": "politics",
+    "análise": "analysis",
+    "tendências": "trends",
+    "notícias": "news",
+    "diagnóstico": "diagnosis",
+    "modelos": "models",
+    "mundial": "global",
+    "brasil": "Brazil",
+    "brasileira": "Brazilian",
+    "brasileiro": "Brazilian",
+    "inflação": "inflation",
+    "juros": "interest rates",
+    "criptomoedas": "cryptocurrencies",
+    "bitcoin": "bitcoin",
+    "dados": "data",
+    "centros": "centers",
+    "plano": "plan",
+    "nacional": "national",
+}
+GLOSSARY_EN_PT = {en.lower(): pt for pt, en in GLOSSARY_PT_EN.items()}
+
+STOPWORDS = {
+    "pt": {"a", "o", "as", "os", "de", "da", "do", "das", "dos", "e", "em", "na", "no", "nas", "nos", "para", "por", "com", "um", "uma"},
+    "en": {"a", "an", "the", "of", "and", "in", "on", "for", "to", "with", "by"},
+}
+
+# Local de busca da versão traduzida
+TRANSLATION_LOCALES = {"pt": ("en", "us"), "en": ("pt", "br")}
+
+_YEAR_PATTERN = re.compile(r"\b(19|20)\d{2}\b")
+
+
+@dataclass(frozen=True)
+class SubQuery:
+    """Consulta derivada; idioma/país próprios quando é uma tradução"""
+    query: str
+    language: Optional[str] = None
+    country: Optional[str] = None
+
+
+def _terms_pattern(terms: Dict[str, str]) -> Tuple["re.Pattern", Dict[str, str]]:
+    """Regex única com todos os termos (mais longos primeiro) e o mapa termo → substituto"""
+    lookup = {term.lower(): replacement for term, replacement in terms.items()}
+    alternation = "|".join(re.escape(term) for term in sorted(lookup, key=len, reverse=True))
+    return re.compile(rf"(?<!\w)(?:{alternation})(?!\w)", re.IGNORECASE), lookup
+
+
+def _replace_terms(query: str, terms: Dict[str, str]) -> Tuple[str, int]:
+    """Substituir expressões do dicionário numa única passada (mais longas primeiro); retorna o texto e quantas trocou
+
+    Uma passada só: com pares nos dois sentidos (IA ↔ inteligência artificial) o texto trocado não é trocado de volta.
+    """
+    if not terms:
+        return query, 0
+    pattern, lookup = _terms_pattern(terms)
+    return pattern.subn(lambda match: lookup[match.group(0).lower()], query)
+
+
+def translate_query(query: str, language: str) -> Optional[str]:
+    """Tradução por glossário; None se alguma palavra de conteúdo não tiver tradução conhecida
+
+    Tradução parcial ("IA generativa" → "AI generativa") mistura idiomas e só polui a busca no outro local.
+    """
+    glossary = GLOSSARY_PT_EN if language == "pt" else GLOSSARY_EN_PT if language == "en" else None
+    if glossary is None:
+        return None
+    stopwords = STOPWORDS.get(language, set())
+    pattern, _ = _terms_pattern(glossary)
+    covered = [match.span() for match in pattern.finditer(query)]
+    words = [w for w in re.finditer(r"\w+", query) if w.group().lower() not in stopwords and not w.group().isdigit()]
+    if not words:
+        return None
+    for word in words:
+        if not any(start <= word.start() and word.end() <= end for start, end in covered):
+            return None
+    translated, _ = _replace_terms(query, glossary)
+    kept = [w for w in re.findall(r"\w+", translated) if w.lower() not in stopwords]
+    return " ".join(kept)
+
+
+def local_expansions(query: str, language: str, limit: int = 3) -> List[SubQuery]:
+    """Subconsultas sem chamada externa: sinônimos, ano corrente e tradução pt/en"""
+    candidates = []
+    synonym_query, replaced = _replace_terms(query, SYNONYMS.get(language, {}))
+    if replaced:
+        candidates.append(SubQuery(synonym_query))
+    translated = translate_query(query, language)
+    if translated:
+        hl, gl = TRANSLATION_LOCALES[language]
+        candidates.append(SubQuery(translated, hl, gl))
+    if not _YEAR_PATTERN.search(query):
+        candidates.append(SubQuery(f"{query} {time.localtime().tm_year}"))
+
+    seen = {canonical_query(query)}
+    expansions = []
+    for candidate in candidates:
+        key = canonical_query(candidate.query)
+        if key not in seen:
+            seen.add(key)
+            expansions.append(candidate)
+    return expansions[:limit]
+
+
+def render_expansion_prompt(query: str, language: str, limit: int) -> str:
+    """Prompt da expansão por IA: variações de busca, uma por linha"""
+    other_language = "inglês" if language == "pt" else "português"
+    return f"""Gere {limit} consultas de busca no Google que ajudem a cobrir o tema "{query}" por ângulos diferentes (sinônimos, termos técnicos, aspectos específicos). Uma delas pode ser em {other_language}.
+
+Responda APENAS com uma consulta por linha, sem numeração nem comentários."""
+
+
+def parse_expansions(text: str, query: str, limit: int) -> List[SubQuery]:
+    """Extrair as consultas da resposta do modelo (ignorando numeração, marcadores e repetições)"""
+    seen = {canonical_query(query)}
+    expansions = []
+    for line in text.splitlines():
+        line = re.sub(r"^\s*(?:[-*•#]+|\d+[.)])\s*", "", line).strip().strip('"')
+        key = canonical_query(line)
+        if not line or len(line) > 120 or key in seen:
+            continue
+        seen.add(key)
+        expansions.append(SubQuery(line))
+    return expansions[:limit]
+
+
+def expansion_key(query: str, language: str, limit: int, ai_provider: str) -> Tuple:
+    """Chave do cache: consulta normalizada e parâmetros que mudam a resposta do modelo"""
+    return canonical_query(query), language, limit, ai_provider
+
+
+class ExpansionCache:
+    """Subconsultas já geradas por consulta (em memória, com TTL e despejo LRU)"""
+
+    def __init__(self, ttl: int = 86400, max_entries: int = 2048):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple, Tuple[float, List[SubQuery]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple) -> Optional[List[SubQuery]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: Tuple, expansions: List[SubQuery]):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, expansions)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_cache: Optional[ExpansionCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_expansion_cache() -> ExpansionCache:
+    """Instância única por processo"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ExpansionCache()
+        return _cache
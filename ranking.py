@@ -0,0 +1,149 @@
+import hashlib
+import math
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Set
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import numpy as np
+
+from search_result import SearchResult
+
+# Parâmetros de rastreamento removidos na canonicalização de URLs
+TRACKING_PARAMS = {"gclid", "fbclid", "msclkid", "mc_cid", "mc_eid", "igshid", "ref", "ref_src", "cmpid", "ocid"}
+TRACKING_PREFIXES = ("utm_",)
+
+# MinHash: número de permutações, bandas do LSH e tamanho dos shingles
+NUM_PERMUTATIONS = 64
+LSH_BANDS = 16
+SHINGLE_SIZE = 3
+DUPLICATE_THRESHOLD = 0.6
+
+# Parâmetros padrão do BM25
+BM25_K1 = 1.5
+BM25_B = 0.75
+# Peso da posição original na SerpAPI (sinal de relevância do próprio Google)
+RANK_PRIOR_WEIGHT = 0.5
+
+# Hash universal (a * x + b) mod p com p primo de 31 bits: cabe em int64 sem overflow
+_MAX_HASH = (1 << 31) - 1
+_rng = np.random.default_rng(20240101)
+_PERM_A = _rng.integers(1, _MAX_HASH, NUM_PERMUTATIONS, dtype=np.int64)
+_PERM_B = _rng.integers(0, _MAX_HASH, NUM_PERMUTATIONS, dtype=np.int64)
+
+
+def canonicalize_url(url: str) -> str:
+    """URL canônica: host minúsculo sem 'www.', sem fragmento e sem parâmetros de rastreamento"""
+    if not url:
+        return ""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if host.startswith("m.") or host.startswith("amp."):
+        host = host.split(".", 1)[1]
+    query = [
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k.lower() not in TRACKING_PARAMS and not k.lower().startswith(TRACKING_PREFIXES)
+    ]
+    path = parts.path.rstrip("/") or "/"
+    if path.endswith("/amp"):
+        path = path[:-4] or "/"
+    return urlunsplit(("https" if parts.scheme in ("http", "https") else parts.scheme, host, path, urlencode(sorted(query)), ""))
+
+
+def tokenize(text: str) -> List[str]:
+    """Tokens minúsculos e sem acentos"""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return re.findall(r"\w+", text)
+
+
+def _shingles(tokens: List[str]) -> Set[int]:
+    if len(tokens) < SHINGLE_SIZE:
+        grams = [" ".join(tokens)] if tokens else []
+    else:
+        grams = [" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)]
+    return {int.from_bytes(hashlib.blake2b(g.encode(), digest_size=4).digest(), "little") & _MAX_HASH for g in grams}
+
+
+def minhash_signature(text: str) -> np.ndarray:
+    """Assinatura MinHash dos shingles de palavras do texto"""
+    shingles = _shingles(tokenize(text))
+    if not shingles:
+        return np.full(NUM_PERMUTATIONS, _MAX_HASH, dtype=np.int64)
+    values = np.fromiter(shingles, dtype=np.int64, count=len(shingles))
+    return ((np.outer(_PERM_A, values) + _PERM_B[:, None]) % _MAX_HASH).min(axis=1)
+
+
+def signature_similarity(sig_a: np.ndarray, sig_b: np.ndarray) -> float:
+    """Similaridade de Jaccard estimada pelas assinaturas"""
+    return float(np.count_nonzero(sig_a == sig_b)) / NUM_PERMUTATIONS
+
+
+def dedupe_results(search_results: List[SearchResult], threshold: float = DUPLICATE_THRESHOLD) -> List[SearchResult]:
+    """Remover duplicatas por URL canônica e quase-duplicatas (título + snippet)"""
+    rows = NUM_PERMUTATIONS // LSH_BANDS
+    buckets: Dict[tuple, List[int]] = {}
+    kept: List[SearchResult] = []
+    signatures: List[np.ndarray] = []
+    seen_urls = set()
+
+    for result in search_results:
+        url = canonicalize_url(result.link)
+        if url and url in seen_urls:
+            continue
+
+        signature = minhash_signature(f"{result.title} {result.snippet}")
+        band_keys = [(band, signature[band * rows:(band + 1) * rows].tobytes()) for band in range(LSH_BANDS)]
+        # LSH: só compara com itens que compartilham ao menos uma banda
+        candidates = {i for key in band_keys for i in buckets.get(key, [])}
+        if any(signature_similarity(signature, signatures[i]) >= threshold for i in candidates):
+            continue
+
+        if url:
+            seen_urls.add(url)
+        index = len(kept)
+        kept.append(result)
+        signatures.append(signature)
+        for key in band_keys:
+            buckets.setdefault(key, []).append(index)
+    return kept
+
+
+def bm25_scores(query: str, documents: List[str]) -> List[float]:
+    """Pontuação BM25 de cada documento em relação à consulta"""
+    query_terms = set(tokenize(query))
+    docs = [tokenize(doc) for doc in documents]
+    if not docs or not query_terms:
+        return [0.0] * len(docs)
+
+    avg_len = sum(len(d) for d in docs) / len(docs) or 1.0
+    doc_freq = Counter(term for d in docs for term in set(d) if term in query_terms)
+    n = len(docs)
+
+    scores = []
+    for doc in docs:
+        freqs = Counter(doc)
+        score = 0.0
+        for term in query_terms:
+            tf = freqs.get(term, 0)
+            if not tf:
+                continue
+            idf = math.log(1 + (n - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5))
+            score += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * len(doc) / avg_len))
+        scores.append(score)
+    return scores
+
+
+def rank_results(query: str, search_results: List[SearchResult]) -> List[SearchResult]:
+    """Deduplicar e reordenar por relevância (BM25), mantendo o knowledge graph no topo"""
+    unique = dedupe_results(search_results)
+    knowledge = [r for r in unique if r.type == "knowledge"]
+    others = [r for r in unique if r.type != "knowledge"]
+
+    scores = bm25_scores(query, [f"{r.title} {r.snippet}" for r in others])
+    # Empate mantém a ordem original da SerpAPI (sort estável)
+    order = sorted(range(len(others)), key=lambda i: -(scores[i] + RANK_PRIOR_WEIGHT / (i + 1)))
+    return knowledge + [others[i] for i in order]
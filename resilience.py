@@ -0,0 +1,330 @@
+import asyncio
+import email.utils
+import json
+import os
+import random
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# Limites padrão por provedor: (requisições/min, tokens/min); 0 = sem limite
+DEFAULT_PROVIDER_LIMITS = {
+    "serpapi": (float(os.getenv("SERPAPI_RPM", "60")), 0),
+    "GroqCloud": (float(os.getenv("GROQ_RPM", "30")), float(os.getenv("GROQ_TPM", "0"))),
+    "OpenAI": (float(os.getenv("OPENAI_RPM", "60")), float(os.getenv("OPENAI_TPM", "0"))),
+}
+
+# Limites por modelo (plano gratuito do GroqCloud); modelos ausentes usam só o limite do provedor
+DEFAULT_MODEL_LIMITS = {
+    "openai/gpt-oss-120b": (30, 8000),
+    "openai/gpt-oss-20b": (30, 8000),
+    "llama-3.3-70b-versatile": (30, 12000),
+    "llama3-70b-8192": (30, 6000),
+    "llama3-8b-8192": (30, 6000),
+    "mixtral-8x7b-32768": (30, 5000),
+    "gemma2-9b-it": (30, 15000),
+}
+# Ajuste para planos pagos: MODEL_LIMITS='{"openai/gpt-oss-120b": [1000, 250000]}'
+DEFAULT_MODEL_LIMITS.update({
+    model: tuple(limits) for model, limits in json.loads(os.getenv("MODEL_LIMITS", "{}")).items()
+})
+
+# Exceções de rede dos SDKs (groq/openai) tratadas como falhas temporárias
+_TRANSIENT_ERROR_NAMES = {
+    "APIConnectionError", "APITimeoutError", "ConnectionError", "Timeout",
+    "ConnectTimeout", "ReadTimeout", "ChunkedEncodingError",
+    # httpx (serviço assíncrono)
+    "ConnectError", "PoolTimeout", "RemoteProtocolError",
+}
+
+
+class CircuitOpenError(Exception):
+    """Provedor temporariamente suspenso pelo circuit breaker"""
+
+    def __init__(self, provider: str, retry_in: float):
+        super().__init__(f"{provider} indisponível no momento; nova tentativa em {retry_in:.0f}s")
+        self.provider = provider
+        self.retry_in = retry_in
+
+
+class TokenBucket:
+    """Balde de tokens com reposição contínua (capacidade padrão = taxa por minuto)"""
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.per_minute = per_minute
+        self.capacity = per_minute if capacity is None else capacity
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.per_minute / 60)
+        self._updated = now
+
+    def reserve(self, amount: float = 1) -> float:
+        """Consumir `amount` tokens; retorna quanto esperar até que estejam disponíveis"""
+        if self.per_minute <= 0:
+            return 0.0
+        # Pedidos maiores que a capacidade esperam o balde encher por completo
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= amount
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens * 60 / self.per_minute
+
+    def available(self) -> float:
+        """Tokens disponíveis agora"""
+        with self._lock:
+            self._refill(time.monotonic())
+            return max(self._tokens, 0.0)
+
+
+class CircuitBreaker:
+    """Abre após falhas consecutivas e libera uma chamada de teste após o intervalo"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """closed (normal), open (suspenso) ou half_open (aguardando chamada de teste)"""
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def before_call(self, provider: str) -> bool:
+        """Levantar CircuitOpenError se o provedor estiver suspenso; True se esta é a chamada de teste"""
+        with self._lock:
+            state = self.state
+            if state == "open":
+                raise CircuitOpenError(provider, self.reset_timeout - (time.monotonic() - self.opened_at))
+            if state == "half_open":
+                if self._trial_in_flight:
+                    raise CircuitOpenError(provider, 1)
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        """Provedor respondeu: fechar o circuito"""
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        """Registrar falha; abre ao atingir o limite ou se a chamada de teste falhar"""
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                self.opened_at = time.monotonic()
+
+    def release_trial(self):
+        """Liberar a chamada de teste sem resultado (interrompida); a próxima chamada vira o teste"""
+        with self._lock:
+            self._trial_in_flight = False
+
+
+def error_status(error: Exception) -> Optional[int]:
+    """Status HTTP de uma exceção do requests ou dos SDKs (se houver)"""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Ler Retry-After (segundos ou data HTTP) / retry-after-ms da resposta de erro"""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        parsed = email.utils.parsedate_to_datetime(value)
+        return max(parsed.timestamp() - time.time(), 0.0) if parsed else None
+
+
+def is_transient(error: Exception) -> bool:
+    """Falha de rede ou do servidor (conta para o circuit breaker)"""
+    status = error_status(error)
+    if status is not None:
+        return status >= 500
+    return any(cls.__name__ in _TRANSIENT_ERROR_NAMES for cls in type(error).__mro__)
+
+
+def is_retryable(error: Exception) -> bool:
+    """Vale tentar de novo: limite de taxa (429), timeout (408) ou falha temporária"""
+    return error_status(error) in (408, 429) or is_transient(error)
+
+
+class ProviderGateway:
+    """Camada compartilhada de limites de taxa, retry com backoff e circuit breaker"""
+
+    def __init__(
+        self,
+        provider_limits: Optional[Dict[str, Tuple[float, float]]] = None,
+        model_limits: Optional[Dict[str, Tuple[float, float]]] = None,
+        max_retries: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 20,
+    ):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._provider_limits = dict(DEFAULT_PROVIDER_LIMITS if provider_limits is None else provider_limits)
+        self._model_limits = dict(DEFAULT_MODEL_LIMITS if model_limits is None else model_limits)
+        self._buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def set_limits(self, provider: str, requests_per_minute: float, tokens_per_minute: float = 0):
+        """Redefinir os limites de um provedor"""
+        with self._lock:
+            self._provider_limits[provider] = (requests_per_minute, tokens_per_minute)
+            for key in [k for k in self._buckets if k[0] == provider]:
+                del self._buckets[key]
+
+    def _bucket(self, scope: str, kind: str, per_minute: float) -> TokenBucket:
+        with self._lock:
+            key = (scope, kind)
+            if key not in self._buckets:
+                self._buckets[key] = TokenBucket(per_minute)
+            return self._buckets[key]
+
+    def breaker(self, provider: str) -> CircuitBreaker:
+        """Circuit breaker do provedor (criado sob demanda)"""
+        with self._lock:
+            if provider not in self._breakers:
+                self._breakers[provider] = CircuitBreaker()
+            return self._breakers[provider]
+
+    def _reserve(self, provider: str, model: Optional[str], tokens: float) -> float:
+        waits = []
+        rpm, tpm = self._provider_limits.get(provider, (0, 0))
+        waits.append(self._bucket(provider, "rpm", rpm).reserve(1))
+        if tokens:
+            waits.append(self._bucket(provider, "tpm", tpm).reserve(tokens))
+        if model and model in self._model_limits:
+            model_rpm, model_tpm = self._model_limits[model]
+            waits.append(self._bucket(f"{provider}:{model}", "rpm", model_rpm).reserve(1))
+            if tokens:
+                waits.append(self._bucket(f"{provider}:{model}", "tpm", model_tpm).reserve(tokens))
+        return max(waits)
+
+    def _acquire(self, provider: str, model: Optional[str], tokens: float):
+        delay = self._reserve(provider, model, tokens)
+        if delay > 0:
+            time.sleep(delay)
+
+    def backoff_delay(self, attempt: int, error: Exception) -> float:
+        """Espera antes da próxima tentativa: Retry-After ou exponencial com jitter"""
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, provider: str, fn: Callable[[], T], model: Optional[str] = None, tokens: float = 0) -> T:
+        """Executar `fn` respeitando limites, com novas tentativas e circuit breaker"""
+        breaker = self.breaker(provider)
+        attempt = 0
+        while True:
+            trial = breaker.before_call(provider)
+            try:
+                self._acquire(provider, model, tokens)
+                try:
+                    result = fn()
+                except Exception as e:
+                    # Erros não transitórios (429, 4xx) não dizem se o provedor está fora do ar: circuito inalterado
+                    if is_transient(e):
+                        breaker.record_failure()
+                    if not is_retryable(e) or attempt >= self.max_retries:
+                        raise
+                    time.sleep(self.backoff_delay(attempt, e))
+                    attempt += 1
+                    continue
+                breaker.record_success()
+                return result
+            finally:
+                # Só quem fez a chamada de teste a libera (KeyboardInterrupt/SystemExit não travam o circuito)
+                if trial:
+                    breaker.release_trial()
+
+    async def acall(self, provider: str, fn: Callable[[], Awaitable[T]], model: Optional[str] = None, tokens: float = 0) -> T:
+        """Versão assíncrona de `call`: mesmos limites e circuit breaker, esperas sem bloquear o loop"""
+        breaker = self.breaker(provider)
+        attempt = 0
+        while True:
+            trial = breaker.before_call(provider)
+            try:
+                delay = self._reserve(provider, model, tokens)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                try:
+                    result = await fn()
+                except Exception as e:
+                    if is_transient(e):
+                        breaker.record_failure()
+                    if not is_retryable(e) or attempt >= self.max_retries:
+                        raise
+                    await asyncio.sleep(self.backoff_delay(attempt, e))
+                    attempt += 1
+                    continue
+                breaker.record_success()
+                return result
+            finally:
+                # CancelledError (ex.: cliente do SSE desconectou) também libera a chamada de teste
+                if trial:
+                    breaker.release_trial()
+
+    def status(self) -> Dict[str, Dict]:
+        """Estado de cada provedor para exibição (circuit breaker e cota por minuto)"""
+        report = {}
+        for provider, (rpm, _) in self._provider_limits.items():
+            breaker = self.breaker(provider)
+            state = breaker.state
+            retry_in = 0.0
+            if state == "open":
+                retry_in = breaker.reset_timeout - (time.monotonic() - breaker.opened_at)
+            report[provider] = {
+                "state": state,
+                "failures": breaker.failures,
+                "retry_in": retry_in,
+                "requests_available": self._bucket(provider, "rpm", rpm).available() if rpm else None,
+                "requests_per_minute": rpm,
+            }
+        return report
+
+
+_gateway: Optional[ProviderGateway] = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway() -> ProviderGateway:
+    """Instância única por processo, compartilhada entre sessões e threads"""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = ProviderGateway()
+        return _gateway
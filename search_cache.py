@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Union
+
+from cache_backends import CacheBackend, compress, create_backend, decompress
+from search_result import SearchResult, dumps_results, loads_results
+
+# TTLs padrão (segundos): notícias envelhecem rápido, busca geral nem tanto
+DEFAULT_TTL_NEWS = int(os.getenv("SEARCH_CACHE_TTL_NEWS", "900"))
+DEFAULT_TTL_WEB = int(os.getenv("SEARCH_CACHE_TTL_WEB", "21600"))
+DEFAULT_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "2000"))
+# Acertos/falhas são somados em memória e gravados no backend a cada N consultas ou T segundos
+COUNTER_FLUSH_EVERY = 50
+COUNTER_FLUSH_SECONDS = 5.0
+
+# Parâmetros que não influenciam o resultado da SerpAPI
+_IGNORED_PARAMS = {"api_key"}
+
+
+def normalize_query(query: str) -> str:
+    """Normalizar a consulta (caixa e espaços) para uso como chave"""
+    return " ".join(query.lower().split())
+
+
+def make_cache_key(params: Dict) -> str:
+    """Gerar chave estável a partir de todos os parâmetros da SerpAPI"""
+    key_params = {
+        k: v for k, v in params.items()
+        if k not in _IGNORED_PARAMS and v is not None
+    }
+    key_params["q"] = normalize_query(str(key_params.get("q", "")))
+    raw = json.dumps(key_params, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class SearchCache:
+    """Cache de resultados da SerpAPI com TTL por tipo de busca, sobre um backend plugável
+
+    `backend` pode ser um CacheBackend ou uma URL/caminho (ver `create_backend`); um caminho
+    simples mantém o SQLite local de antes. `max_entries` limita o backend criado a partir da
+    URL/caminho; um backend pronto já traz o próprio limite (ex.: CACHE_MAX_ENTRIES).
+    """
+
+    namespace = "search:"
+
+    def __init__(
+        self,
+        backend: Union[str, CacheBackend],
+        ttl_news: int = DEFAULT_TTL_NEWS,
+        ttl_web: int = DEFAULT_TTL_WEB,
+        max_entries: Optional[int] = None,
+    ):
+        if isinstance(backend, str):
+            self.backend = create_backend(backend, max_entries or DEFAULT_MAX_ENTRIES)
+        elif max_entries is not None:
+            raise ValueError("max_entries só se aplica a um backend criado por URL/caminho; configure o limite no backend")
+        else:
+            self.backend = backend
+        self.ttl_news = ttl_news
+        self.ttl_web = ttl_web
+        self._pending: Dict[str, int] = {}
+        self._pending_total = 0
+        self._last_flush = time.monotonic()
+        self._counter_lock = threading.Lock()
+
+    def _key(self, params: Dict) -> str:
+        return self.namespace + make_cache_key(params)
+
+    def ttl_for(self, params: Dict) -> int:
+        """TTL conforme o modo de busca (tbm=nws é notícia)"""
+        return self.ttl_news if params.get("tbm") == "nws" else self.ttl_web
+
+    def get(self, params: Dict, count: bool = True) -> Optional[List[SearchResult]]:
+        """Retornar resultados em cache ou None (contabiliza hit/miss se `count`)"""
+        payload = self.backend.get(self._key(params))
+        if count:
+            self._count("misses" if payload is None else "hits")
+        if payload is None:
+            return None
+        return loads_results(decompress(payload))
+
+    def _count(self, name: str):
+        with self._counter_lock:
+            self._pending[name] = self._pending.get(name, 0) + 1
+            self._pending_total += 1
+            due = self._pending_total >= COUNTER_FLUSH_EVERY or time.monotonic() - self._last_flush >= COUNTER_FLUSH_SECONDS
+        if due:
+            self.flush_counters()
+
+    def flush_counters(self):
+        """Gravar no backend os acertos/falhas acumulados (com backend compartilhado somam todas as réplicas)"""
+        with self._counter_lock:
+            pending, self._pending = self._pending, {}
+            self._pending_total = 0
+            self._last_flush = time.monotonic()
+        for name, amount in pending.items():
+            self.backend.incr(self.namespace + name, amount)
+
+    def time_to_live(self, params: Dict) -> Optional[float]:
+        """Segundos até a entrada expirar (None se ausente), sem contar como acesso"""
+        return self.backend.time_to_live(self._key(params))
+
+    def set(self, params: Dict, results: List[SearchResult]):
+        """Armazenar resultados (comprimidos) com o TTL do tipo de busca"""
+        payload = compress(dumps_results(results).encode("utf-8"))
+        self.backend.set(self._key(params), payload, self.ttl_for(params))
+
+    def clear(self):
+        """Remover todas as entradas e zerar os contadores"""
+        with self._counter_lock:
+            self._pending = {}
+            self._pending_total = 0
+        self.backend.clear(self.namespace)
+
+    def stats(self) -> Dict[str, int]:
+        """Contadores de acertos, falhas e chamadas à SerpAPI economizadas"""
+        self.flush_counters()
+        counters = self.backend.counters(self.namespace)
+        hits = counters.get("hits", 0)
+        misses = counters.get("misses", 0)
+        return {
+            "hits": hits,
+            "misses": misses,
+            # Cada acerto é uma requisição a menos na cota da SerpAPI
+            "quota_saved": hits,
+            "entries": self.backend.count(self.namespace),
+        }
@@ -0,0 +1,127 @@
+import hashlib
+import json
+from typing import Dict, Iterable, Iterator, List, Optional
+
+try:
+    # Decodificador em C, bem mais rápido; opcional
+    import orjson
+except ImportError:
+    orjson = None
+
+RESULT_TYPES = ("knowledge", "web", "news")
+
+
+class SearchResult:
+    """Resultado de busca compacto (sem __dict__ por instância)"""
+
+    __slots__ = ("title", "link", "snippet", "source", "type", "date", "content")
+
+    def __init__(
+        self,
+        title: str = "",
+        link: str = "",
+        snippet: str = "",
+        source: str = "",
+        type: str = "web",
+        date: str = "",
+        content: Optional[str] = None,
+    ):
+        self.title = title
+        self.link = link
+        self.snippet = snippet
+        self.source = source
+        self.type = type
+        self.date = date
+        # Texto completo do artigo, quando lido (ver ArticleFetcher.enrich)
+        self.content = content
+
+    def __repr__(self) -> str:
+        return f"SearchResult(type={self.type!r}, title={self.title[:40]!r}, link={self.link!r})"
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, SearchResult):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def copy(self, **changes) -> "SearchResult":
+        """Cópia rasa com campos alterados"""
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values.update(changes)
+        return SearchResult(**values)
+
+    def to_dict(self) -> Dict:
+        """Formato JSON (cache, API, CLI); campos vazios opcionais são omitidos"""
+        data = {
+            "title": self.title,
+            "link": self.link,
+            "snippet": self.snippet,
+            "source": self.source,
+            "type": self.type,
+        }
+        if self.date:
+            data["date"] = self.date
+        if self.content is not None:
+            data["content"] = self.content
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "SearchResult":
+        return cls(**{name: data[name] for name in cls.__slots__ if name in data})
+
+
+class ResultSet:
+    """Resultados na ordem original com índice por tipo, montado em uma única passada"""
+
+    __slots__ = ("items", "_by_type", "_fingerprint")
+
+    def __init__(self, results: Iterable[SearchResult]):
+        self.items: List[SearchResult] = list(results)
+        self._by_type: Dict[str, List[SearchResult]] = {}
+        for result in self.items:
+            self._by_type.setdefault(result.type, []).append(result)
+        self._fingerprint: Optional[str] = None
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __iter__(self) -> Iterator[SearchResult]:
+        return iter(self.items)
+
+    def of_type(self, result_type: str) -> List[SearchResult]:
+        return self._by_type.get(result_type, [])
+
+    def count(self, result_type: str) -> int:
+        return len(self._by_type.get(result_type, ()))
+
+    def fingerprint(self) -> str:
+        """Identificador estável do conjunto (chave de cache da renderização)"""
+        if self._fingerprint is None:
+            digest = hashlib.sha1()
+            for result in self.items:
+                digest.update(f"{result.type}\x1f{result.link}\x1f{result.title}\x1f{result.snippet}\x1f{result.date}\x1e".encode("utf-8"))
+            self._fingerprint = digest.hexdigest()[:16]
+        return self._fingerprint
+
+
+def loads(data) -> object:
+    """Decodificar JSON direto dos bytes da resposta (orjson quando instalado)"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_default(obj):
+    """`default` para json.dumps: serializa SearchResult"""
+    if isinstance(obj, SearchResult):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps_results(results: List[SearchResult]) -> str:
+    """Serializar resultados para armazenamento"""
+    return json.dumps([result.to_dict() for result in results], ensure_ascii=False)
+
+
+def loads_results(payload) -> List[SearchResult]:
+    """Reconstruir resultados armazenados com `dumps_results`"""
+    return [SearchResult.from_dict(item) for item in loads(payload)]
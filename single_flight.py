@@ -0,0 +1,205 @@
+import asyncio
+import hashlib
+import json
+import threading
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, Hashable, Iterator, List, Optional, Tuple, TypeVar
+
+from metrics import get_metrics
+
+T = TypeVar("T")
+
+
+class _LeaderAbandoned(Exception):
+    """O líder foi interrompido (ex.: rerun do Streamlit); os seguidores tentam de novo"""
+
+
+def request_key(*parts) -> str:
+    """Chave estável de uma requisição a partir de valores serializáveis em JSON"""
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """Chamadas idênticas simultâneas compartilham uma única execução"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> Tuple[T, bool]:
+        """Executar `fn` ou aguardar a execução em andamento; retorna (resultado, compartilhado)"""
+        while True:
+            with self._lock:
+                future = self._calls.get(key)
+                leader = future is None
+                if leader:
+                    future = self._calls[key] = Future()
+            if leader:
+                break
+            try:
+                result = future.result()
+            except _LeaderAbandoned:
+                continue
+            get_metrics().increment("coalesced", kind=self.name)
+            return result, True
+
+        try:
+            result = fn()
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        except BaseException:
+            future.set_exception(_LeaderAbandoned())
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+
+class AsyncSingleFlight:
+    """Versão para asyncio: corrotinas idênticas no mesmo loop aguardam uma única tarefa"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """Executar `fn()` ou aguardar a tarefa em andamento; retorna (resultado, compartilhado)"""
+        task = self._tasks.get(key)
+        shared = task is not None
+        if shared:
+            get_metrics().increment("coalesced", kind=self.name)
+        else:
+            task = self._tasks[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda done: self._forget(key, done))
+        # shield: se quem iniciou desconectar, os demais continuam recebendo o resultado
+        return await asyncio.shield(task), shared
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+
+
+class _Broadcast:
+    """Chunks já produzidos de um stream e estado compartilhado com os assinantes"""
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.meta: Dict = {}
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 1
+        self.cond = threading.Condition()
+
+
+class StreamSubscription:
+    """Leitura de um stream compartilhado desde o primeiro chunk; `meta` recebe dados do produtor"""
+
+    def __init__(self, broadcast: _Broadcast, shared: bool):
+        self.meta = broadcast.meta
+        self.shared = shared
+        self._chunks = self._follow(broadcast)
+
+    def __iter__(self) -> Iterator[str]:
+        return self._chunks
+
+    def close(self):
+        """Deixar o stream; quando nenhum assinante resta o produtor é interrompido"""
+        self._chunks.close()
+
+    @staticmethod
+    def _follow(broadcast: _Broadcast) -> Iterator[str]:
+        index = 0
+        try:
+            while True:
+                with broadcast.cond:
+                    while index >= len(broadcast.chunks) and not broadcast.done:
+                        broadcast.cond.wait()
+                    pending = broadcast.chunks[index:]
+                    index = len(broadcast.chunks)
+                    finished = broadcast.done
+                yield from pending
+                if finished:
+                    if broadcast.error is not None:
+                        raise broadcast.error
+                    return
+        finally:
+            with broadcast.cond:
+                broadcast.subscribers -= 1
+
+
+class StreamFlight:
+    """Streams idênticos simultâneos: um único produtor e vários assinantes"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._streams: Dict[Hashable, _Broadcast] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, key: Hashable, factory: Callable[[Dict], Iterator[str]]) -> StreamSubscription:
+        """Assinar o stream em andamento ou iniciar um novo com `factory(meta)`"""
+        with self._lock:
+            broadcast = self._streams.get(key)
+            shared = broadcast is not None
+            if shared:
+                with broadcast.cond:
+                    broadcast.subscribers += 1
+            else:
+                broadcast = self._streams[key] = _Broadcast()
+                threading.Thread(
+                    target=self._produce, args=(key, broadcast, factory), name="stream-flight", daemon=True
+                ).start()
+        if shared:
+            get_metrics().increment("coalesced", kind=self.name)
+        return StreamSubscription(broadcast, shared)
+
+    def _produce(self, key: Hashable, broadcast: _Broadcast, factory: Callable[[Dict], Iterator[str]]):
+        # O produtor roda em thread própria: continua mesmo se quem iniciou o stream sair
+        source = None
+        try:
+            source = factory(broadcast.meta)
+            for chunk in source:
+                with self._lock, broadcast.cond:
+                    if broadcast.subscribers <= 0:
+                        # Ninguém mais lendo (ex.: perdedor de um hedge): liberar o provedor
+                        self._streams.pop(key, None)
+                        break
+                    broadcast.chunks.append(chunk)
+                    broadcast.cond.notify_all()
+        except Exception as e:
+            broadcast.error = e
+        finally:
+            close = getattr(source, "close", None)
+            if close is not None:
+                close()
+            with self._lock:
+                if self._streams.get(key) is broadcast:
+                    del self._streams[key]
+            with broadcast.cond:
+                broadcast.done = True
+                broadcast.cond.notify_all()
+
+
+_completions = SingleFlight("completion")
+_searches = SingleFlight("serpapi")
+_streams = StreamFlight("stream")
+
+
+def get_search_flight() -> SingleFlight:
+    """Coalescência de requisições à SerpAPI (por processo)"""
+    return _searches
+
+
+def get_completion_flight() -> SingleFlight:
+    """Coalescência de resumos sem streaming (por processo)"""
+    return _completions
+
+
+def get_stream_flight() -> StreamFlight:
+    """Coalescência de resumos em streaming (por processo)"""
+    return _streams
@@ -0,0 +1,185 @@
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from cache_backends import CacheBackend, cache_key, compress, decompress
+
+# Dimensão dos vetores de n-gramas (hashing trick)
+VECTOR_DIM = 1024
+NGRAM_SIZE = 3
+
+
+def canonical_query(query: str) -> str:
+    """Normalizar a consulta ignorando caixa, acentos, pontuação e ordem das palavras"""
+    text = unicodedata.normalize("NFKD", query.casefold())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    words = re.findall(r"\w+", text)
+    return " ".join(sorted(words))
+
+
+def context_fingerprint(context: str) -> str:
+    """Impressão digital do contexto (fontes) enviado ao modelo"""
+    return hashlib.sha256(context.encode("utf-8")).hexdigest()
+
+
+def query_vector(query: str) -> np.ndarray:
+    """Vetor normalizado de n-gramas de caracteres (hash) da consulta"""
+    vector = np.zeros(VECTOR_DIM, dtype=np.float32)
+    for word in canonical_query(query).split():
+        padded = f" {word} "
+        for i in range(max(len(padded) - NGRAM_SIZE + 1, 1)):
+            gram = padded[i:i + NGRAM_SIZE].encode("utf-8")
+            bucket = int.from_bytes(hashlib.blake2b(gram, digest_size=4).digest(), "little")
+            vector[bucket % VECTOR_DIM] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class SummaryCache:
+    """Cache em memória de análises da IA com busca exata e por similaridade
+
+    Com `backend` compartilhado (SQLite/Redis), as análises também são gravadas nele e uma
+    falta local consulta o backend antes de desistir: uma réplica aproveita o que outra gerou.
+    A busca por similaridade continua local (vetores das análises vistas por este processo).
+    """
+
+    def __init__(
+        self,
+        ttl: int = 3600,
+        max_entries: int = 512,
+        max_bytes: int = 16 * 1024 * 1024,
+        backend: Optional[CacheBackend] = None,
+        namespace: str = "summary",
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.backend = backend
+        self.namespace = namespace
+        self._entries: "OrderedDict[Tuple[str, str, str], Dict]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # Matriz de vetores por modelo, reconstruída apenas após mudanças
+        self._matrix_cache: Dict[str, Tuple[List[Tuple[str, str, str]], np.ndarray]] = {}
+        self.hits = 0
+        self.semantic_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def _remove(self, key: Tuple[str, str, str]):
+        entry = self._entries.pop(key)
+        self._bytes -= entry["size"]
+        self._matrix_cache.pop(key[1], None)
+
+    def _expire(self, now: float):
+        for key in [k for k, e in self._entries.items() if e["expires_at"] <= now]:
+            self._remove(key)
+
+    def _candidates(self, model: str) -> Tuple[List[Tuple[str, str, str]], Optional[np.ndarray]]:
+        if model not in self._matrix_cache:
+            keys = [k for k in self._entries if k[1] == model]
+            if not keys:
+                return [], None
+            matrix = np.vstack([self._entries[k]["vector"] for k in keys])
+            self._matrix_cache[model] = (keys, matrix)
+        return self._matrix_cache[model]
+
+    def _backend_key(self, key: Tuple[str, str, str]) -> str:
+        return cache_key(self.namespace, *key)
+
+    def get(self, query: str, model: str, fingerprint: str, threshold: Optional[float] = None) -> Optional[str]:
+        """Buscar análise pela chave exata (local e no backend) e, se houver limiar, por similaridade da consulta"""
+        now = time.time()
+        key = (canonical_query(query), model, fingerprint)
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry["summary"]
+
+        if self.backend is not None:
+            # Fora do lock: pode ser uma ida à rede
+            payload = self.backend.get(self._backend_key(key))
+            if payload is not None:
+                summary = decompress(payload).decode("utf-8")
+                remaining = self.backend.time_to_live(self._backend_key(key)) or self.ttl
+                with self._lock:
+                    self._store(key, query, summary, min(remaining, self.ttl))
+                    self.shared_hits += 1
+                return summary
+
+        with self._lock:
+            if threshold is not None:
+                keys, matrix = self._candidates(model)
+                if matrix is not None:
+                    scores = matrix @ query_vector(query)
+                    best = int(np.argmax(scores))
+                    if scores[best] >= threshold:
+                        self._entries.move_to_end(keys[best])
+                        self.semantic_hits += 1
+                        return self._entries[keys[best]]["summary"]
+
+            self.misses += 1
+            return None
+
+    def time_to_live(self, query: str, model: str, fingerprint: str) -> Optional[float]:
+        """Segundos até a análise expirar (None se ausente), sem contar como acesso"""
+        key = (canonical_query(query), model, fingerprint)
+        with self._lock:
+            entry = self._entries.get(key)
+            remaining = entry["expires_at"] - time.time() if entry is not None else None
+        if (remaining is None or remaining <= 0) and self.backend is not None:
+            return self.backend.time_to_live(self._backend_key(key))
+        return remaining if remaining is not None and remaining > 0 else None
+
+    def _store(self, key: Tuple[str, str, str], query: str, summary: str, ttl: float):
+        size = len(summary.encode("utf-8")) + VECTOR_DIM * 4
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = {
+            "summary": summary,
+            "vector": query_vector(query),
+            "expires_at": time.time() + ttl,
+            "size": size,
+        }
+        self._bytes += size
+        self._matrix_cache.pop(key[1], None)
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            self._remove(next(iter(self._entries)))
+
+    def set(self, query: str, model: str, fingerprint: str, summary: str):
+        """Armazenar análise respeitando TTL e limites de memória (LRU)"""
+        key = (canonical_query(query), model, fingerprint)
+        with self._lock:
+            self._store(key, query, summary, self.ttl)
+        if self.backend is not None:
+            self.backend.set(self._backend_key(key), compress(summary.encode("utf-8")), self.ttl)
+
+    def clear(self):
+        """Remover todas as análises em cache (inclusive as do backend)"""
+        with self._lock:
+            self._entries.clear()
+            self._matrix_cache.clear()
+            self._bytes = 0
+        if self.backend is not None:
+            self.backend.clear(f"{self.namespace}:")
+
+    def stats(self) -> Dict[str, int]:
+        """Contadores de acertos (exatos e semânticos), falhas e uso de memória"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
@@ -0,0 +1,187 @@
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import get_metrics
+from resilience import get_gateway
+from search_cache import make_cache_key
+from search_result import SearchResult, loads
+from single_flight import get_search_flight
+
+# Sobrescrevível para apontar a um servidor local (ex.: benchmark offline)
+SERPAPI_URL = os.getenv("SERPAPI_URL", "https://serpapi.com/search")
+
+# Verticais suportadas na busca combinada
+VERTICALS = {
+    "web": None,
+    "news": "nws",
+}
+
+_session: Optional[requests.Session] = None
+_executor: Optional[ThreadPoolExecutor] = None
+_lock = threading.Lock()
+
+
+def get_http_session() -> requests.Session:
+    """Sessão HTTP única com pool de conexões keep-alive"""
+    global _session
+    with _lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="serpapi")
+        return _executor
+
+
+def parse_serpapi_results(results: Dict) -> List[SearchResult]:
+    """Extrair resultados orgânicos, notícias e knowledge graph da resposta da SerpAPI"""
+    all_results = []
+
+    # Knowledge graph (se disponível)
+    knowledge_graph = results.get("knowledge_graph")
+    if knowledge_graph:
+        all_results.append(SearchResult(
+            knowledge_graph.get("title", ""),
+            knowledge_graph.get("website", ""),
+            knowledge_graph.get("description", ""),
+            "Knowledge Graph",
+            "knowledge",
+        ))
+
+    # Resultados orgânicos
+    for item in results.get("organic_results", ()):
+        get = item.get
+        all_results.append(SearchResult(get("title", ""), get("link", ""), get("snippet", ""), get("displayed_link", ""), "web"))
+
+    # Resultados de notícias
+    for item in results.get("news_results", ()):
+        get = item.get
+        all_results.append(SearchResult(get("title", ""), get("link", ""), get("snippet", ""), get("source", ""), "news", get("date", "")))
+
+    return all_results
+
+
+def fetch_serpapi(params: Dict, timeout: float = 15) -> List[SearchResult]:
+    """Executar uma requisição à SerpAPI (levanta exceção em caso de falha)
+
+    Buscas idênticas simultâneas (de qualquer sessão) compartilham a mesma requisição.
+    """
+    results, shared = get_search_flight().do(make_cache_key(params), lambda: _request_serpapi(params, timeout))
+    # Cópias para quem pegou carona: cada chamador pode alterar seus resultados
+    return [result.copy() for result in results] if shared else results
+
+
+def _request_serpapi(params: Dict, timeout: float) -> List[SearchResult]:
+    def request() -> requests.Response:
+        response = get_http_session().get(SERPAPI_URL, params=params, timeout=timeout)
+        response.raise_for_status()
+        return response
+
+    metrics = get_metrics()
+    # Limite de taxa, novas tentativas (429/5xx) e circuit breaker compartilhados
+    with metrics.span("serpapi_request", provider="serpapi"):
+        response = get_gateway().call("serpapi", request)
+    with metrics.span("json_parse", provider="serpapi"):
+        # Direto dos bytes, sem decodificar o corpo para str antes
+        payload = loads(response.content)
+    with metrics.span("result_extraction", provider="serpapi"):
+        return parse_serpapi_results(payload)
+
+
+def build_branches(base_params: Dict, verticals: List[str], locales: List[Tuple[str, str]]) -> Dict[str, Dict]:
+    """Combinar verticais e locais (hl, gl) em parâmetros por ramo"""
+    branches = {}
+    all_locales = [(base_params["hl"], base_params["gl"])] + [
+        locale for locale in locales if locale != (base_params["hl"], base_params["gl"])
+    ]
+    for vertical in verticals:
+        for hl, gl in all_locales:
+            params = dict(base_params, hl=hl, gl=gl, tbm=VERTICALS[vertical])
+            branches[f"{vertical}:{hl}-{gl}"] = params
+    return branches
+
+
+def merge_results(branch_results: List[List[SearchResult]]) -> List[SearchResult]:
+    """Mesclar resultados dos ramos no esquema único (knowledge, web, notícias)"""
+    merged = {"knowledge": [], "web": [], "news": []}
+    seen_links = set()
+    for results in branch_results:
+        for result in results:
+            link = result.link
+            if link and link in seen_links:
+                continue
+            if result.type == "knowledge" and merged["knowledge"]:
+                continue
+            seen_links.add(link)
+            merged.setdefault(result.type, []).append(result)
+    return merged["knowledge"] + merged["web"] + merged["news"]
+
+
+def fan_out_search(
+    branches: Dict[str, Dict], cache=None, timeout: float = 15, max_wait: Optional[float] = None
+) -> Tuple[List[SearchResult], Dict[str, str]]:
+    """Executar os ramos em paralelo; retorna resultados mesclados e erros por ramo
+
+    `max_wait` (padrão: 2x o timeout) limita a espera total, inclusive o tempo na fila do pool.
+    """
+    started: Dict[str, float] = {}
+    deadline = time.monotonic() + (max_wait if max_wait is not None else 2 * timeout)
+
+    def run_branch(name: str, params: Dict) -> List[SearchResult]:
+        started[name] = time.monotonic()
+        if cache is not None:
+            cached = cache.get(params)
+            if cached is not None:
+                return cached
+        results = fetch_serpapi(params, timeout=timeout)
+        if cache is not None and results:
+            cache.set(params, results)
+        return results
+
+    executor = _get_executor()
+    futures = {name: executor.submit(run_branch, name, params) for name, params in branches.items()}
+    # Prazo de cada ramo contado de quando ele começa a rodar: o pool é compartilhado (sessões
+    # simultâneas, subconsultas da expansão) e um ramo ainda na fila não conta como timeout
+    names = {future: name for name, future in futures.items()}
+    pending = set(futures.values())
+    while pending:
+        now = time.monotonic()
+        if now >= deadline:
+            # Prazo total esgotado com o pool saturado: ramos que nem começaram são cancelados abaixo
+            break
+        remaining = [started[names[future]] + timeout + 1 - now for future in pending if names[future] in started]
+        queued = len(remaining) < len(pending)
+        if remaining and min(remaining) <= 0:
+            # Ramo que estourou o prazo: desistir dele e seguir esperando os demais
+            pending = {future for future in pending if names[future] not in started or started[names[future]] + timeout + 1 > now}
+            continue
+        # Com ramos na fila, acordar a intervalos curtos para registrar quando começarem
+        wait_for = min(remaining + ([0.05] if queued else []) + [deadline - now])
+        _, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+    branch_results = []
+    errors = {}
+    for name, future in futures.items():
+        if not future.done():
+            future.cancel()
+            errors[name] = "timeout"
+        elif future.exception() is not None:
+            errors[name] = str(future.exception())
+        else:
+            branch_results.append(future.result())
+    return merge_results(branch_results), errors